@@ -23,6 +23,9 @@ from models.Dim_Products import Dim_Products
 from models.Dim_Users import Dim_Users
 from models.Dim_Date import Dim_Date
 from models.Fact_Order_Items import Fact_Order_Items
+from models.Etl_Batches import Etl_Batch
+from models.Slow_Query_Log import Slow_Query_Log
+from models.Api_Request_Log import Api_Request_Log
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
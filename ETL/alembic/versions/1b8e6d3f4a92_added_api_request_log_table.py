@@ -0,0 +1,39 @@
+"""added api request log table
+
+Revision ID: 1b8e6d3f4a92
+Revises: f7c3a9e1b604
+Create Date: 2026-10-19 17:48:36.902115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b8e6d3f4a92'
+down_revision: Union[str, Sequence[str], None] = 'f7c3a9e1b604'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'api_request_log',
+        sa.Column('Request_Log_ID', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('Bucket_Start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('Method', sa.String(length=8), nullable=False),
+        sa.Column('Target', sa.Text(), nullable=False),
+        sa.Column('Requests', sa.Integer(), nullable=False),
+        sa.Column('Total_Ms', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('Request_Log_ID')
+    )
+    op.create_index('idx_request_log_bucket', 'api_request_log', ['Bucket_Start'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_request_log_bucket', table_name='api_request_log')
+    op.drop_table('api_request_log')
@@ -0,0 +1,34 @@
+"""added revenue cents columns
+
+Revision ID: 3b7e1c9a5d20
+Revises: 644814aca64f
+Create Date: 2026-10-19 09:12:44.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e1c9a5d20'
+down_revision: Union[str, Sequence[str], None] = '644814aca64f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('dim_products', sa.Column('Price_Cents', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('fact_order_items', sa.Column('Total_Revenue_Cents', sa.BigInteger(), server_default='0', nullable=False))
+
+    # Backfill existing rows so both representations agree until the next ETL run
+    op.execute('UPDATE dim_products SET "Price_Cents" = ROUND("Price" * 100)::bigint')
+    op.execute('UPDATE fact_order_items SET "Total_Revenue_Cents" = ROUND("Total_Revenue" * 100)::bigint')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('fact_order_items', 'Total_Revenue_Cents')
+    op.drop_column('dim_products', 'Price_Cents')
@@ -0,0 +1,43 @@
+"""added city product ranking
+
+Revision ID: 4c9e2f7b1a63
+Revises: 1b8e6d3f4a92
+Create Date: 2026-10-19 18:31:05.274518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c9e2f7b1a63'
+down_revision: Union[str, Sequence[str], None] = '1b8e6d3f4a92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Products ranked per city in the slice endpoint's order (revenue, then id, DESC),
+    # so a top-N or any later page is a range on ("City", "Rank") with no sort.
+    # Built from agg_revenue_by_city_product, which the ETL refreshes first.
+    op.execute("""
+        CREATE MATERIALIZED VIEW agg_product_rank_by_city AS
+        SELECT "City",
+               ROW_NUMBER() OVER (
+                   PARTITION BY "City" ORDER BY total_revenue DESC, "Product_ID" DESC
+               )::int AS "Rank",
+               "Product_ID", "Name", total_revenue, total_revenue_cents
+        FROM agg_revenue_by_city_product
+        ORDER BY "City", "Rank"
+    """)
+    op.execute('CREATE UNIQUE INDEX idx_agg_product_rank ON agg_product_rank_by_city ("City", "Rank")')
+    # Resolves a page cursor (last Product_ID) to its rank
+    op.execute('CREATE UNIQUE INDEX idx_agg_product_rank_product ON agg_product_rank_by_city ("City", "Product_ID")')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS agg_product_rank_by_city')
@@ -0,0 +1,41 @@
+"""added etl batches table
+
+Revision ID: 5d2f8a4c6e31
+Revises: 3b7e1c9a5d20
+Create Date: 2026-10-19 10:41:03.552917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2f8a4c6e31'
+down_revision: Union[str, Sequence[str], None] = '3b7e1c9a5d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'etl_batches',
+        sa.Column('Batch_ID', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('Mode', sa.String(length=10), nullable=False),
+        sa.Column('Status', sa.String(length=10), nullable=False),
+        sa.Column('Started_At', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('Finished_At', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('Last_Order_ID', sa.BigInteger(), nullable=False),
+        sa.Column('Rows_Loaded', sa.Integer(), nullable=False),
+        sa.Column('Duration_Ms', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('Batch_ID')
+    )
+    op.create_index('idx_batches_status_order', 'etl_batches', ['Status', 'Last_Order_ID'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_batches_status_order', table_name='etl_batches')
+    op.drop_table('etl_batches')
@@ -0,0 +1,89 @@
+"""added materialized revenue aggregates
+
+Revision ID: 8a41c7d2e9f5
+Revises: 5d2f8a4c6e31
+Create Date: 2026-10-19 13:05:27.904411
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a41c7d2e9f5'
+down_revision: Union[str, Sequence[str], None] = '5d2f8a4c6e31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Each view needs a unique index so the ETL can REFRESH ... CONCURRENTLY
+    op.execute("""
+        CREATE MATERIALIZED VIEW agg_revenue_by_month AS
+        SELECT dd."Year", dd."Quarter", dd."Month",
+               SUM(foi."Total_Revenue") AS total_revenue,
+               SUM(foi."Total_Revenue_Cents")::bigint AS total_revenue_cents,
+               COUNT(*) AS item_count
+        FROM fact_order_items foi
+        JOIN dim_date dd ON dd."Date_ID" = foi."Delivery_Date_ID"
+        GROUP BY dd."Year", dd."Quarter", dd."Month"
+    """)
+    op.execute('CREATE UNIQUE INDEX idx_agg_month ON agg_revenue_by_month ("Year", "Quarter", "Month")')
+
+    op.execute("""
+        CREATE MATERIALIZED VIEW agg_revenue_by_rider AS
+        SELECT dr."Rider_ID", dr."Courier_Name", dr."Vehicle_Type", dr."First_Name", dr."Last_Name",
+               agg.total_revenue, agg.total_revenue_cents, agg.item_count
+        FROM (
+            SELECT "Delivery_Rider_ID",
+                   SUM("Total_Revenue") AS total_revenue,
+                   SUM("Total_Revenue_Cents")::bigint AS total_revenue_cents,
+                   COUNT(*) AS item_count
+            FROM fact_order_items
+            GROUP BY "Delivery_Rider_ID"
+        ) agg
+        JOIN dim_riders dr ON dr."Rider_ID" = agg."Delivery_Rider_ID"
+    """)
+    op.execute('CREATE UNIQUE INDEX idx_agg_rider ON agg_revenue_by_rider ("Rider_ID")')
+    op.execute('CREATE INDEX idx_agg_rider_revenue ON agg_revenue_by_rider (total_revenue DESC)')
+
+    op.execute("""
+        CREATE MATERIALIZED VIEW agg_revenue_by_city_product AS
+        SELECT du."City", dp."Product_ID", dp."Name", dp."Category",
+               SUM(foi."Total_Revenue") AS total_revenue,
+               SUM(foi."Total_Revenue_Cents")::bigint AS total_revenue_cents,
+               COUNT(*) AS item_count
+        FROM fact_order_items foi
+        JOIN dim_users du ON du."Users_ID" = foi."User_ID"
+        JOIN dim_products dp ON dp."Product_ID" = foi."Product_ID"
+        GROUP BY du."City", dp."Product_ID", dp."Name", dp."Category"
+    """)
+    op.execute('CREATE UNIQUE INDEX idx_agg_city_product ON agg_revenue_by_city_product ("City", "Product_ID")')
+
+    op.execute("""
+        CREATE MATERIALIZED VIEW agg_revenue_by_city_category_quarter AS
+        SELECT du."City", dp."Category", dd."Year", dd."Quarter",
+               SUM(foi."Total_Revenue") AS total_revenue,
+               SUM(foi."Total_Revenue_Cents")::bigint AS total_revenue_cents,
+               COUNT(*) AS item_count
+        FROM fact_order_items foi
+        JOIN dim_users du ON du."Users_ID" = foi."User_ID"
+        JOIN dim_products dp ON dp."Product_ID" = foi."Product_ID"
+        JOIN dim_date dd ON dd."Date_ID" = foi."Delivery_Date_ID"
+        GROUP BY du."City", dp."Category", dd."Year", dd."Quarter"
+    """)
+    op.execute(
+        'CREATE UNIQUE INDEX idx_agg_city_category_quarter ON agg_revenue_by_city_category_quarter '
+        '("Year", "Quarter", "City", "Category")'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS agg_revenue_by_city_category_quarter')
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS agg_revenue_by_city_product')
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS agg_revenue_by_rider')
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS agg_revenue_by_month')
@@ -0,0 +1,43 @@
+"""added daily product aggregate
+
+Revision ID: c61e4b8f0a27
+Revises: 8a41c7d2e9f5
+Create Date: 2026-10-19 15:42:10.318764
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c61e4b8f0a27'
+down_revision: Union[str, Sequence[str], None] = '8a41c7d2e9f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Finest-grain summary used by the aggregate navigator for date x product questions
+    op.execute("""
+        CREATE MATERIALIZED VIEW agg_revenue_by_day_product AS
+        SELECT dd."Date", dd."Year", dd."Quarter", dd."Month", dd."Day",
+               dp."Product_ID", dp."Name", dp."Category",
+               SUM(foi."Total_Revenue") AS total_revenue,
+               SUM(foi."Total_Revenue_Cents")::bigint AS total_revenue_cents,
+               SUM(foi."Quantity")::bigint AS total_quantity,
+               COUNT(*) AS item_count
+        FROM fact_order_items foi
+        JOIN dim_date dd ON dd."Date_ID" = foi."Delivery_Date_ID"
+        JOIN dim_products dp ON dp."Product_ID" = foi."Product_ID"
+        GROUP BY dd."Date", dd."Year", dd."Quarter", dd."Month", dd."Day",
+                 dp."Product_ID", dp."Name", dp."Category"
+    """)
+    op.execute('CREATE UNIQUE INDEX idx_agg_day_product ON agg_revenue_by_day_product ("Date", "Product_ID")')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS agg_revenue_by_day_product')
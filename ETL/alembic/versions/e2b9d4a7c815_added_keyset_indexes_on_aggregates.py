@@ -0,0 +1,47 @@
+"""added keyset indexes on aggregates
+
+Revision ID: e2b9d4a7c815
+Revises: c61e4b8f0a27
+Create Date: 2026-10-19 16:20:48.557102
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b9d4a7c815'
+down_revision: Union[str, Sequence[str], None] = 'c61e4b8f0a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Paginated drillDown/slice order by (revenue, id) DESC; these indexes let each
+    # page start with an index seek instead of re-sorting the whole view.
+    op.execute('DROP INDEX IF EXISTS idx_agg_rider_revenue')
+    op.execute('CREATE INDEX idx_agg_rider_revenue ON agg_revenue_by_rider (total_revenue DESC, "Rider_ID" DESC)')
+    op.execute(
+        'CREATE INDEX idx_agg_rider_revenue_cents ON agg_revenue_by_rider '
+        '(total_revenue_cents DESC, "Rider_ID" DESC)'
+    )
+    op.execute(
+        'CREATE INDEX idx_agg_city_product_revenue ON agg_revenue_by_city_product '
+        '("City", total_revenue DESC, "Product_ID" DESC)'
+    )
+    op.execute(
+        'CREATE INDEX idx_agg_city_product_revenue_cents ON agg_revenue_by_city_product '
+        '("City", total_revenue_cents DESC, "Product_ID" DESC)'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP INDEX IF EXISTS idx_agg_city_product_revenue_cents')
+    op.execute('DROP INDEX IF EXISTS idx_agg_city_product_revenue')
+    op.execute('DROP INDEX IF EXISTS idx_agg_rider_revenue_cents')
+    op.execute('DROP INDEX IF EXISTS idx_agg_rider_revenue')
+    op.execute('CREATE INDEX idx_agg_rider_revenue ON agg_revenue_by_rider (total_revenue DESC)')
@@ -0,0 +1,50 @@
+"""added slow query log table
+
+Revision ID: f7c3a9e1b604
+Revises: e2b9d4a7c815
+Create Date: 2026-10-19 17:05:12.318840
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7c3a9e1b604'
+down_revision: Union[str, Sequence[str], None] = 'e2b9d4a7c815'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'slow_query_log',
+        sa.Column('Query_ID', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('Captured_At', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('Endpoint', sa.String(length=64), nullable=True),
+        sa.Column('Trace_ID', sa.String(length=64), nullable=True),
+        sa.Column('Data_Version', sa.Integer(), nullable=True),
+        sa.Column('Duration_Ms', sa.Float(), nullable=False),
+        sa.Column('Timed_Out', sa.Boolean(), server_default=sa.false(), nullable=False),
+        sa.Column('Sql_Text', sa.Text(), nullable=False),
+        sa.Column('Params', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('Plan', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('Plan_Execution_Ms', sa.Float(), nullable=True),
+        sa.Column('Shared_Hit_Blocks', sa.BigInteger(), nullable=True),
+        sa.Column('Shared_Read_Blocks', sa.BigInteger(), nullable=True),
+        sa.Column('Explain_Error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('Query_ID')
+    )
+    op.create_index('idx_slow_query_captured', 'slow_query_log', ['Captured_At'], unique=False)
+    op.create_index('idx_slow_query_endpoint_captured', 'slow_query_log', ['Endpoint', 'Captured_At'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_slow_query_endpoint_captured', table_name='slow_query_log')
+    op.drop_index('idx_slow_query_captured', table_name='slow_query_log')
+    op.drop_table('slow_query_log')
@@ -1,17 +1,48 @@
 from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import text, func
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from contextlib import asynccontextmanager
+from sqlalchemy import func
+from typing import Any, List, Optional, Literal
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-from util.db_warehouse import Session_db_warehouse
 from models.Dim_Products import Dim_Products
 from models.Dim_Users import Dim_Users
 from models.Dim_Riders import Dim_Rider
 from models.Dim_Date import Dim_Date
 from models.Fact_Order_Items import Fact_Order_Items
 from util.logging_config import setup_logging, get_logger
+from util.olap_queries import (
+    rollup_sql, drilldown_sql, slice_sql, dice_sql,
+    rollup_aggregate_sql, drilldown_aggregate_sql, slice_aggregate_sql, dice_aggregate_sql,
+    drilldown_keyset_select, drilldown_aggregate_keyset_select, DRILLDOWN_KEYS,
+    slice_keyset_select, slice_aggregate_keyset_select, SLICE_KEYS,
+    dice_range_sql, dice_quarter_aggregate_sql, DICE_RANGE_PARAM_TYPES, DICE_QUARTER_PARAM_TYPES,
+    slice_ranking_sql, slice_ranking_page_sql, SLICE_RANKING_VIEW,
+    city_search_sql, city_list_sql, categories_sql,
+)
+from util.revenue import REVENUE_STORAGE
+from util.query_executor import fetch_all, fetch_result, stream_rows, dispose_engines, API_DB_MODE
+from util.result_set import ResultSet
+from util.olap_response import negotiate_format, render_result
+from util.json_response import FastJSONResponse, dumps
+from util.http_cache import ConditionalCompressionMiddleware
+from util.city_index import city_index
+from util.prepared_statements import prepared_statements
+from util.admission import query_policy, admission_stats, CancelOnDisconnectMiddleware
+from util.metrics import MetricsMiddleware, render_metrics, recent_traces, phase
+from util.slow_query_log import slow_query_log
+from util.request_log import request_log
+from util.warmup import warm_up_api
+from util.columnar_engine import columnar_engine, COLUMNAR_SOURCE
+from datetime import date, timedelta
+from util.pagination import fetch_page, fetch_page_with, CursorError, PAGE_MAX_LIMIT
+from util.query_cache import cached
+from util.cube import compile_cube_query, describe_model, CubeQueryError
+from util.aggregate_navigator import aggregate_navigator, FACT_SOURCE
 import uvicorn
+import asyncio
+import os
 
 
 load_dotenv()
@@ -20,13 +51,61 @@ load_dotenv()
 setup_logging()
 logger = get_logger(__name__)
 
+# "aggregate" serves OLAP endpoints from the in-memory columnar engine when
+# enabled, else the ETL-refreshed materialized views; "raw" always scans
+# fact_order_items. Overridable per request with ?source=
+API_DEFAULT_SOURCE = os.getenv("API_DEFAULT_SOURCE", "aggregate")
+
+OlapSource = Literal["aggregate", "raw"]
+
+# Upper bound on values per dimension for /api/dice
+DICE_MAX_VALUES = int(os.getenv("DICE_MAX_VALUES") or 500)
+
+# Serve /api/slice from the per-city product ranking; false re-aggregates and
+# sorts the city's products (agg_revenue_by_city_product) on every call
+SLICE_RANKING = os.getenv("SLICE_RANKING", "true").lower() in ("true", "1", "yes")
+
+# Response header naming what answered (a summary view, the fact table or "columnar")
+SERVED_BY_HEADER = "X-Served-By"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info(f"Warehouse access mode: {API_DB_MODE}")
+    slow_query_log.start()
+    request_log.start()
+    try:
+        await city_index.ensure_current()
+    except Exception as e:
+        # /api/cities retries on first use and falls back to SQL meanwhile
+        logger.warning(f"Could not build city index at startup: {e}")
+    # Loads in the background; SQL serves until the snapshot is ready
+    columnar_engine.start()
+    # In the background so the API serves (from cold caches) right away
+    warmup = asyncio.create_task(warm_up_api(app))
+    yield
+    warmup.cancel()
+    await columnar_engine.stop()
+    await request_log.stop()
+    await slow_query_log.stop()
+    await dispose_engines()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Sales OLAP API",
     description="API for querying sales data warehouse",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
+# Innermost: cancels the handler (and its query) when the client goes away
+app.add_middleware(CancelOnDisconnectMiddleware)
+
+# ETags, 304s and compression. Added before CORS so CORS stays outermost and
+# 304 responses still carry the CORS headers.
+app.add_middleware(ConditionalCompressionMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -34,143 +113,473 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browser clients read the timing breakdown and the trace to look up
+    expose_headers=["Server-Timing", "X-Trace-Id"],
 )
 
+# Outermost: times the whole request, including 304s answered by the cache layer
+app.add_middleware(MetricsMiddleware)
 
-# Dependency to get database session
-def get_db():
-    db = Session_db_warehouse()
+
+async def run_columnar(source, query):
+    """
+    Body from the in-memory columnar engine, or None to take the SQL path.
+
+    Only for source "aggregate": "raw" keeps meaning a PostgreSQL fact scan.
+    """
+    if source != "aggregate" or query is None:
+        return None
     try:
-        yield db
-    finally:
-        db.close()
+        body = await columnar_engine.run(query)
+    except Exception as e:
+        logger.warning(f"Columnar engine query failed, falling back to SQL: {e}")
+        return None
+    return {"source": COLUMNAR_SOURCE, "body": body} if body is not None else None
+
+
+async def route_olap(aggregate_name, source, run, columnar=None):
+    """
+    Run in the columnar engine or against a materialized aggregate if allowed,
+    else the raw fact table.
+
+    The aggregate is only used while the navigator reports it populated and
+    fresh; if reading it still fails (e.g. mid-migration) the raw query runs.
+    Admission errors (Overloaded, QueryTimeout) are returned, not retried.
+
+    Args:
+        aggregate_name (str): Summary view able to answer the query
+        source (str): Requested source ("aggregate" or "raw")
+        run: Coroutine function taking use_aggregate (bool) and returning the body
+        columnar: Optional function taking a ColumnarSnapshot and returning the body
+
+    Returns:
+        dict: {"source": what answered, "body": the result}
+    """
+    result = await run_columnar(source, columnar)
+    if result is not None:
+        return result
+    if source == "aggregate" and await aggregate_navigator.usable(aggregate_name):
+        try:
+            return {"source": aggregate_name, "body": await run(True)}
+        except HTTPException:
+            # Shed (503) or statement timeout (504): rerunning on the fact table would only add load
+            raise
+        except Exception as e:
+            logger.warning(f"Aggregate query failed, falling back to fact table: {e}")
+    return {"source": FACT_SOURCE, "body": await run(False)}
+
+
+async def run_olap_query(raw_sql, aggregate_sql, aggregate_name, params, revenue_keys, source, columnar=None):
+    async def run(use_aggregate):
+        columns, rows = await fetch_result(aggregate_sql if use_aggregate else raw_sql, params)
+        return ResultSet(columns, rows, revenue_keys)
+
+    return await route_olap(aggregate_name, source, run, columnar)
 
-@app.get("/api/rollup")
-def run_raw_query(db: Session = Depends(get_db)):
+
+async def run_olap_page(raw_select, aggregate_select, aggregate_name, keys, params, revenue_keys,
+                        source, limit, cursor):
+    """
+    Keyset page: {"data": ResultSet, "next_cursor": opaque cursor or None}.
+
+    aggregate_select may also be a page_sql function (see fetch_page_with) for
+    a summary that pages itself, like the slice ranking.
+    """
+    async def run(use_aggregate):
+        if use_aggregate and callable(aggregate_select):
+            page = await fetch_page_with(aggregate_select, keys, params, limit, cursor)
+        else:
+            page = await fetch_page(aggregate_select if use_aggregate else raw_select, keys, params, limit, cursor)
+        columns, rows, next_cursor = page
+        return {"data": ResultSet(columns, rows, revenue_keys), "next_cursor": next_cursor}
+
+    return await route_olap(aggregate_name, source, run)
+
+
+async def stream_olap_query(raw_sql, aggregate_sql, aggregate_name, params, revenue_keys, source):
+    """
+    NDJSON response fed from a server-side cursor, one batch at a time.
+
+    The source is decided up front (the header goes out before any row), so
+    there is no mid-stream fallback to the fact table.
+    """
+    use_aggregate = source == "aggregate" and await aggregate_navigator.usable(aggregate_name)
+
+    async def lines():
+        async for batch in stream_rows(aggregate_sql if use_aggregate else raw_sql, params):
+            with phase("serialize"):
+                records = ResultSet(batch[0]._fields, batch, revenue_keys).json_records()
+                chunk = b"".join(dumps(record) + b"\n" for record in records)
+            yield chunk
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={SERVED_BY_HEADER: aggregate_name if use_aggregate else FACT_SOURCE},
+    )
+
+
+def served(result, fmt):
+    return render_result(result["body"], fmt, {SERVED_BY_HEADER: result["source"]})
+
+
+@app.get("/api/rollup", dependencies=[Depends(query_policy("rollup"))])
+async def run_raw_query(source: OlapSource = API_DEFAULT_SOURCE, fmt: str = Depends(negotiate_format)):
     try:
-        sql = text("""
-            SELECT dd."Year", dd."Quarter", dd."Month", SUM(foi."Total_Revenue") as revenue
-            FROM fact_order_items foi
-            JOIN dim_date dd on dd."Date_ID" = foi."Delivery_Date_ID"
-            GROUP BY ROLLUP(dd."Year", dd."Quarter", dd."Month")
-            ORDER BY dd."Year" NULLS LAST, dd."Quarter" NULLS LAST, dd."Month" NULLS LAST
-        """)
-        result = db.execute(sql)
-        rows = result.fetchall()
-
-        return [dict(row._mapping) for row in rows]
+        async def compute():
+            return await run_olap_query(
+                rollup_sql(), rollup_aggregate_sql(), "agg_revenue_by_month", {}, ("revenue",), source,
+                columnar=lambda snapshot: snapshot.rollup(),
+            )
+
+        return served(await cached("rollup", {"source": source}, compute), fmt)
+    except HTTPException:
+        # e.g. 406 for an unsupported response format
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
-@app.get("/api/drillDown")
-def run_raw_query(db: Session = Depends(get_db)):
+@app.get("/api/drillDown", dependencies=[Depends(query_policy("drillDown"))])
+async def run_raw_query(
+    source: OlapSource = API_DEFAULT_SOURCE,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT, description="Page size (enables keyset pagination)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fmt: str = Depends(negotiate_format),
+):
     try:
-        sql = text("""
-            SELECT 
-                dr."Courier_Name", 
-                dr."Vehicle_Type", 
-                dr."First_Name", 
-                dr."Last_Name",
-                agg.total_revenue
-            FROM (
-                SELECT 
-                    "Delivery_Rider_ID",
-                    SUM("Total_Revenue") as total_revenue
-                FROM fact_order_items
-                GROUP BY "Delivery_Rider_ID"
-            ) agg
-            JOIN dim_riders dr ON dr."Rider_ID" = agg."Delivery_Rider_ID"
-            ORDER BY agg.total_revenue DESC
-        """)
-        result = db.execute(sql)
-        rows = result.fetchall()
-
-        return [dict(row._mapping) for row in rows]
+        if fmt == "ndjson":
+            return await stream_olap_query(
+                drilldown_sql(), drilldown_aggregate_sql(), "agg_revenue_by_rider",
+                {}, ("total_revenue",), source,
+            )
+
+        if limit is not None or cursor is not None:
+            page_size = limit or PAGE_MAX_LIMIT
+
+            async def compute_page():
+                return await run_olap_page(
+                    drilldown_keyset_select(), drilldown_aggregate_keyset_select(), "agg_revenue_by_rider",
+                    DRILLDOWN_KEYS, {}, ("total_revenue",), source, page_size, cursor,
+                )
+
+            key = {"source": source, "limit": page_size, "cursor": cursor or ""}
+            return served(await cached("drillDown.page", key, compute_page), fmt)
+
+        async def compute():
+            return await run_olap_query(
+                drilldown_sql(), drilldown_aggregate_sql(), "agg_revenue_by_rider",
+                {}, ("total_revenue",), source, columnar=lambda snapshot: snapshot.drilldown(),
+            )
+
+        return served(await cached("drillDown", {"source": source}, compute), fmt)
+    except HTTPException:
+        raise
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
-@app.get("/api/slice/{city}")
-def run_raw_query(city: str, db: Session = Depends(get_db)):
+async def slice_summary(source):
+    """Summary the slice endpoint reads: the ranking while enabled and fresh."""
+    if SLICE_RANKING and source == "aggregate" and await aggregate_navigator.usable(SLICE_RANKING_VIEW):
+        return SLICE_RANKING_VIEW
+    return "agg_revenue_by_city_product"
+
+
+@app.get("/api/slice/{city}", dependencies=[Depends(query_policy("slice"))])
+async def run_raw_query(
+    city: str,
+    source: OlapSource = API_DEFAULT_SOURCE,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT, description="Page size (enables keyset pagination)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fmt: str = Depends(negotiate_format),
+):
     try:
-        sql = text("""
-            SELECT du."City", dp."Name", SUM(foi."Total_Revenue") as total_revenue
-            FROM fact_order_items foi
-            JOIN dim_users du ON du."Users_ID" = foi."User_ID"
-            JOIN dim_products dp ON foi."Product_ID" = dp."Product_ID"
-            WHERE du."City" = :city
-            GROUP BY du."City", dp."Product_ID", dp."Name"
-            ORDER BY total_revenue DESC
-        """)
-        result = db.execute(sql, {"city": city})
-        rows = result.fetchall()
-
-        return [dict(row._mapping) for row in rows]
+        summary = await slice_summary(source)
+        ranked = summary == SLICE_RANKING_VIEW
+        if fmt == "ndjson":
+            return await stream_olap_query(
+                slice_sql(), slice_ranking_sql() if ranked else slice_aggregate_sql(), summary,
+                {"city": city}, ("total_revenue",), source,
+            )
+
+        if limit is not None or cursor is not None:
+            page_size = limit or PAGE_MAX_LIMIT
+
+            async def compute_page():
+                # Top-N (first page) and later pages are a ("City", "Rank") range on the ranking
+                return await run_olap_page(
+                    slice_keyset_select(), slice_ranking_page_sql if ranked else slice_aggregate_keyset_select(),
+                    summary, SLICE_KEYS, {"city": city}, ("total_revenue",), source, page_size, cursor,
+                )
+
+            key = {"city": city, "source": source, "limit": page_size, "cursor": cursor or ""}
+            return served(await cached("slice.page", key, compute_page), fmt)
+
+        async def compute():
+            return await run_olap_query(
+                slice_sql(), slice_ranking_sql() if ranked else slice_aggregate_sql(), summary,
+                {"city": city}, ("total_revenue",), source, columnar=lambda snapshot: snapshot.slice(city),
+            )
+
+        return served(await cached("slice", {"city": city, "source": source}, compute), fmt)
+    except HTTPException:
+        raise
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 
-@app.get("/api/dice/{city1}/{city2}/{category1}/{category2}")
-def run_raw_query(city1: str, city2: str, category1: str, category2: str, db: Session = Depends(get_db)):
+@app.get("/api/dice/{city1}/{city2}/{category1}/{category2}", dependencies=[Depends(query_policy("dice"))])
+async def run_raw_query(city1: str, city2: str, category1: str, category2: str,
+                        source: OlapSource = API_DEFAULT_SOURCE, fmt: str = Depends(negotiate_format)):
     try:
-        sql = text("""
-            SELECT du."City", dp."Category", dd."Year", dd."Quarter", SUM(foi."Total_Revenue") AS total_revenue
-            FROM fact_order_items foi
-            JOIN dim_users du ON du."Users_ID" = foi."User_ID"
-            JOIN dim_products dp ON dp."Product_ID" = foi."Product_ID"
-            JOIN dim_date dd ON dd."Date_ID" = foi."Delivery_Date_ID"
-            WHERE du."City" IN (:city1, :city2)
-              AND dp."Category" IN (:category1, :category2)
-              AND dd."Year" = 2025
-              AND dd."Quarter" = 2
-            GROUP BY du."City", dp."Category", dd."Year", dd."Quarter"
-            ORDER BY total_revenue DESC
-        """)
-        
-        result = db.execute(sql, {"city1": city1, "city2": city2, "category1": category1, "category2": category2})
-        rows = result.fetchall()
-
-        return [dict(row._mapping) for row in rows]
+        async def compute():
+            params = {"city1": city1, "city2": city2, "category1": category1, "category2": category2}
+            return await run_olap_query(
+                dice_sql(), dice_aggregate_sql(), "agg_revenue_by_city_category_quarter",
+                params, ("total_revenue",), source,
+                columnar=lambda snapshot: snapshot.dice(
+                    cities=[city1, city2], categories=[category1, category2], year=2025, quarter=2
+                ),
+            )
+
+        # IN (...) lists are order-insensitive, so (A, B) and (B, A) share an entry
+        result = await cached(
+            "dice",
+            {
+                "cities": frozenset((city1, city2)),
+                "categories": frozenset((category1, category2)),
+                "source": source,
+            },
+            compute,
+        )
+        return served(result, fmt)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
-@app.get("/api/cities")
-def run_raw_query(q: Optional[str] = Query(None, description="Optional search query to filter cities"), db: Session = Depends(get_db)):
+def dice_statement(kind, by_city, by_category):
+    """Registered prepared statement for one dice variant ("range" or "quarter")."""
+    name = f"dice_{kind}_{REVENUE_STORAGE}_{'c' if by_city else 'x'}{'k' if by_category else 'x'}"
+    if kind == "range":
+        sql, param_types = dice_range_sql(None, by_city, by_category), DICE_RANGE_PARAM_TYPES
+    else:
+        sql, param_types = dice_quarter_aggregate_sql(None, by_city, by_category), DICE_QUARTER_PARAM_TYPES
+    used_types = {param: pg_type for param, pg_type in param_types.items() if f":{param}" in sql}
+    return prepared_statements.register(name, sql, used_types).name
+
+
+def quarter_bounds(date_from, date_to):
+    """((year, quarter), (year, quarter)) if the range covers whole quarters, else None."""
+    if date_from is None:
+        low = (1, 1)
+    elif date_from.day == 1 and date_from.month in (1, 4, 7, 10):
+        low = (date_from.year, (date_from.month - 1) // 3 + 1)
+    else:
+        return None
+    if date_to is None:
+        high = (9999, 4)
+    elif (date_to + timedelta(days=1)).day == 1 and date_to.month in (3, 6, 9, 12):
+        high = (date_to.year, (date_to.month - 1) // 3 + 1)
+    else:
+        return None
+    return low, high
+
+
+@app.get("/api/dice", dependencies=[Depends(query_policy("dice.range"))])
+async def run_raw_query(
+    city: List[str] = Query([], description="Cities to include (repeatable; none = all)"),
+    category: List[str] = Query([], description="Categories to include (repeatable; none = all)"),
+    date_from: Optional[date] = Query(None, description="First delivery date (inclusive)"),
+    date_to: Optional[date] = Query(None, description="Last delivery date (inclusive)"),
+    source: OlapSource = API_DEFAULT_SOURCE,
+    fmt: str = Depends(negotiate_format),
+):
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    if len(city) > DICE_MAX_VALUES or len(category) > DICE_MAX_VALUES:
+        raise HTTPException(status_code=400, detail=f"At most {DICE_MAX_VALUES} values per dimension")
+
+    cities, categories = sorted(set(city)), sorted(set(category))
+    by_city, by_category = bool(cities), bool(categories)
+    filters = {}
+    if by_city:
+        filters["cities"] = cities
+    if by_category:
+        filters["categories"] = categories
+    bounds = quarter_bounds(date_from, date_to)
+
+    try:
+        async def run(use_aggregate):
+            if use_aggregate:
+                (year_from, quarter_from), (year_to, quarter_to) = bounds
+                params = {
+                    "year_from": year_from, "quarter_from": quarter_from,
+                    "year_to": year_to, "quarter_to": quarter_to, **filters,
+                }
+                name = dice_statement("quarter", by_city, by_category)
+            else:
+                params = {"date_from": date_from or date.min, "date_to": date_to or date.max, **filters}
+                name = dice_statement("range", by_city, by_category)
+            columns, rows = await prepared_statements.fetch(name, params)
+            return ResultSet(columns, rows, ("total_revenue",))
+
+        async def compute():
+            # The engine answers any date range, before the whole-quarter check below
+            result = await run_columnar(source, lambda snapshot: snapshot.dice(
+                cities or None, categories or None, date_from, date_to
+            ))
+            if result is not None:
+                return result
+            # The quarter summary only answers ranges made of whole quarters
+            return await route_olap(
+                "agg_revenue_by_city_category_quarter", source if bounds else "raw", run
+            )
+
+        key = {
+            "cities": frozenset(cities), "categories": frozenset(categories),
+            "date_from": str(date_from), "date_to": str(date_to), "source": source,
+        }
+        return served(await cached("dice.range", key, compute), fmt)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/cities", dependencies=[Depends(query_policy("cities", "lookup"))])
+async def run_raw_query(
+    q: Optional[str] = Query(None, description="Optional search query to filter cities"),
+    prefix: bool = Query(False, description="Only match cities starting with q"),
+):
+    limit = 50 if q and q.strip() else 500
+    try:
+        await city_index.ensure_current()
+        return city_index.search(q, limit=limit, prefix_only=prefix)
+    except Exception as e:
+        logger.warning(f"City index unavailable, querying dim_users: {e}")
+
     try:
         if q and q.strip():
             # Use ILIKE for case-insensitive partial matching
-            sql = text("""
-                SELECT DISTINCT "City" FROM dim_users
-                WHERE "City" ILIKE :pattern
-                ORDER BY "City"
-                LIMIT 50
-            """)
-            pattern = f"%{q.strip()}%"
-            result = db.execute(sql, {"pattern": pattern})
+            pattern = f"{q.strip()}%" if prefix else f"%{q.strip()}%"
+            rows = await fetch_all(city_search_sql(), {"pattern": pattern})
         else:
-            sql = text("""
-                SELECT DISTINCT "City" FROM dim_users ORDER BY "City" LIMIT 500
-            """)
-            result = db.execute(sql)
-
-        rows = result.fetchall()
+            rows = await fetch_all(city_list_sql())
 
         return [row._mapping["City"] for row in rows]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
-@app.get("/api/categories")
-def run_raw_query(db: Session = Depends(get_db)):
+@app.get("/api/categories", dependencies=[Depends(query_policy("categories", "lookup"))])
+async def run_raw_query():
     try:
-        sql = text("""
-            SELECT DISTINCT "Category" FROM dim_products ORDER BY "Category"
-        """)
-        result = db.execute(sql)
-        rows = result.fetchall()
+        async def compute():
+            rows = await fetch_all(categories_sql())
+            return [row._mapping["Category"] for row in rows]
 
-        return [row._mapping["Category"] for row in rows]
+        return await cached("categories", {}, compute)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+class CubeFilter(BaseModel):
+    level: str
+    op: Literal["eq", "ne", "in", "gte", "lte", "between"] = "eq"
+    value: Any = None
+
+
+class CubeRequest(BaseModel):
+    levels: List[str] = Field(default_factory=list, description="Group-by levels, e.g. 'date.year'")
+    measures: List[str] = Field(default_factory=lambda: ["revenue"])
+    filters: List[CubeFilter] = Field(default_factory=list)
+    grouping: Optional[Literal["rollup", "cube", "grouping_sets"]] = None
+    grouping_sets: Optional[List[List[str]]] = None
+    order_by: Optional[List[str]] = None
+    limit: Optional[int] = None
+
+
+@app.get("/api/cube/model")
+async def run_raw_query():
+    return describe_model()
+
+
+@app.post("/api/cube", dependencies=[Depends(query_policy("cube", "cube"))])
+async def run_raw_query(request: CubeRequest, source: OlapSource = API_DEFAULT_SOURCE,
+                        fmt: str = Depends(negotiate_format)):
+    filters = [f.model_dump() for f in request.filters]
+    query_args = dict(
+        levels=request.levels,
+        measures=request.measures,
+        filters=filters,
+        grouping=request.grouping,
+        grouping_sets=request.grouping_sets,
+        order_by=request.order_by,
+        limit=request.limit,
+    )
+    try:
+        compiled = compile_cube_query(**query_args)
+    except CubeQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        async def compute():
+            # Filtered levels count too: the summary must carry every column it touches
+            aggregate = None
+            if source == "aggregate":
+                touched = set(request.levels) | {f["level"] for f in filters}
+                aggregate = await aggregate_navigator.choose(touched, request.measures)
+            if aggregate is not None:
+                try:
+                    routed = compile_cube_query(**query_args, aggregate=aggregate)
+                    columns, rows = await fetch_result(routed.sql, routed.params)
+                    return {"source": aggregate.name, "body": ResultSet(columns, rows, routed.revenue_keys)}
+                except HTTPException:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Cube query on {aggregate.name} failed, falling back to fact table: {e}")
+            columns, rows = await fetch_result(compiled.sql, compiled.params)
+            return {"source": FACT_SOURCE, "body": ResultSet(columns, rows, compiled.revenue_keys)}
+
+        # The compiled SQL plus binds fully determine the result
+        key = {"sql": str(compiled.sql), "params": repr(sorted(compiled.params.items())), "source": source}
+        return served(await cached("cube", key, compute), fmt)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/aggregates")
+async def run_raw_query():
+    return await aggregate_navigator.describe()
+
+
+@app.get("/api/admission")
+async def run_raw_query():
+    return admission_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def run_raw_query():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/traces")
+async def run_raw_query(
+    min_ms: float = Query(0.0, ge=0, description="Only requests slower than this"),
+    route: Optional[str] = Query(None, description="Route template, e.g. /api/slice/{city}"),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    return recent_traces(min_ms, route)[:limit]
+
 if __name__ == "__main__":
     logger.info("Starting FastAPI server...")
     uvicorn.run(
@@ -6,10 +6,18 @@ from util.db_warehouse import db_warehouse_engine, Session_db_warehouse
 from sqlalchemy import text
 from etl_scripts.rider_etl import transform_and_load_riders
 from etl_scripts.order_date_etl import load_transform_date_and_order_items
+from etl_scripts.reconciliation import reconcile_source_and_warehouse
+from etl_scripts.aggregates_etl import refresh_materialized_aggregates
+from util.warmup import warm_up_after_load, WARMUP_AFTER_LOAD
+from util.etl_batches import record_batch
+from util.bulk_load import BULK_LOAD_PROFILE, current_wal_lsn, wal_bytes_since, format_bytes
+from util.etl_lock import try_acquire_etl_lock, release_etl_lock, ETL_LOCK_KEY
+from datetime import datetime, timezone
 from util.logging_config import setup_logging, get_logger
 import time
 import sys
 import gc  # For garbage collection
+import os
 
 load_dotenv()
 
@@ -17,6 +25,9 @@ load_dotenv()
 setup_logging()
 logger = get_logger(__name__)
 
+# Checksum source vs warehouse after every successful load
+RECONCILE_AFTER_LOAD = os.getenv("RECONCILE_AFTER_LOAD", "true").lower() in ("true", "1", "yes")
+
 
 def test_database_connections():
     """Test connections to both source and warehouse databases."""
@@ -55,11 +66,16 @@ def run_etl_step(step_name, etl_function):
     try:
         logger.info(f"Starting ETL step: {step_name}")
         start_time = time.time()
+        wal_start = current_wal_lsn()
 
         etl_function()
 
         duration = time.time() - start_time
-        logger.info(f"Completed ETL step: {step_name} in {duration:.2f} seconds")
+        wal_bytes = wal_bytes_since(wal_start)
+        logger.info(
+            f"Completed ETL step: {step_name} in {duration:.2f} seconds "
+            f"(WAL generated: {format_bytes(wal_bytes)})"
+        )
         return True
 
     except Exception as e:
@@ -67,6 +83,36 @@ def run_etl_step(step_name, etl_function):
         return False
 
 
+def record_full_load(started_at, duration, partial=False):
+    """
+    Record the full reload in etl_batches so the micro-batch service resumes after it.
+
+    Each load step commits on its own (the dimension TRUNCATEs cascade to the
+    fact table), so a reload that failed part way has still changed the
+    warehouse. It is recorded as a 'partial' batch: that bumps the data version,
+    dropping the API's version-keyed caches and marking the summaries stale,
+    but with Last_Order_ID 0 it never moves the incremental watermark.
+    """
+    try:
+        with db_warehouse_engine.begin() as conn:
+            last_order_id, rows_loaded = conn.execute(text("""
+                SELECT COALESCE(MAX("Order_Item_ID") / 1000000, 0), COUNT(*)
+                FROM fact_order_items
+            """)).one()
+            if partial:
+                last_order_id = 0
+            record_batch(
+                conn, "partial" if partial else "full", started_at, last_order_id, rows_loaded,
+                int(duration * 1000),
+            )
+        if partial:
+            logger.warning("Recorded partial load batch; rerun the full ETL to complete the warehouse")
+        else:
+            logger.info(f"Recorded full load batch (watermark order id {last_order_id})")
+    except Exception as e:
+        logger.warning(f"Could not record full load batch: {e}")
+
+
 def display_sample_data():
     """Display sample data from each dimension and fact table."""
     try:
@@ -107,6 +153,8 @@ def main():
     logger.info("=" * 60)
 
     start_time = time.time()
+    started_at = datetime.now(timezone.utc)
+    lock_conn = None
 
     try:
         # Test database connections first
@@ -114,6 +162,15 @@ def main():
             logger.error("Database connection tests failed. Aborting ETL pipeline.")
             sys.exit(1)
 
+        # Only one loader (this or etl_service.py) may write to the warehouse
+        lock_conn = try_acquire_etl_lock()
+        if lock_conn is None:
+            logger.error(f"Another ETL loader holds advisory lock {ETL_LOCK_KEY}. Aborting.")
+            sys.exit(1)
+
+        logger.info(f"Bulk load profile: {BULK_LOAD_PROFILE}")
+        pipeline_wal_start = current_wal_lsn()
+
         # Define ETL steps in execution order
         etl_steps = [
             ("Load Riders", transform_and_load_riders),
@@ -139,6 +196,34 @@ def main():
                 # Uncomment the next line if you want to stop on first failure:
                 # break
 
+        loaded = not failed_steps
+        # Recorded even when a step failed: earlier steps (and a failed step's
+        # TRUNCATE) have already committed, so cached reads must be invalidated
+        record_full_load(started_at, time.time() - start_time, partial=not loaded)
+        if loaded:
+            # Refreshed after the full batch is recorded, so the aggregate navigator
+            # sees the summaries as up to date with this load
+            step_name = "Refresh Materialized Aggregates"
+            if run_etl_step(step_name, refresh_materialized_aggregates):
+                successful_steps.append(step_name)
+            else:
+                failed_steps.append(step_name)
+
+        # Verify the load against the source (only meaningful if every load step ran)
+        if RECONCILE_AFTER_LOAD and loaded:
+            step_name = "Reconcile Source and Warehouse"
+            if run_etl_step(step_name, reconcile_source_and_warehouse):
+                successful_steps.append(step_name)
+            else:
+                failed_steps.append(step_name)
+
+        # Last: reloaded tables and new indexes are cold in shared_buffers and the OS
+        # cache, so the first dashboard requests would otherwise pay for the reads
+        if WARMUP_AFTER_LOAD and loaded:
+            step_name = "Warm Up Caches"
+            if run_etl_step(step_name, warm_up_after_load):
+                successful_steps.append(step_name)
+
         # Display results summary
         total_duration = time.time() - start_time
 
@@ -146,6 +231,7 @@ def main():
         logger.info("ETL Pipeline Summary")
         logger.info("=" * 60)
         logger.info(f"Total execution time: {total_duration:.2f} seconds")
+        logger.info(f"Total WAL generated: {format_bytes(wal_bytes_since(pipeline_wal_start))}")
         logger.info(
             f"Successful steps ({len(successful_steps)}): {', '.join(successful_steps)}"
         )
@@ -180,6 +266,9 @@ def main():
     except Exception as e:
         logger.error(f"Unexpected error in ETL pipeline: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        if lock_conn is not None:
+            release_etl_lock(lock_conn)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+"""
+Closed-loop load test for the OLAP API: p50/p95/p99 latency per concurrency level.
+
+Start the API in the mode under test, then run this script against it:
+
+    QUERY_CACHE_ENABLED=false API_DB_MODE=sync  python api.py   # terminal 1
+    python benchmarks/api_concurrency.py --label sync  --output results.jsonl
+    QUERY_CACHE_ENABLED=false API_DB_MODE=async python api.py   # terminal 1 (restart)
+    python benchmarks/api_concurrency.py --label async --output results.jsonl
+    python benchmarks/api_concurrency.py --compare results.jsonl
+
+Each of --clients concurrent clients loops over --paths for --duration seconds.
+Errors (non-2xx, timeouts) are counted separately and excluded from latency.
+
+A {city} in a path is replaced by a different city on each request, cycling
+through the first --cities names from /api/cities. Repeated requests for the
+same target are still answered by the API's result cache, which would time the
+cache and not the warehouse: start the API with QUERY_CACHE_ENABLED=false (and
+the columnar engine off) to measure the database path. The "hits" column
+reports result cache hits per level, read from /metrics, so a cached run is
+easy to spot.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import quote
+
+import httpx
+
+# Parameterized, so consecutive requests ask the warehouse different questions
+DEFAULT_PATHS = [
+    "/api/slice/{city}",
+    "/api/slice/{city}?source=raw",
+    "/api/dice?city={city}",
+    "/api/cities?q=an",
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def client_loop(client, paths, cities, deadline, latencies, errors, offset):
+    i = offset
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        if "{city}" in path:
+            path = path.replace("{city}", quote(cities[i % len(cities)]))
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def read_cache_hits(client):
+    """query_cache_hits_total from /metrics (None when it can't be read)."""
+    try:
+        response = await client.get("/metrics")
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    for line in response.text.splitlines():
+        if line.startswith("query_cache_hits_total"):
+            return float(line.split()[-1])
+    return None
+
+
+async def load_cities(base_url, timeout, count):
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+        response = await client.get("/api/cities")
+        response.raise_for_status()
+        return response.json()[:count]
+
+
+async def run_level(base_url, paths, cities, clients, duration, timeout):
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        latencies, errors = [], []
+        hits_before = await read_cache_hits(client)
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            client_loop(client, paths, cities, deadline, latencies, errors, n) for n in range(clients)
+        ))
+        hits_after = await read_cache_hits(client)
+    latencies.sort()
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "cache_hits": int(hits_after - hits_before) if None not in (hits_before, hits_after) else None,
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(statistics.median(latencies), 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95), 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99), 1) if latencies else None,
+    }
+
+
+def print_rows(rows):
+    print(f"{'label':<8} {'clients':>7} {'req':>7} {'err':>6} {'hits':>7} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for row in rows:
+        print(
+            f"{row.get('label', ''):<8} {row['clients']:>7} {row['requests']:>7} {row['errors']:>6} "
+            f"{str(row.get('cache_hits')):>7} "
+            f"{row['rps']:>8} {str(row['p50_ms']):>9} {str(row['p95_ms']):>9} {str(row['p99_ms']):>9}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:4000")
+    parser.add_argument("--clients", default="50,200,1000", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per level")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout (s)")
+    parser.add_argument("--paths", default=",".join(DEFAULT_PATHS))
+    parser.add_argument("--cities", type=int, default=500, help="How many cities {city} cycles through")
+    parser.add_argument("--label", default="", help="Tag for this run, e.g. sync/async")
+    parser.add_argument("--output", help="Append results as JSON lines")
+    parser.add_argument("--compare", help="Print a side-by-side table from a results file and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        print_rows(sorted(rows, key=lambda r: (r["clients"], r.get("label", ""))))
+        return
+
+    paths = [p for p in args.paths.split(",") if p]
+    cities = []
+    if any("{city}" in path for path in paths):
+        cities = asyncio.run(load_cities(args.base_url, args.timeout, args.cities))
+        if not cities:
+            parser.error("/api/cities returned no cities to substitute for {city}")
+    rows = []
+    for clients in (int(c) for c in args.clients.split(",")):
+        row = asyncio.run(run_level(args.base_url, paths, cities, clients, args.duration, args.timeout))
+        row["label"] = args.label
+        rows.append(row)
+        print_rows([row])
+
+    if args.output:
+        with open(args.output, "a") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+
+if __name__ == "__main__":
+    main()
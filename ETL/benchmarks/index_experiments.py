@@ -0,0 +1,277 @@
+"""
+A/B comparison of index configurations for the OLAP workload.
+
+Point DATABASE_WAREHOUSE_URL at a scratch warehouse (e.g. one seeded with
+benchmarks/query_plans.py --seed), then:
+
+    python benchmarks/index_experiments.py                        # show the matrix, change nothing
+    python benchmarks/index_experiments.py --yes --output idx.json
+    python benchmarks/index_experiments.py --matrix my_matrix.json --configs none,per_query --yes
+
+For each configuration, the harness:
+
+1. Drops every non-constraint index on the fact and dimension tables.
+2. Builds that configuration's indexes, timing the build, and ANALYZEs.
+3. Measures ETL cost: it inserts --load-rows copies of existing fact rows,
+   times the insert, rolls it back and VACUUMs the fact table so the dead
+   rows don't skew the query timings.
+4. Warms the cache by running the workload --warmup times.
+5. Times each workload statement --runs times.
+
+The original indexes are restored at the end, even when a step fails.
+
+A matrix file is JSON: {"config name": [{"table": ..., "columns": [...],
+"include": [...], "where": ...}, ...]}; the special value null keeps the
+indexes currently defined (the migrations' configuration).
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from util.db_warehouse import db_warehouse_engine
+from benchmarks.query_plans import statement_catalog, measure
+
+EXPERIMENT_TABLES = ("fact_order_items", "dim_users", "dim_products", "dim_riders", "dim_date")
+
+# Raw statements read the fact table, so they are the ones indexes change;
+# summary-backed statements are unaffected and left out by default
+DEFAULT_WORKLOAD = (
+    "rollup.raw,drillDown.raw,drillDown.page.raw,slice.raw,slice.page.raw,dice.raw,dice.range,"
+    "cities,categories,cube.year_category.raw,cube.rollup_quarter.raw,cube.city_filtered.raw"
+)
+
+REVENUE_INCLUDE = ['"Total_Revenue"', '"Total_Revenue_Cents"']
+
+DEFAULT_MATRIX = {
+    # Whatever the migrations created
+    "current": None,
+    # Primary keys and unique constraints only
+    "none": [],
+    # One wide composite over the foreign keys (the original idx_fact_fk)
+    "fk_composite": [
+        {"table": "fact_order_items",
+         "columns": ['"Product_ID"', '"User_ID"', '"Delivery_Date_ID"', '"Total_Revenue"']},
+    ],
+    # One narrow covering index per access path, so each OLAP query can use an index-only scan
+    "per_query": [
+        {"table": "fact_order_items", "columns": ['"Delivery_Date_ID"'], "include": REVENUE_INCLUDE},
+        {"table": "fact_order_items", "columns": ['"Delivery_Rider_ID"'], "include": REVENUE_INCLUDE},
+        {"table": "fact_order_items", "columns": ['"User_ID"'],
+         "include": ['"Product_ID"', '"Delivery_Date_ID"'] + REVENUE_INCLUDE},
+        {"table": "dim_users", "columns": ['"City"'], "include": ['"Users_ID"']},
+        {"table": "dim_products", "columns": ['"Category"'], "include": ['"Product_ID"']},
+    ],
+    # per_query minus the dimension indexes, to isolate their contribution
+    "fact_only": [
+        {"table": "fact_order_items", "columns": ['"Delivery_Date_ID"'], "include": REVENUE_INCLUDE},
+        {"table": "fact_order_items", "columns": ['"Delivery_Rider_ID"'], "include": REVENUE_INCLUDE},
+        {"table": "fact_order_items", "columns": ['"User_ID"'],
+         "include": ['"Product_ID"', '"Delivery_Date_ID"'] + REVENUE_INCLUDE},
+    ],
+}
+
+_INDEXES_SQL = text("""
+    SELECT i.relname AS name, t.relname AS table_name, pg_get_indexdef(i.oid) AS definition
+    FROM pg_index x
+    JOIN pg_class i ON i.oid = x.indexrelid
+    JOIN pg_class t ON t.oid = x.indrelid
+    WHERE t.relname = ANY(:tables)
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+    ORDER BY t.relname, i.relname
+""")
+
+_INDEX_SIZE_SQL = text("""
+    SELECT COALESCE(SUM(pg_relation_size(x.indexrelid)), 0)
+    FROM pg_index x JOIN pg_class t ON t.oid = x.indrelid
+    WHERE t.relname = ANY(:tables)
+""")
+
+# Copies of existing facts under fresh ids; only the index maintenance differs between configurations
+_LOAD_SQL = text("""
+    INSERT INTO fact_order_items ("Order_Item_ID", "Product_ID", "Quantity", "Notes", "Delivery_Date_ID",
+                                  "Delivery_Rider_ID", "User_ID", "Order_Num", "Total_Revenue", "Total_Revenue_Cents")
+    SELECT "Order_Item_ID" + offset_id, "Product_ID", "Quantity", "Notes", "Delivery_Date_ID",
+           "Delivery_Rider_ID", "User_ID", "Order_Num", "Total_Revenue", "Total_Revenue_Cents"
+    FROM fact_order_items, (SELECT MAX("Order_Item_ID") AS offset_id FROM fact_order_items) m
+    LIMIT :rows
+""")
+
+
+def index_ddl(config_name, position, index):
+    columns = ", ".join(index["columns"])
+    safe_name = re.sub(r"\W", "_", config_name).lower()
+    ddl = f'CREATE INDEX idx_exp_{safe_name}_{position} ON {index["table"]} ({columns})'
+    if index.get("include"):
+        ddl += f' INCLUDE ({", ".join(index["include"])})'
+    if index.get("where"):
+        ddl += f' WHERE {index["where"]}'
+    return ddl
+
+
+def current_indexes(conn):
+    return conn.execute(_INDEXES_SQL, {"tables": list(EXPERIMENT_TABLES)}).mappings().all()
+
+
+def drop_indexes(conn):
+    for index in current_indexes(conn):
+        conn.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+
+
+def apply_config(config_name, indexes, original):
+    """Replace the experiment tables' indexes; returns build seconds."""
+    start = time.perf_counter()
+    with db_warehouse_engine.begin() as conn:
+        drop_indexes(conn)
+        if indexes is None:
+            statements = [index["definition"] for index in original]
+        else:
+            statements = [index_ddl(config_name, position, index) for position, index in enumerate(indexes)]
+        for ddl in statements:
+            conn.execute(text(ddl))
+    build_s = time.perf_counter() - start
+    with db_warehouse_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in EXPERIMENT_TABLES:
+            conn.execute(text(f"ANALYZE {table}"))
+    return build_s
+
+
+def measure_load(rows):
+    """Milliseconds to insert `rows` fact rows under the current indexes (rolled back, then vacuumed)."""
+    with db_warehouse_engine.connect() as conn:
+        transaction = conn.begin()
+        try:
+            start = time.perf_counter()
+            conn.execute(_LOAD_SQL, {"rows": rows})
+            load_ms = (time.perf_counter() - start) * 1000
+        finally:
+            transaction.rollback()
+    # The rolled-back rows stay behind as dead heap tuples and index entries until
+    # vacuumed, which would slow the workload timed next (and every later config)
+    with db_warehouse_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM fact_order_items"))
+    return load_ms
+
+
+def run_config(config_name, indexes, original, workload_prefixes, args):
+    build_s = apply_config(config_name, indexes, original)
+    with db_warehouse_engine.connect() as conn:
+        index_bytes = conn.execute(_INDEX_SIZE_SQL, {"tables": list(EXPERIMENT_TABLES)}).scalar()
+        index_names = [index["name"] for index in current_indexes(conn)]
+    load_ms = measure_load(args.load_rows)
+
+    with db_warehouse_engine.connect() as conn:
+        catalog = {
+            name: entry for name, entry in statement_catalog(conn).items() if name.startswith(workload_prefixes)
+        }
+        statements = {
+            name: measure(conn, sql, params, args.warmup, args.runs) for name, (sql, params) in catalog.items()
+        }
+
+    used = sorted({
+        name for result in statements.values() for line in result["plan"]
+        for name in index_names if f"using {name} on" in line
+    })
+    return {
+        "config": config_name,
+        "indexes": index_names,
+        "indexes_used": used,
+        "index_mb": round(index_bytes / 1024 / 1024, 1),
+        "build_s": round(build_s, 2),
+        "load_ms_per_1k": round(load_ms / args.load_rows * 1000, 2),
+        "statements": statements,
+    }
+
+
+def print_comparison(results):
+    names = list(results[0]["statements"])
+    print(f"{'config':<14} {'index MB':>9} {'build s':>8} {'load ms/1k':>11} {'total p50':>10} {'total p95':>10}  unused indexes")
+    for result in results:
+        p50 = sum(row["p50_ms"] for row in result["statements"].values())
+        p95 = sum(row["p95_ms"] for row in result["statements"].values())
+        unused = sorted(set(result["indexes"]) - set(result["indexes_used"]))
+        print(
+            f"{result['config']:<14} {result['index_mb']:>9} {result['build_s']:>8} {result['load_ms_per_1k']:>11} "
+            f"{p50:>10.1f} {p95:>10.1f}  {', '.join(unused) or '-'}"
+        )
+
+    print()
+    print(f"{'p50 ms':<26}" + "".join(f"{result['config']:>14}" for result in results))
+    for name in names:
+        cells = []
+        for result in results:
+            row = result["statements"].get(name)
+            cells.append(f"{row['p50_ms']:>14}" if row else f"{'-':>14}")
+        print(f"{name:<26}" + "".join(cells))
+
+    print()
+    for name in names:
+        print(name)
+        for result in results:
+            row = result["statements"].get(name)
+            if row:
+                top = next((line.strip() for line in row["plan"] if "Scan" in line), row["plan"][0].strip())
+                print(f"  {result['config']:<14} {top}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--matrix", help="JSON file of configurations (default: built-in matrix)")
+    parser.add_argument("--configs", help="Comma-separated subset of configurations to run")
+    parser.add_argument("--workload", default=DEFAULT_WORKLOAD, help="Comma-separated statement name prefixes")
+    parser.add_argument("--runs", type=int, default=20, help="Timed runs per statement")
+    parser.add_argument("--warmup", type=int, default=2, help="Cache-warming runs per statement")
+    parser.add_argument("--load-rows", type=int, default=50_000, help="Fact rows inserted to time index maintenance")
+    parser.add_argument("--output", help="Write the full results as JSON")
+    parser.add_argument("--yes", action="store_true", help="Actually drop/create indexes (scratch databases only)")
+    args = parser.parse_args()
+
+    matrix = DEFAULT_MATRIX
+    if args.matrix:
+        with open(args.matrix) as f:
+            matrix = json.load(f)
+    if args.configs:
+        wanted = args.configs.split(",")
+        unknown = set(wanted) - set(matrix)
+        if unknown:
+            raise SystemExit(f"Unknown configurations: {', '.join(sorted(unknown))}")
+        matrix = {name: matrix[name] for name in wanted}
+
+    with db_warehouse_engine.connect() as conn:
+        original = [dict(index) for index in current_indexes(conn)]
+
+    if not args.yes:
+        print("Index configurations (pass --yes to run; this drops and rebuilds indexes):")
+        for name, indexes in matrix.items():
+            print(f"\n{name}")
+            statements = [i["definition"] for i in original] if indexes is None else [
+                index_ddl(name, position, index) for position, index in enumerate(indexes)
+            ]
+            for ddl in statements or ["(no secondary indexes)"]:
+                print(f"  {ddl}")
+        return
+
+    results = []
+    try:
+        for name, indexes in matrix.items():
+            print(f"Running configuration {name}...")
+            results.append(run_config(name, indexes, original, tuple(args.workload.split(",")), args))
+    finally:
+        print("Restoring original indexes...")
+        apply_config("restore", None, original)
+
+    if results:
+        print()
+        print_comparison(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+Plan-shape and latency regression check for every SQL statement the API runs.
+
+Point DATABASE_WAREHOUSE_URL at a scratch PostgreSQL database, then:
+
+    python benchmarks/query_plans.py --seed --scale 10            # migrate + load synthetic data
+    python benchmarks/query_plans.py --update-baseline            # record on the reference setup
+    python benchmarks/query_plans.py                              # compare; exit 1 on regression
+
+Seeding runs `alembic upgrade head`, fills the dimensions and fact_order_items
+with deterministic synthetic data (--scale x 100k fact rows, skewed so a few
+cities and products dominate, like production), refreshes the summary views
+and ANALYZEs. It refuses to overwrite a loaded warehouse without --reseed.
+
+Each statement is run --warmup times, then timed --runs times (execute +
+fetch), then once under EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON). The run
+fails when a plan's shape changes (node types, join/aggregate strategies,
+scanned relations and indexes; row counts and costs are ignored), when p95
+grows beyond --tolerance of the baseline (and by more than --min-delta-ms),
+or when shared buffers touched grow beyond --buffer-tolerance.
+"""
+import argparse
+import difflib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import date, datetime, timezone
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+from util.db_warehouse import db_warehouse_engine
+from util.olap_queries import (
+    rollup_sql, drilldown_sql, slice_sql, dice_sql,
+    rollup_aggregate_sql, drilldown_aggregate_sql, slice_aggregate_sql, dice_aggregate_sql,
+    drilldown_keyset_select, drilldown_aggregate_keyset_select, DRILLDOWN_KEYS,
+    slice_keyset_select, slice_aggregate_keyset_select, SLICE_KEYS,
+    dice_range_sql, dice_quarter_aggregate_sql,
+    slice_ranking_sql, slice_ranking_page_sql,
+    city_search_sql, city_list_sql, categories_sql,
+)
+from util.pagination import keyset_page_sql
+from util.cube import compile_cube_query
+from util.aggregate_navigator import AGGREGATES
+from etl_scripts.aggregates_etl import MATERIALIZED_AGGREGATES
+from util.etl_batches import record_batch
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines", "query_plans.json")
+
+FACT_ROWS_PER_SCALE = 100_000
+SEED_CITIES = 200
+SEED_CATEGORIES = 12
+SEED_PRODUCTS = 2_000
+SEED_RIDERS = 500
+SEED_DATE_FROM = date(2023, 1, 1)
+SEED_DATE_TO = date(2025, 12, 31)
+
+# Server settings that change plans; stored with the baseline for context
+PLAN_SETTINGS = (
+    "server_version", "shared_buffers", "work_mem", "effective_cache_size",
+    "random_page_cost", "max_parallel_workers_per_gather", "jit",
+)
+
+# Cube requests benchmarked against the fact table and their covering summary
+CUBE_CASES = {
+    "cube.year_category": dict(levels=["date.year", "product.category"], measures=["revenue", "quantity"]),
+    "cube.rollup_quarter": dict(levels=["date.year", "date.quarter"], measures=["revenue"], grouping="rollup"),
+    "cube.city_filtered": dict(
+        levels=["customer.city", "product.category"], measures=["revenue"],
+        filters=[{"level": "date.year", "op": "eq", "value": 2025}],
+    ),
+}
+
+
+def seed_warehouse(scale, reseed):
+    """Migrate and load deterministic synthetic data."""
+    from alembic import command
+    from alembic.config import Config
+
+    etl_dir = os.path.dirname(BENCH_DIR)
+    config = Config(os.path.join(etl_dir, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(etl_dir, "alembic"))
+    command.upgrade(config, "head")
+
+    fact_rows = scale * FACT_ROWS_PER_SCALE
+    users = max(1_000, fact_rows // 50)
+    with db_warehouse_engine.begin() as conn:
+        loaded = conn.execute(text("SELECT EXISTS (SELECT 1 FROM fact_order_items)")).scalar()
+        if loaded and not reseed:
+            raise SystemExit("fact_order_items already has rows; pass --reseed to replace them")
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        conn.execute(text(
+            "TRUNCATE fact_order_items, dim_date, dim_products, dim_users, dim_riders, etl_batches"
+        ))
+        conn.execute(text("SELECT setseed(0.42)"))
+        conn.execute(text("""
+            INSERT INTO dim_date ("Date_ID", "Date", "Year", "Month", "Day", "Quarter")
+            SELECT to_char(d, 'YYYYMMDD')::int, d, EXTRACT(YEAR FROM d), EXTRACT(MONTH FROM d),
+                   EXTRACT(DAY FROM d), EXTRACT(QUARTER FROM d)
+            FROM generate_series(CAST(:date_from AS date), CAST(:date_to AS date), interval '1 day') AS g(d)
+        """), {"date_from": SEED_DATE_FROM, "date_to": SEED_DATE_TO})
+        conn.execute(text("""
+            INSERT INTO dim_products ("Product_ID", "Product_Code", "Category", "Description", "Name", "Price", "Price_Cents")
+            SELECT g, 'P' || g, 'Category ' || (g % :categories), 'Synthetic product ' || g, 'Product ' || g,
+                   price, (price * 100)::bigint
+            FROM (SELECT g, round((1 + random() * 499)::numeric, 2) AS price
+                  FROM generate_series(1, :products) AS g) p
+        """), {"categories": SEED_CATEGORIES, "products": SEED_PRODUCTS})
+        # City popularity falls off quadratically, so a handful of cities hold most users
+        conn.execute(text("""
+            INSERT INTO dim_users ("Users_ID", "Username", "First_Name", "Last_Name", "City", "Country", "Zipcode", "Gender")
+            SELECT g, 'user' || g, 'First' || g, 'Last' || g,
+                   'City ' || floor(power(random(), 2) * :cities)::int, 'Country', lpad((g % 100000)::text, 5, '0'),
+                   CASE WHEN g % 2 = 0 THEN 'Female' ELSE 'Male' END
+            FROM generate_series(1, :users) AS g
+        """), {"cities": SEED_CITIES, "users": users})
+        conn.execute(text("""
+            INSERT INTO dim_riders ("Rider_ID", "First_Name", "Last_Name", "Vehicle_Type", "Age", "Gender", "Courier_Name")
+            SELECT g, 'Rider' || g, 'Last' || g, (ARRAY['Bike', 'Car', 'Scooter'])[1 + g % 3], 20 + g % 40,
+                   CASE WHEN g % 2 = 0 THEN 'Female' ELSE 'Male' END, 'Courier ' || (g % 8)
+            FROM generate_series(1, :riders) AS g
+        """), {"riders": SEED_RIDERS})
+        # Three items per order; Order_Item_ID = order * 1e6 + item, as the ETL assigns it
+        conn.execute(text("""
+            INSERT INTO fact_order_items ("Order_Item_ID", "Product_ID", "Quantity", "Notes", "Delivery_Date_ID",
+                                          "Delivery_Rider_ID", "User_ID", "Order_Num", "Total_Revenue", "Total_Revenue_Cents")
+            SELECT (g / 3 + 1) * 1000000 + g % 3, f.product_id, f.quantity, NULL, to_char(f.day, 'YYYYMMDD')::int,
+                   f.rider_id, f.user_id, 'ORD' || (g / 3 + 1), f.quantity * dp."Price", f.quantity * dp."Price_Cents"
+            FROM (
+                SELECT g,
+                       1 + floor(power(random(), 3) * :products)::int AS product_id,
+                       1 + floor(random() * 5)::int AS quantity,
+                       CAST(:date_from AS date) + floor(random() * (CAST(:date_to AS date) - CAST(:date_from AS date) + 1))::int AS day,
+                       1 + floor(random() * :riders)::int AS rider_id,
+                       1 + floor(random() * :users)::int AS user_id
+                FROM generate_series(0, :rows - 1) AS g
+            ) f
+            JOIN dim_products dp ON dp."Product_ID" = f.product_id
+        """), {
+            "products": SEED_PRODUCTS, "riders": SEED_RIDERS, "users": users, "rows": fact_rows,
+            "date_from": SEED_DATE_FROM, "date_to": SEED_DATE_TO,
+        })
+        last_order_id = conn.execute(text('SELECT MAX("Order_Item_ID") / 1000000 FROM fact_order_items')).scalar()
+        record_batch(conn, "full", started_at, last_order_id, fact_rows, int((time.perf_counter() - started) * 1000))
+        for view_name in MATERIALIZED_AGGREGATES:
+            conn.execute(text(f"REFRESH MATERIALIZED VIEW {view_name}"))
+
+    with db_warehouse_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE"))
+    print(f"Seeded {fact_rows:,} fact rows ({users:,} users) in {time.perf_counter() - started:.1f}s")
+
+
+def pick_parameters(conn):
+    """Busiest cities/categories, so slice and dice touch real data."""
+    cities = conn.execute(text("""
+        SELECT du."City" FROM fact_order_items foi
+        JOIN dim_users du ON du."Users_ID" = foi."User_ID"
+        GROUP BY du."City" ORDER BY COUNT(*) DESC LIMIT 2
+    """)).scalars().all()
+    categories = conn.execute(text("""
+        SELECT dp."Category" FROM fact_order_items foi
+        JOIN dim_products dp ON dp."Product_ID" = foi."Product_ID"
+        GROUP BY dp."Category" ORDER BY COUNT(*) DESC LIMIT 2
+    """)).scalars().all()
+    latest_year = conn.execute(text("""
+        SELECT MAX(dd."Year") FROM fact_order_items foi JOIN dim_date dd ON dd."Date_ID" = foi."Delivery_Date_ID"
+    """)).scalar()
+    if len(cities) < 2 or len(categories) < 2 or latest_year is None:
+        raise RuntimeError("Warehouse needs at least 2 cities and 2 categories loaded (try --seed)")
+    return cities, categories, latest_year
+
+
+def statement_catalog(conn):
+    """name -> (sql, params) for every statement shape api.py can issue."""
+    cities, categories, year = pick_parameters(conn)
+    page = {"limit": 101}
+    catalog = {
+        "rollup.raw": (rollup_sql(), {}),
+        "rollup.aggregate": (rollup_aggregate_sql(), {}),
+        "drillDown.raw": (drilldown_sql(), {}),
+        "drillDown.aggregate": (drilldown_aggregate_sql(), {}),
+        "drillDown.page.raw": (keyset_page_sql(drilldown_keyset_select(), DRILLDOWN_KEYS, False), page),
+        "drillDown.page.aggregate": (keyset_page_sql(drilldown_aggregate_keyset_select(), DRILLDOWN_KEYS, False), page),
+        "slice.raw": (slice_sql(), {"city": cities[0]}),
+        "slice.aggregate": (slice_aggregate_sql(), {"city": cities[0]}),
+        "slice.page.raw": (keyset_page_sql(slice_keyset_select(), SLICE_KEYS, False), {**page, "city": cities[0]}),
+        "slice.page.aggregate": (
+            keyset_page_sql(slice_aggregate_keyset_select(), SLICE_KEYS, False), {**page, "city": cities[0]}
+        ),
+        "slice.ranking": (slice_ranking_sql(), {"city": cities[0]}),
+        "slice.ranking.page": (slice_ranking_page_sql(False), {**page, "city": cities[0]}),
+        "dice.raw": (dice_sql(), {
+            "city1": cities[0], "city2": cities[1], "category1": categories[0], "category2": categories[1],
+        }),
+        "dice.aggregate": (dice_aggregate_sql(), {
+            "city1": cities[0], "city2": cities[1], "category1": categories[0], "category2": categories[1],
+        }),
+        "dice.range": (text(dice_range_sql()), {
+            "cities": cities, "categories": categories,
+            "date_from": date(year, 1, 15), "date_to": date(year, 11, 20),
+        }),
+        "dice.quarter.aggregate": (text(dice_quarter_aggregate_sql()), {
+            "cities": cities, "categories": categories,
+            "year_from": year, "quarter_from": 1, "year_to": year, "quarter_to": 4,
+        }),
+        "cities.search": (city_search_sql(), {"pattern": "%ity 1%"}),
+        "cities.list": (city_list_sql(), {}),
+        "categories": (categories_sql(), {}),
+    }
+    for name, request in CUBE_CASES.items():
+        compiled = compile_cube_query(**request)
+        catalog[f"{name}.raw"] = (compiled.sql, compiled.params)
+        touched = set(request["levels"]) | {f["level"] for f in request.get("filters", [])}
+        aggregate = next((a for a in AGGREGATES if a.covers(touched, request["measures"])), None)
+        if aggregate is not None:
+            routed = compile_cube_query(**request, aggregate=aggregate)
+            catalog[f"{name}.aggregate"] = (routed.sql, routed.params)
+    return catalog
+
+
+def plan_shape(node, depth=0):
+    """Indented node outline without costs or row counts (stable across runs)."""
+    label = node["Node Type"]
+    for key in ("Strategy", "Join Type", "Scan Direction"):
+        if key in node and not (key == "Scan Direction" and node[key] == "Forward"):
+            label += f" [{node[key]}]"
+    if "Index Name" in node:
+        label += f" using {node['Index Name']}"
+    if "Relation Name" in node:
+        label += f" on {node['Relation Name']}"
+    if node.get("Parent Relationship") in ("InitPlan", "SubPlan"):
+        label = f"{node['Parent Relationship']}: {label}"
+    lines = ["  " * depth + label]
+    for child in node.get("Plans", []):
+        lines += plan_shape(child, depth + 1)
+    return lines
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def measure(conn, sql, params, warmup, runs):
+    for _ in range(warmup):
+        conn.execute(sql, params).fetchall()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+
+    sql_text = sql.text if isinstance(sql, TextClause) else str(sql)
+    plan = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql_text}"), params).scalar()[0]
+    root = plan["Plan"]
+    conn.rollback()
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 0.95), 3),
+        "p99_ms": round(percentile(timings, 0.99), 3),
+        "shared_hit_blocks": root.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": root.get("Shared Read Blocks", 0),
+        "plan": plan_shape(root),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms, buffer_tolerance):
+    """Regression messages (empty list = pass)."""
+    failures = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"  new statement (not in baseline): {name}")
+            continue
+        if current["plan"] != previous["plan"]:
+            diff = "\n".join(difflib.unified_diff(previous["plan"], current["plan"], "baseline", "current", lineterm=""))
+            failures.append(f"{name}: plan changed\n{diff}")
+        limit = previous["p95_ms"] * (1 + tolerance)
+        if current["p95_ms"] > limit and current["p95_ms"] - previous["p95_ms"] > min_delta_ms:
+            failures.append(f"{name}: p95 {current['p95_ms']} ms vs baseline {previous['p95_ms']} ms")
+        # hit + read is stable for a given plan and data; the split depends on cache state
+        touched = current["shared_hit_blocks"] + current["shared_read_blocks"]
+        previously = previous["shared_hit_blocks"] + previous["shared_read_blocks"]
+        if previously and touched > previously * (1 + buffer_tolerance):
+            failures.append(f"{name}: {touched} shared buffers touched vs baseline {previously}")
+    for name in baseline:
+        if name not in results:
+            print(f"  statement missing from this run: {name}")
+    return failures
+
+
+def print_rows(results, baseline):
+    print(f"{'statement':<30} {'p50':>9} {'p95':>9} {'p99':>9} {'base p95':>9} {'hit':>9} {'read':>8}  top node")
+    for name, row in results.items():
+        base = baseline.get(name, {}).get("p95_ms", "")
+        print(
+            f"{name:<30} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {base:>9} "
+            f"{row['shared_hit_blocks']:>9} {row['shared_read_blocks']:>8}  {row['plan'][0].strip()}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seed", action="store_true", help="Migrate and load synthetic data first")
+    parser.add_argument("--reseed", action="store_true", help="Allow --seed to replace loaded data")
+    parser.add_argument("--scale", type=int, default=10, help="Fact rows in units of 100k (with --seed)")
+    parser.add_argument("--runs", type=int, default=50, help="Timed runs per statement")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed runs per statement")
+    parser.add_argument("--only", help="Comma-separated statement name prefixes")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative p95 growth")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore p95 growth smaller than this")
+    parser.add_argument("--buffer-tolerance", type=float, default=0.25, help="Allowed relative buffer growth")
+    parser.add_argument("--output", help="Write this run's results as JSON")
+    args = parser.parse_args()
+
+    if args.seed:
+        seed_warehouse(args.scale, args.reseed)
+
+    with db_warehouse_engine.connect() as conn:
+        settings = {name: conn.execute(text(f"SHOW {name}")).scalar() for name in PLAN_SETTINGS}
+        fact_rows = conn.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'fact_order_items'")).scalar()
+        catalog = statement_catalog(conn)
+        if args.only:
+            prefixes = tuple(args.only.split(","))
+            catalog = {name: entry for name, entry in catalog.items() if name.startswith(prefixes)}
+        results = {name: measure(conn, sql, params, args.warmup, args.runs) for name, (sql, params) in catalog.items()}
+
+    run = {"fact_rows": fact_rows, "settings": settings, "host": platform.node(), "statements": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(run, f, indent=2)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print_rows(results, {})
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print_rows(results, {})
+        raise SystemExit(f"\nNo baseline at {args.baseline}; record one with --update-baseline")
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    print_rows(results, baseline["statements"])
+    if baseline.get("fact_rows") and fact_rows and abs(fact_rows - baseline["fact_rows"]) > 0.1 * baseline["fact_rows"]:
+        print(f"\nWarning: {fact_rows:,} fact rows vs {baseline['fact_rows']:,} in the baseline; seed the same --scale")
+    for name in PLAN_SETTINGS:
+        if baseline.get("settings", {}).get(name) not in (None, settings[name]):
+            print(f"Warning: {name} = {settings[name]} (baseline {baseline['settings'][name]})")
+
+    print()
+    failures = compare(results, baseline["statements"], args.tolerance, args.min_delta_ms, args.buffer_tolerance)
+    if failures:
+        print(f"{len(failures)} regression(s):")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("No plan changes or regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark the four OLAP queries under NUMERIC vs BIGINT-cents revenue storage.
+
+Run from the ETL directory after an ETL load (both columns are populated):
+
+    python benchmarks/revenue_storage.py --runs 20
+
+Each query is executed once to warm the cache, then timed --runs times per
+representation. Timings include fetching and converting rows the same way the
+API does, so Decimal materialization cost is part of the comparison.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from util.db_warehouse import db_warehouse_engine
+from util.olap_queries import rollup_sql, drilldown_sql, slice_sql, dice_sql
+from util.revenue import convert_revenue_rows, REVENUE_STORAGES
+
+
+def pick_parameters(conn):
+    """Use the busiest cities/categories so slice and dice touch real data."""
+    cities = conn.execute(text("""
+        SELECT du."City" FROM fact_order_items foi
+        JOIN dim_users du ON du."Users_ID" = foi."User_ID"
+        GROUP BY du."City" ORDER BY COUNT(*) DESC LIMIT 2
+    """)).scalars().all()
+    categories = conn.execute(text("""
+        SELECT dp."Category" FROM fact_order_items foi
+        JOIN dim_products dp ON dp."Product_ID" = foi."Product_ID"
+        GROUP BY dp."Category" ORDER BY COUNT(*) DESC LIMIT 2
+    """)).scalars().all()
+    if len(cities) < 2 or len(categories) < 2:
+        raise RuntimeError("Warehouse needs at least 2 cities and 2 categories loaded")
+    return cities, categories
+
+
+def time_query(conn, sql, params, revenue_keys, storage, runs):
+    """Return per-run latencies in milliseconds (first warm-up run discarded)."""
+    convert_revenue_rows(conn.execute(sql, params).fetchall(), revenue_keys, storage)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        rows = conn.execute(sql, params).fetchall()
+        convert_revenue_rows(rows, revenue_keys, storage)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10, help="Timed runs per query")
+    args = parser.parse_args()
+
+    with db_warehouse_engine.connect() as conn:
+        cities, categories = pick_parameters(conn)
+        queries = [
+            ("rollup", rollup_sql, {}, ("revenue",)),
+            ("drillDown", drilldown_sql, {}, ("total_revenue",)),
+            ("slice", slice_sql, {"city": cities[0]}, ("total_revenue",)),
+            ("dice", dice_sql, {
+                "city1": cities[0], "city2": cities[1],
+                "category1": categories[0], "category2": categories[1],
+            }, ("total_revenue",)),
+        ]
+
+        print(f"{'query':<10} {'storage':<8} {'p50 ms':>9} {'p95 ms':>9} {'min ms':>9}")
+        summary = {}
+        for name, build_sql, params, revenue_keys in queries:
+            for storage in REVENUE_STORAGES:
+                timings = sorted(time_query(
+                    conn, build_sql(storage), params, revenue_keys, storage, args.runs
+                ))
+                p50 = statistics.median(timings)
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                summary[(name, storage)] = p50
+                print(f"{name:<10} {storage:<8} {p50:>9.2f} {p95:>9.2f} {timings[0]:>9.2f}")
+
+        print()
+        for name, *_ in queries:
+            speedup = summary[(name, "numeric")] / summary[(name, "cents")]
+            print(f"{name:<10} cents speedup (p50): {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
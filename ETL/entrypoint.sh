@@ -40,5 +40,9 @@ echo ""
 echo "Starting ETL pipeline..."
 echo "============================================"
 
-# Run the main ETL application
-exec python app.py
+# Run the ETL: one-shot full reload (default) or long-running micro-batch service
+if [ "${ETL_MODE:-batch}" = "service" ]; then
+    exec python etl_service.py
+else
+    exec python app.py
+fi
@@ -0,0 +1,85 @@
+from util.db_warehouse import db_warehouse_engine
+from util.logging_config import get_logger
+from util.etl_batches import get_warehouse_watermark, record_batch
+from sqlalchemy import text
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import time
+import os
+
+# Views built from other summaries (migration 4c9e2f7b1a63), refreshed once
+# the views they read are done
+DERIVED_AGGREGATES = [
+    "agg_product_rank_by_city",
+]
+
+# Materialized views created by migrations 8a41c7d2e9f5 and c61e4b8f0a27
+# (read by the API endpoints and util/aggregate_navigator.py), in refresh order
+MATERIALIZED_AGGREGATES = [
+    "agg_revenue_by_month",
+    "agg_revenue_by_rider",
+    "agg_revenue_by_city_product",
+    "agg_revenue_by_city_category_quarter",
+    "agg_revenue_by_day_product",
+    *DERIVED_AGGREGATES,
+]
+
+# Views are refreshed in parallel, each on its own connection
+AGGREGATE_REFRESH_WORKERS = int(os.getenv("AGGREGATE_REFRESH_WORKERS") or 4)
+
+logger = get_logger(__name__)
+
+
+def refresh_materialized_view(view_name):
+    """
+    Refresh one view; CONCURRENTLY keeps it readable by the API during the refresh.
+
+    CONCURRENTLY is not allowed on a view that was never populated, so the first
+    refresh falls back to a plain REFRESH.
+    """
+    start = time.perf_counter()
+    with db_warehouse_engine.connect() as conn:
+        populated = conn.execute(
+            text("SELECT ispopulated FROM pg_matviews WHERE matviewname = :name"),
+            {"name": view_name},
+        ).scalar()
+        if populated is None:
+            raise RuntimeError(f"Materialized view {view_name} does not exist (run alembic upgrade)")
+
+        concurrently = "CONCURRENTLY " if populated else ""
+        conn.execute(text(f"REFRESH MATERIALIZED VIEW {concurrently}{view_name}"))
+        conn.commit()
+
+    duration = time.perf_counter() - start
+    logger.info(f"  Refreshed {view_name} ({'concurrent' if populated else 'initial'}) in {duration:.2f}s")
+    return duration
+
+
+def refresh_materialized_aggregates():
+    """
+    Final ETL stage: refresh every summary view, then record an 'aggregates' batch.
+
+    The batch row bumps the warehouse data version, so API result caches are
+    dropped only once the summaries match the newly loaded facts.
+    """
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    logger.info(f"Refreshing {len(MATERIALIZED_AGGREGATES)} materialized aggregates...")
+
+    with ThreadPoolExecutor(
+        max_workers=AGGREGATE_REFRESH_WORKERS, thread_name_prefix="refresh"
+    ) as pool:
+        # list() re-raises the first failure
+        list(pool.map(
+            refresh_materialized_view,
+            [name for name in MATERIALIZED_AGGREGATES if name not in DERIVED_AGGREGATES],
+        ))
+    for view_name in DERIVED_AGGREGATES:
+        refresh_materialized_view(view_name)
+
+    with db_warehouse_engine.begin() as conn:
+        record_batch(
+            conn, "aggregates", started_at, get_warehouse_watermark(conn), 0,
+            int((time.perf_counter() - start) * 1000),
+        )
+    logger.info("✅ Materialized aggregates refreshed")
@@ -0,0 +1,179 @@
+from util.db_source import orders, users, riders, products, db_source_engine
+from util.db_warehouse import db_warehouse_engine
+from util.logging_config import get_logger
+from util.utils import parse_date
+from models.Dim_Users import Dim_Users
+from models.Dim_Riders import Dim_Rider
+from models.Dim_Products import Dim_Products
+from models.Dim_Date import Dim_Date
+from models.Fact_Order_Items import Fact_Order_Items
+from util.etl_batches import get_warehouse_watermark, record_batch
+from etl_scripts.users_etl import users_source_stmt, transform_user_row
+from etl_scripts.rider_etl import riders_source_stmt, transform_rider_row
+from etl_scripts.products_etl import products_source_stmt, transform_product_row
+from etl_scripts.order_date_etl import (
+    order_items_source_stmt, build_fact_record, date_record, FACT_COLUMNS,
+)
+from sqlalchemy import select, func, text
+from datetime import datetime, timezone
+import pandas as pd
+import time
+import os
+import io
+import csv
+
+# Max source orders pulled per micro-batch (keeps each warehouse transaction short)
+MICRO_BATCH_ORDERS = int(os.getenv("MICRO_BATCH_ORDERS") or 5000)
+
+logger = get_logger(__name__)
+
+
+def get_source_high_watermark():
+    """Highest Orders.id currently in the source."""
+    with db_source_engine.connect() as conn:
+        return conn.execute(select(func.max(orders.c.id))).scalar() or 0
+
+
+def _copy_insert_missing(conn, table_name, columns, records, key_column):
+    """
+    COPY records into a temp table and INSERT ... ON CONFLICT DO NOTHING.
+
+    Same staging pattern as load_all_delivery_dates(); existing rows are kept,
+    so re-running a batch is idempotent.
+    """
+    if not records:
+        return 0
+
+    staging = f"staging_{table_name}"
+    conn.execute(text(
+        f"CREATE TEMP TABLE {staging} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP"
+    ))
+
+    csv_buffer = io.StringIO()
+    writer = csv.writer(csv_buffer)
+    for record in records:
+        writer.writerow([record[column] for column in columns])
+    csv_buffer.seek(0)
+
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    cursor = conn.connection.cursor()
+    cursor.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN WITH CSV", csv_buffer)
+
+    result = conn.execute(text(f"""
+        INSERT INTO {table_name} ({column_list})
+        SELECT {column_list} FROM {staging}
+        ON CONFLICT ("{key_column}") DO NOTHING
+    """))
+    return result.rowcount
+
+
+def _missing_keys(conn, table_name, key_column, keys):
+    """Return the subset of keys not yet present in a dimension table."""
+    if not keys:
+        return set()
+    existing = conn.execute(
+        text(f'SELECT "{key_column}" FROM {table_name} WHERE "{key_column}" = ANY(:keys)'),
+        {"keys": list(keys)},
+    ).scalars().all()
+    return set(keys) - set(existing)
+
+
+def _load_missing_dimensions(wh_conn, src_conn, rows):
+    """
+    Insert dimension members referenced by new facts but not yet in the warehouse.
+
+    Dimensions are insert-only in micro-batch mode; attribute changes to existing
+    members are picked up by the next full reload (app.py).
+    """
+    dimensions = [
+        (Dim_Users, "Users_ID", users, users_source_stmt, transform_user_row,
+         {row.User_ID for row in rows}),
+        (Dim_Rider, "Rider_ID", riders, riders_source_stmt, transform_rider_row,
+         {row.Delivery_Rider_ID for row in rows}),
+        (Dim_Products, "Product_ID", products, products_source_stmt, transform_product_row,
+         {row.Product_ID for row in rows}),
+    ]
+
+    for model, key_column, source_table, source_stmt, transform, keys in dimensions:
+        missing = _missing_keys(wh_conn, model.__tablename__, key_column, keys)
+        if not missing:
+            continue
+        source_rows = src_conn.execute(source_stmt().where(source_table.c.id.in_(missing))).all()
+        records = [transform(row) for row in source_rows]
+        columns = list(records[0].keys()) if records else []
+        inserted = _copy_insert_missing(wh_conn, model.__tablename__, columns, records, key_column)
+        logger.info(f"  Added {inserted} new members to {model.__tablename__}")
+
+
+def load_micro_batch(watermark, max_orders=MICRO_BATCH_ORDERS):
+    """
+    Load the next slice of source orders above the watermark in one short transaction.
+
+    Args:
+        watermark (int): Highest Orders.id already loaded
+        max_orders (int): Upper bound on orders pulled in this batch
+
+    Returns:
+        dict | None: Batch stats (last_order_id, rows_loaded, duration_ms), or
+        None when the source has no new orders
+    """
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+
+    with db_source_engine.connect() as src_conn:
+        # Bound the batch by order id so an order's items never straddle two batches
+        next_orders = (
+            select(orders.c.id)
+            .where(orders.c.id > watermark)
+            .order_by(orders.c.id)
+            .limit(max_orders)
+            .subquery()
+        )
+        upper = src_conn.execute(select(func.max(next_orders.c.id))).scalar()
+        if upper is None:
+            return None
+
+        rows = src_conn.execute(
+            order_items_source_stmt().where(orders.c.id > watermark, orders.c.id <= upper)
+        ).all()
+
+        # Resolve delivery dates; Date_ID is derived from the date itself
+        date_records = {}
+        date_ids = {}
+        for raw in {row.Delivery_Date_Raw for row in rows if row.Delivery_Date_Raw}:
+            parsed = parse_date(raw)
+            if pd.notna(parsed):
+                record = date_record(parsed)
+                date_records[record["Date_ID"]] = record
+                date_ids[raw] = record["Date_ID"]
+
+        price_cents_cache = {}
+        fact_records = []
+        skipped = 0
+        for row in rows:
+            delivery_date_id = date_ids.get(row.Delivery_Date_Raw)
+            if delivery_date_id is None:
+                skipped += 1
+                continue
+            fact_records.append(build_fact_record(row, delivery_date_id, price_cents_cache))
+
+        with db_warehouse_engine.connect() as wh_conn:
+            with wh_conn.begin():
+                _load_missing_dimensions(wh_conn, src_conn, rows)
+                _copy_insert_missing(
+                    wh_conn, Dim_Date.__tablename__,
+                    ["Date_ID", "Date", "Year", "Month", "Day", "Quarter"],
+                    list(date_records.values()), "Date_ID",
+                )
+                inserted = _copy_insert_missing(
+                    wh_conn, Fact_Order_Items.__tablename__, FACT_COLUMNS,
+                    fact_records, "Order_Item_ID",
+                )
+                duration_ms = int((time.perf_counter() - start) * 1000)
+                record_batch(wh_conn, "micro", started_at, upper, inserted, duration_ms)
+
+    logger.info(
+        f"Micro-batch loaded orders ({watermark}, {upper}]: {inserted} rows "
+        f"(skipped {skipped} with unparseable dates) in {duration_ms} ms"
+    )
+    return {"last_order_id": upper, "rows_loaded": inserted, "duration_ms": duration_ms}
@@ -6,8 +6,12 @@ import pandas as pd
 from util.db_source import Session_db_source
 from util.db_warehouse import Session_db_warehouse, db_warehouse_engine
 from util.logging_config import get_logger
+from util.bulk_load import plan_bulk_load, begin_bulk_load, copy_options
 import os
 from util.utils import parse_date
+from util.revenue import to_cents
+from util.adaptive_extract import extract_by_order_ranges, EXTRACT_LATENCY_BUDGET_MS
+from util.external_sort import ExternalSorter, sorted_stream, default_spill_dir
 import io
 import csv
 
@@ -15,10 +19,116 @@ BATCH_SIZE = int(os.getenv("BATCH_SIZE_ORDERS") or 50000)  # Batch size for stre
 # Set to True for initial bulk loads (drops/recreates indexes for 20-40% speedup)
 # Set to False for incremental updates (keeps indexes for deduplication)
 OPTIMIZE_INDEXES = os.getenv("OPTIMIZE_INDEXES", "false").lower() in ("true", "1", "yes")
+# Sort facts by (Delivery_Date_ID, Product_ID) before COPY for a physically clustered table
+SORT_ON_LOAD = os.getenv("SORT_ON_LOAD", "false").lower() in ("true", "1", "yes")
+# Memory budget for the sort; larger inputs spill sorted runs to temp files
+SORT_MEMORY_MB = int(os.getenv("SORT_MEMORY_MB") or 256)
+
+# Extract facts in adaptive, source-load-aware chunks instead of one giant join
+ADAPTIVE_EXTRACT = os.getenv("ADAPTIVE_EXTRACT", "false").lower() in ("true", "1", "yes")
+
+# Column order used for every fact COPY
+FACT_COLUMNS = [
+    "Order_Item_ID", "Product_ID", "Quantity", "Notes", "Delivery_Date_ID",
+    "Delivery_Rider_ID", "User_ID", "Order_Num", "Total_Revenue", "Total_Revenue_Cents",
+]
 
 logger = get_logger(__name__)
 
 
+def date_record(parsed):
+    """Build a Dim_Date record from a parsed pandas Timestamp."""
+    return {
+        "Date_ID": int(parsed.strftime("%Y%m%d")),
+        "Date": parsed.date(),
+        "Year": parsed.year,
+        "Month": parsed.month,
+        "Day": parsed.day,
+        "Quarter": parsed.quarter,
+    }
+
+
+def order_items_source_stmt():
+    """Source query joining orders, items and product prices (one row per order item)."""
+    return select(
+        orders.c.id.label("Order_ID"),
+        orders.c.orderNumber.label("Order_Num"),
+        orders.c.userId.label("User_ID"),
+        orders.c.deliveryRiderId.label("Delivery_Rider_ID"),
+        orders.c.deliveryDate.label("Delivery_Date_Raw"),
+        orderitems.c.ProductId.label("Product_ID"),
+        orderitems.c.quantity.label("Quantity"),
+        func.trim(func.coalesce(orderitems.c.notes, '')).label("Notes"),
+        (orderitems.c.quantity * products.c.price).label("Total_Revenue"),
+        products.c.price.label("Unit_Price"),
+    ).join(orderitems, orderitems.c.OrderId == orders.c.id
+    ).join(products, products.c.id == orderitems.c.ProductId)
+
+
+def build_fact_record(row, delivery_date_id, price_cents_cache):
+    """
+    Build a fact_order_items record from a joined source row.
+
+    Args:
+        row: Row from order_items_source_stmt()
+        delivery_date_id (int): Resolved Dim_Date key
+        price_cents_cache (dict): Unit price -> cents, shared across rows so each
+            distinct price is converted once
+
+    Returns:
+        dict: Fact record keyed by column name
+    """
+    # Create composite Order_Item_ID
+    order_id = row.Order_ID
+    product_id = row.Product_ID
+    order_item_id = order_id * 1000000 + product_id
+
+    # Revenue in cents using integer math only
+    unit_price = row.Unit_Price
+    price_cents = price_cents_cache.get(unit_price)
+    if price_cents is None:
+        price_cents = to_cents(unit_price)
+        price_cents_cache[unit_price] = price_cents
+
+    return {
+        "Order_Item_ID": order_item_id,
+        "Product_ID": product_id,
+        "Quantity": row.Quantity,
+        "Notes": row.Notes,
+        "Delivery_Date_ID": delivery_date_id,
+        "Delivery_Rider_ID": row.Delivery_Rider_ID,
+        "User_ID": row.User_ID,
+        "Order_Num": row.Order_Num,
+        "Total_Revenue": row.Total_Revenue,
+        "Total_Revenue_Cents": row.Quantity * price_cents,
+    }
+
+
+def sort_fact_records(records):
+    """
+    Encode fact records as CSV lines and external-sort them by (Delivery_Date_ID, Product_ID).
+
+    Returns:
+        ExternalSorter: Caller iterates sorted_payloads() and must close() it
+    """
+    sorter = ExternalSorter(SORT_MEMORY_MB * 1024 * 1024, default_spill_dir())
+    line_buffer = io.StringIO()
+    writer = csv.writer(line_buffer)
+    try:
+        for record in records:
+            writer.writerow([record[column] for column in FACT_COLUMNS])
+            sorter.add(
+                (record["Delivery_Date_ID"], record["Product_ID"]),
+                line_buffer.getvalue().encode("utf-8"),
+            )
+            line_buffer.seek(0)
+            line_buffer.truncate()
+    except Exception:
+        sorter.close()
+        raise
+    return sorter
+
+
 def load_all_delivery_dates():
     """
     Load unique delivery dates using PostgreSQL COPY.
@@ -39,14 +149,7 @@ def load_all_delivery_dates():
             if date_str:
                 parsed = parse_date(date_str)
                 if pd.notna(parsed):
-                    date_records.append({
-                        "Date_ID": int(parsed.strftime("%Y%m%d")),
-                        "Date": parsed.date(),
-                        "Year": parsed.year,
-                        "Month": parsed.month,
-                        "Day": parsed.day,
-                        "Quarter": parsed.quarter,
-                    })
+                    date_records.append(date_record(parsed))
         
         if not date_records:
             logger.warning("No valid dates to load")
@@ -197,24 +300,27 @@ def transform_and_load_order_items():
         )
         logger.info(f"Loaded {len(date_lookup)} dates")
         
-        # Fetch ALL joined data at once from MySQL (faster than streaming)
-        logger.info("Fetching all orders+items from source database...")
-        stmt = select(
-            orders.c.id.label("Order_ID"),
-            orders.c.orderNumber.label("Order_Num"),
-            orders.c.userId.label("User_ID"),
-            orders.c.deliveryRiderId.label("Delivery_Rider_ID"),
-            orders.c.deliveryDate.label("Delivery_Date_Raw"),
-            orderitems.c.ProductId.label("Product_ID"),
-            orderitems.c.quantity.label("Quantity"),
-            func.trim(func.coalesce(orderitems.c.notes, '')).label("Notes"),
-            (orderitems.c.quantity * products.c.price).label("Total_Revenue"),
-        ).join(orderitems, orderitems.c.OrderId == orders.c.id
-        ).join(products, products.c.id == orderitems.c.ProductId)
+        # Fetch joined data from MySQL: all at once (faster than streaming) unless
+        # it is fed to the external sort, which bounds memory on its own
+        logger.info("Fetching orders+items from source database...")
+        stmt = order_items_source_stmt()
         
-        # Bulk fetch - much faster than streaming for 1.9M rows
-        result = source_session.execute(stmt).fetchall()
-        logger.info(f"Fetched {len(result)} order items from source")
+        if ADAPTIVE_EXTRACT:
+            # Latency/health-aware chunks - safe to run against a busy OLTP source
+            logger.info(f"ADAPTIVE_EXTRACT=true: chunking by order id (budget {EXTRACT_LATENCY_BUDGET_MS:.0f} ms/chunk)")
+            result = extract_by_order_ranges(stmt)
+            logger.info(f"Fetched {len(result)} order items from source")
+        elif SORT_ON_LOAD:
+            # Rows go from a server-side cursor straight into the external sorter,
+            # so SORT_MEMORY_MB (not the row count) bounds memory
+            result = source_session.execute(
+                stmt, execution_options={"stream_results": True, "yield_per": BATCH_SIZE}
+            )
+            logger.info("Streaming order items from source into the sorter")
+        else:
+            # Bulk fetch - much faster than streaming for 1.9M rows
+            result = source_session.execute(stmt).fetchall()
+            logger.info(f"Fetched {len(result)} order items from source")
 
         # Use Core connection
         conn = db_warehouse_engine.connect()
@@ -226,96 +332,81 @@ def transform_and_load_order_items():
                 logger.info("Truncating fact table for full reload...")
                 conn.execute(text(f"TRUNCATE TABLE {Fact_Order_Items.__tablename__} CASCADE"))
                 logger.info("Table truncated")
+                bulk_plan = plan_bulk_load(conn, Fact_Order_Items.__tablename__)
+                begin_bulk_load(conn, bulk_plan)
                 
-                # Transform ALL records in Python
-                logger.info("Transforming all records in Python...")
-                
-                # OPTIMIZATION: Pre-parse unique delivery dates (much faster than parsing per row)
-                logger.info("Pre-parsing unique delivery dates...")
-                unique_dates = set(row.Delivery_Date_Raw for row in result if row.Delivery_Date_Raw)
+                # Each distinct delivery date string is parsed once (rows are
+                # iterated a single time, so this also works on a streamed result)
                 date_cache = {}
-                for date_str in unique_dates:
-                    parsed_date = parse_date(date_str)
-                    if pd.notna(parsed_date):
-                        date_key = parsed_date.date()
-                        date_cache[date_str] = date_lookup.get(date_key)
-                    else:
-                        date_cache[date_str] = None
-                logger.info(f"Pre-parsed {len(date_cache)} unique dates")
-                
-                all_records = []
-                skipped_total = 0
-                
-                for row in result:
-                    # Lookup pre-parsed delivery date (instant!)
-                    delivery_date_raw = row.Delivery_Date_Raw
-                    delivery_date_id = date_cache.get(delivery_date_raw) if delivery_date_raw else None
-                    
-                    # Skip rows with NULL Delivery_Date_ID
-                    if delivery_date_id is None:
-                        skipped_total += 1
-                        continue
-
-                    # Create composite Order_Item_ID
-                    order_id = row.Order_ID
-                    product_id = row.Product_ID
-                    order_item_id = order_id * 1000000 + product_id
-
-                    all_records.append({
-                        "Order_Item_ID": order_item_id,
-                        "Product_ID": product_id,
-                        "Quantity": row.Quantity,
-                        "Notes": row.Notes,
-                        "Delivery_Date_ID": delivery_date_id,
-                        "Delivery_Rider_ID": row.Delivery_Rider_ID,
-                        "User_ID": row.User_ID,
-                        "Order_Num": row.Order_Num,
-                        "Total_Revenue": row.Total_Revenue,
-                    })
-                
-                logger.info(f"Transformed {len(all_records)} records (skipped {skipped_total} with NULL dates)")
-                
+
+                def delivery_date_id(date_str):
+                    if date_str not in date_cache:
+                        parsed_date = parse_date(date_str)
+                        date_cache[date_str] = date_lookup.get(parsed_date.date()) if pd.notna(parsed_date) else None
+                    return date_cache[date_str]
+
+                skipped = {"total": 0}
+                # Unit price -> cents, converted once per distinct price (few thousand)
+                price_cents_cache = {}
+
+                def fact_records():
+                    for row in result:
+                        date_id = delivery_date_id(row.Delivery_Date_Raw) if row.Delivery_Date_Raw else None
+                        # Skip rows with NULL Delivery_Date_ID
+                        if date_id is None:
+                            skipped["total"] += 1
+                            continue
+                        yield build_fact_record(row, date_id, price_cents_cache)
+
                 # Use PostgreSQL COPY for maximum speed
-                logger.info(f"Using PostgreSQL COPY for {len(all_records)} rows...")
-                
-                # Create CSV in memory
-                csv_buffer = io.StringIO()
-                writer = csv.writer(csv_buffer)
-                
-                # Write rows in the correct column order
-                for record in all_records:
-                    writer.writerow([
-                        record['Order_Item_ID'],
-                        record['Product_ID'],
-                        record['Quantity'],
-                        record['Notes'],
-                        record['Delivery_Date_ID'],
-                        record['Delivery_Rider_ID'],
-                        record['User_ID'],
-                        record['Order_Num'],
-                        record['Total_Revenue'],
-                    ])
-                
-                # Reset buffer to start
-                csv_buffer.seek(0)
-                
+                sorter = None
+                if SORT_ON_LOAD:
+                    # Cluster the heap by (Delivery_Date_ID, Product_ID) so date-range
+                    # queries read contiguous pages, without a CLUSTER afterwards
+                    logger.info(f"SORT_ON_LOAD=true: transforming and sorting facts (memory budget {SORT_MEMORY_MB} MB)...")
+                    sorter = sort_fact_records(fact_records())
+                    total_records = sorter.total_records
+                    logger.info(f"Sorted {total_records} rows using {sorter.spilled_runs} spilled runs")
+                    copy_source = sorted_stream(sorter.sorted_payloads())
+                else:
+                    # Transform straight into an in-memory CSV
+                    logger.info("Transforming all records in Python...")
+                    csv_buffer = io.StringIO()
+                    writer = csv.writer(csv_buffer)
+                    total_records = 0
+
+                    # Write rows in the correct column order
+                    for record in fact_records():
+                        writer.writerow([record[column] for column in FACT_COLUMNS])
+                        total_records += 1
+
+                    # Reset buffer to start
+                    csv_buffer.seek(0)
+                    copy_source = csv_buffer
+                logger.info(f"Transformed {total_records} records (skipped {skipped['total']} with NULL dates)")
+                logger.info(f"Using PostgreSQL COPY for {total_records} rows...")
+
                 # Use raw connection for COPY
                 raw_conn = conn.connection
                 cursor = raw_conn.cursor()
                 
                 # PostgreSQL COPY - fastest bulk load method
-                cursor.copy_expert(
-                    f"""
-                    COPY {Fact_Order_Items.__tablename__} (
-                        "Order_Item_ID", "Product_ID", "Quantity", "Notes",
-                        "Delivery_Date_ID", "Delivery_Rider_ID", "User_ID",
-                        "Order_Num", "Total_Revenue"
-                    ) FROM STDIN WITH CSV
-                    """,
-                    csv_buffer
-                )
+                try:
+                    cursor.copy_expert(
+                        f"""
+                        COPY {Fact_Order_Items.__tablename__} (
+                            "Order_Item_ID", "Product_ID", "Quantity", "Notes",
+                            "Delivery_Date_ID", "Delivery_Rider_ID", "User_ID",
+                            "Order_Num", "Total_Revenue", "Total_Revenue_Cents"
+                        ) FROM STDIN {copy_options(bulk_plan)}
+                        """,
+                        copy_source
+                    )
+                finally:
+                    if sorter is not None:
+                        sorter.close()
                 
-                total_inserted = len(all_records)
+                total_inserted = total_records
                 logger.info("COPY completed")
                 logger.info("Committing transaction...")
         
@@ -5,6 +5,8 @@ from util.db_source import Session_db_source
 from contextlib import contextmanager
 from util.db_warehouse import db_warehouse_engine
 from util.logging_config import get_logger
+from util.bulk_load import plan_bulk_load, begin_bulk_load, copy_options
+from util.revenue import to_cents
 import os
 import io
 import csv
@@ -13,6 +15,15 @@ BATCH_SIZE = int(os.getenv("BATCH_SIZE") or 50000)  # Larger batches for Postgre
 
 logger = get_logger(__name__)
 
+# Category normalization mapping
+CATEGORY_MAP = {
+    'toy': 'toys', 'toys': 'toys',
+    'makeup': 'makeup', 'make up': 'makeup',
+    'bag': 'bags', 'bags': 'bags',
+    'electronics': 'electronics', 'gadgets': 'electronics', 'laptops': 'electronics',
+    "men's apparel": 'apparel', 'clothes': 'apparel',
+}
+
 
 @contextmanager
 def extract_products_stream():
@@ -74,6 +85,43 @@ def extract_products_stream():
             logger.warning(f"Error closing session: {e}")
 
 
+def products_source_stmt():
+    """Source query for products with basic NULL filtering."""
+    return select(
+        products.c.id,
+        products.c.productCode,
+        products.c.name,
+        products.c.category,
+        products.c.description,
+        products.c.price,
+    ).where(
+        # Basic NULL filtering
+        products.c.id.isnot(None),
+        products.c.productCode.isnot(None),
+        products.c.name.isnot(None),
+        products.c.category.isnot(None),
+        products.c.description.isnot(None),
+        products.c.price.isnot(None),
+    )
+
+
+def transform_product_row(row):
+    """Clean one source product row into a Dim_Products record."""
+    # Normalize category
+    cat_lower = row.category.strip().lower() if row.category else ''
+    normalized_cat = CATEGORY_MAP.get(cat_lower, cat_lower)
+    
+    return {
+        "Product_ID": row.id,
+        "Product_Code": row.productCode.strip() if row.productCode else None,
+        "Name": row.name.strip().title() if row.name else None,
+        "Category": normalized_cat,
+        "Description": row.description.strip() if row.description else None,
+        "Price": row.price,
+        "Price_Cents": to_cents(row.price),
+    }
+
+
 def transform_and_load_products():
     """
     Load products using PostgreSQL COPY for maximum speed.
@@ -86,22 +134,7 @@ def transform_and_load_products():
         logger.info(f"Extracting products from source database...")
         
         # Simple fast query - no complex SQL transformations
-        stmt = select(
-            products.c.id,
-            products.c.productCode,
-            products.c.name,
-            products.c.category,
-            products.c.description,
-            products.c.price,
-        ).where(
-            # Basic NULL filtering
-            products.c.id.isnot(None),
-            products.c.productCode.isnot(None),
-            products.c.name.isnot(None),
-            products.c.category.isnot(None),
-            products.c.description.isnot(None),
-            products.c.price.isnot(None),
-        )
+        stmt = products_source_stmt()
         
         # Fetch ALL rows at once - much faster for small dimension tables
         result = source_session.execute(stmt).fetchall()
@@ -110,29 +143,7 @@ def transform_and_load_products():
         # Transform ALL rows in Python
         logger.info("Transforming data in Python...")
         
-        # Category normalization mapping
-        category_map = {
-            'toy': 'toys', 'toys': 'toys',
-            'makeup': 'makeup', 'make up': 'makeup',
-            'bag': 'bags', 'bags': 'bags',
-            'electronics': 'electronics', 'gadgets': 'electronics', 'laptops': 'electronics',
-            "men's apparel": 'apparel', 'clothes': 'apparel',
-        }
-        
-        records = []
-        for row in result:
-            # Normalize category
-            cat_lower = row.category.strip().lower() if row.category else ''
-            normalized_cat = category_map.get(cat_lower, cat_lower)
-            
-            records.append({
-                "Product_ID": row.id,
-                "Product_Code": row.productCode.strip() if row.productCode else None,
-                "Name": row.name.strip().title() if row.name else None,
-                "Category": normalized_cat,
-                "Description": row.description.strip() if row.description else None,
-                "Price": row.price,
-            })
+        records = [transform_product_row(row) for row in result]
         
         logger.info(f"Transformed {len(records)} records")
         
@@ -142,6 +153,8 @@ def transform_and_load_products():
             logger.info("Truncating table for full reload...")
             conn.execute(text(f"TRUNCATE TABLE {Dim_Products.__tablename__} CASCADE"))
             logger.info("Table truncated")
+            bulk_plan = plan_bulk_load(conn, Dim_Products.__tablename__)
+            begin_bulk_load(conn, bulk_plan)
         
             # Use PostgreSQL COPY for maximum speed
             if records:
@@ -160,6 +173,7 @@ def transform_and_load_products():
                         record['Category'],
                         record['Description'],
                         record['Price'],
+                        record['Price_Cents'],
                     ])
                 
                 # Reset buffer to start
@@ -174,8 +188,8 @@ def transform_and_load_products():
                     f"""
                     COPY {Dim_Products.__tablename__} (
                         "Product_ID", "Product_Code", "Name", "Category",
-                        "Description", "Price"
-                    ) FROM STDIN WITH CSV
+                        "Description", "Price", "Price_Cents"
+                    ) FROM STDIN {copy_options(bulk_plan)}
                     """,
                     csv_buffer
                 )
@@ -0,0 +1,203 @@
+from util.db_source import orderitems, orders, products, db_source_engine
+from util.db_warehouse import db_warehouse_engine
+from util.logging_config import get_logger
+from util.utils import parse_date
+from sqlalchemy import select, func, text, literal
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import pandas as pd
+import os
+
+# Abort the pipeline (mark the step failed) when the warehouse does not match
+RECONCILE_STRICT = os.getenv("RECONCILE_STRICT", "true").lower() in ("true", "1", "yes")
+# How many mismatching days/products to log individually
+RECONCILE_MAX_REPORTED = int(os.getenv("RECONCILE_MAX_REPORTED") or 50)
+
+logger = get_logger(__name__)
+
+
+class ReconciliationError(Exception):
+    """Raised when source and warehouse checksums disagree."""
+
+
+def _order_item_id():
+    # Same composite key the fact ETL builds: Order_ID * 1000000 + Product_ID
+    return orders.c.id * literal(1000000) + orderitems.c.ProductId
+
+
+def _source_checksums():
+    """
+    Partitioned aggregates on the MySQL source.
+
+    The source keeps delivery dates as free-form strings, so we group by the raw
+    string and map to calendar days in Python (a few hundred groups). Rows whose
+    date does not parse are skipped by the fact ETL and are reported separately.
+    """
+    with db_source_engine.connect() as conn:
+        per_raw_date = conn.execute(
+            select(
+                orders.c.deliveryDate.label("raw_date"),
+                func.count().label("row_count"),
+                func.sum(orderitems.c.quantity * products.c.price).label("revenue"),
+                func.bit_xor(_order_item_id()).label("id_xor"),
+                func.sum(_order_item_id()).label("id_sum"),
+            )
+            .select_from(
+                orders.join(orderitems, orderitems.c.OrderId == orders.c.id)
+                .join(products, products.c.id == orderitems.c.ProductId)
+            )
+            .group_by(orders.c.deliveryDate)
+        ).all()
+
+        per_day = {}
+        valid_raw_dates = []
+        unparsed_rows = 0
+        for row in per_raw_date:
+            parsed = parse_date(row.raw_date) if row.raw_date else pd.NaT
+            if pd.isna(parsed):
+                unparsed_rows += row.row_count
+                continue
+            valid_raw_dates.append(row.raw_date)
+            day = per_day.setdefault(parsed.date(), _empty_checksum())
+            _merge_checksum(day, row)
+
+        # Per-product totals restricted to rows the ETL can actually load
+        per_product = {}
+        if valid_raw_dates:
+            for row in conn.execute(
+                select(
+                    orderitems.c.ProductId.label("key"),
+                    func.count().label("row_count"),
+                    func.sum(orderitems.c.quantity * products.c.price).label("revenue"),
+                )
+                .select_from(
+                    orders.join(orderitems, orderitems.c.OrderId == orders.c.id)
+                    .join(products, products.c.id == orderitems.c.ProductId)
+                )
+                .where(orders.c.deliveryDate.in_(valid_raw_dates))
+                .group_by(orderitems.c.ProductId)
+            ):
+                per_product[row.key] = (row.row_count, Decimal(row.revenue or 0))
+
+    return per_day, per_product, unparsed_rows
+
+
+def _warehouse_checksums():
+    """Matching partitioned aggregates on the PostgreSQL warehouse."""
+    with db_warehouse_engine.connect() as conn:
+        per_day = {}
+        for row in conn.execute(text("""
+            SELECT dd."Date" AS day,
+                   COUNT(*) AS row_count,
+                   SUM(foi."Total_Revenue") AS revenue,
+                   BIT_XOR(foi."Order_Item_ID") AS id_xor,
+                   SUM(foi."Order_Item_ID") AS id_sum
+            FROM fact_order_items foi
+            JOIN dim_date dd ON dd."Date_ID" = foi."Delivery_Date_ID"
+            GROUP BY dd."Date"
+        """)):
+            _merge_checksum(per_day.setdefault(row.day, _empty_checksum()), row)
+
+        per_product = {
+            row.key: (row.row_count, Decimal(row.revenue or 0))
+            for row in conn.execute(text("""
+                SELECT "Product_ID" AS key, COUNT(*) AS row_count, SUM("Total_Revenue") AS revenue
+                FROM fact_order_items
+                GROUP BY "Product_ID"
+            """))
+        }
+
+    return per_day, per_product
+
+
+def _empty_checksum():
+    return {"row_count": 0, "revenue": Decimal(0), "id_xor": 0, "id_sum": 0}
+
+
+def _merge_checksum(acc, row):
+    """Fold one aggregate row into a per-day checksum (several raw strings map to one day)."""
+    acc["row_count"] += int(row.row_count)
+    acc["revenue"] += Decimal(row.revenue or 0)
+    acc["id_xor"] ^= int(row.id_xor or 0)
+    acc["id_sum"] += int(row.id_sum or 0)
+
+
+def compare_checksums(source_days, warehouse_days, source_products, warehouse_products):
+    """
+    Compare partitioned checksums.
+
+    Returns:
+        tuple: (list of mismatching days, list of mismatching products); each entry
+        is (key, source_value, warehouse_value)
+    """
+    empty = _empty_checksum()
+    day_mismatches = []
+    for day in sorted(set(source_days) | set(warehouse_days)):
+        src = source_days.get(day, empty)
+        wh = warehouse_days.get(day, empty)
+        if src != wh:
+            day_mismatches.append((day, src, wh))
+
+    product_mismatches = []
+    for product_id in sorted(set(source_products) | set(warehouse_products)):
+        src = source_products.get(product_id, (0, Decimal(0)))
+        wh = warehouse_products.get(product_id, (0, Decimal(0)))
+        if src != wh:
+            product_mismatches.append((product_id, src, wh))
+
+    return day_mismatches, product_mismatches
+
+
+def reconcile_source_and_warehouse():
+    """
+    Verify the fact load by checksumming source and warehouse in parallel.
+
+    Both sides run grouped aggregate queries at the same time (row counts,
+    revenue per day and per product, and an XOR/SUM digest of Order_Item_IDs
+    per day), so the check costs two index/seq scans rather than a row-by-row diff.
+    """
+    logger.info("Computing source and warehouse checksums in parallel...")
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="reconcile") as pool:
+        source_future = pool.submit(_source_checksums)
+        warehouse_future = pool.submit(_warehouse_checksums)
+        source_days, source_products, unparsed_rows = source_future.result()
+        warehouse_days, warehouse_products = warehouse_future.result()
+
+    source_rows = sum(day["row_count"] for day in source_days.values())
+    warehouse_rows = sum(day["row_count"] for day in warehouse_days.values())
+    logger.info(
+        f"Source rows: {source_rows} (+{unparsed_rows} with unparseable dates, not loaded) | "
+        f"Warehouse rows: {warehouse_rows}"
+    )
+
+    day_mismatches, product_mismatches = compare_checksums(
+        source_days, warehouse_days, source_products, warehouse_products
+    )
+
+    if not day_mismatches and not product_mismatches:
+        logger.info(
+            f"✅ Reconciliation passed: {len(source_days)} days and "
+            f"{len(source_products)} products match"
+        )
+        return True
+
+    logger.error(
+        f"Reconciliation found {len(day_mismatches)} mismatching days and "
+        f"{len(product_mismatches)} mismatching products"
+    )
+    for day, src, wh in day_mismatches[:RECONCILE_MAX_REPORTED]:
+        logger.error(
+            f"  {day}: rows {src['row_count']} vs {wh['row_count']}, "
+            f"revenue {src['revenue']} vs {wh['revenue']}, "
+            f"digest {'ok' if (src['id_xor'], src['id_sum']) == (wh['id_xor'], wh['id_sum']) else 'DIFFERS'}"
+        )
+    for product_id, src, wh in product_mismatches[:RECONCILE_MAX_REPORTED]:
+        logger.error(
+            f"  Product {product_id}: rows {src[0]} vs {wh[0]}, revenue {src[1]} vs {wh[1]}"
+        )
+
+    if RECONCILE_STRICT:
+        raise ReconciliationError(
+            f"{len(day_mismatches)} days and {len(product_mismatches)} products do not match the source"
+        )
+    return False
@@ -4,6 +4,7 @@ from models.Dim_Riders import Dim_Rider
 from util.db_source import Session_db_source
 from util.db_warehouse import db_warehouse_engine
 from util.logging_config import get_logger
+from util.bulk_load import plan_bulk_load, begin_bulk_load, copy_options
 import io
 import csv
 
@@ -44,6 +45,35 @@ def normalize_gender(gender):
         return None
 
 
+def riders_source_stmt():
+    """Source query for riders joined with their courier name."""
+    return select(
+        riders.c.id,
+        riders.c.firstName,
+        riders.c.lastName,
+        riders.c.vehicleType,
+        riders.c.age,
+        riders.c.gender,
+        couriers.c.name.label("courier_name")
+    ).select_from(
+        riders.outerjoin(couriers, riders.c.courierId == couriers.c.id)
+    )
+
+
+def transform_rider_row(row):
+    """Clean one source rider row into a Dim_Riders record."""
+    # Python transformations (much faster than SQL CONCAT/SUBSTRING)
+    return {
+        "Rider_ID": row.id,
+        "First_Name": row.firstName.strip().title() if row.firstName else "",
+        "Last_Name": row.lastName.strip().title() if row.lastName else "",
+        "Vehicle_Type": normalize_vehicle_type(row.vehicleType),
+        "Age": row.age,
+        "Gender": normalize_gender(row.gender),
+        "Courier_Name": row.courier_name if row.courier_name else None,
+    }
+
+
 def transform_and_load_riders():
     """
     Transform and load riders using PostgreSQL COPY for maximum speed.
@@ -57,42 +87,14 @@ def transform_and_load_riders():
         
         # Bulk fetch ALL riders with courier join (no SQL transformations)
         logger.info("Fetching all riders from source database...")
-        stmt = select(
-            riders.c.id,
-            riders.c.firstName,
-            riders.c.lastName,
-            riders.c.vehicleType,
-            riders.c.age,
-            riders.c.gender,
-            couriers.c.name.label("courier_name")
-        ).select_from(
-            riders.outerjoin(couriers, riders.c.courierId == couriers.c.id)
-        )
+        stmt = riders_source_stmt()
         
         result = source_session.execute(stmt).fetchall()
         logger.info(f"Fetched {len(result)} riders from source")
         
         # Transform ALL records in Python (faster than SQL)
         logger.info("Transforming all records in Python...")
-        all_records = []
-        
-        for row in result:
-            # Python transformations (much faster than SQL CONCAT/SUBSTRING)
-            first_name = row.firstName.strip().title() if row.firstName else ""
-            last_name = row.lastName.strip().title() if row.lastName else ""
-            vehicle_type = normalize_vehicle_type(row.vehicleType)
-            gender = normalize_gender(row.gender)
-            courier_name = row.courier_name if row.courier_name else None
-            
-            all_records.append({
-                "Rider_ID": row.id,
-                "First_Name": first_name,
-                "Last_Name": last_name,
-                "Vehicle_Type": vehicle_type,
-                "Age": row.age,
-                "Gender": gender,
-                "Courier_Name": courier_name,
-            })
+        all_records = [transform_rider_row(row) for row in result]
         
         logger.info(f"Transformed {len(all_records)} records")
         
@@ -106,6 +108,8 @@ def transform_and_load_riders():
                 logger.info("Truncating riders table for full reload...")
                 conn.execute(text(f"TRUNCATE TABLE {Dim_Rider.__tablename__} CASCADE"))
                 logger.info("Table truncated")
+                bulk_plan = plan_bulk_load(conn, Dim_Rider.__tablename__)
+                begin_bulk_load(conn, bulk_plan)
                 
                 # Use PostgreSQL COPY for maximum speed
                 logger.info(f"Using PostgreSQL COPY for {len(all_records)} rows...")
@@ -139,7 +143,7 @@ def transform_and_load_riders():
                     COPY {Dim_Rider.__tablename__} (
                         "Rider_ID", "First_Name", "Last_Name", "Vehicle_Type",
                         "Age", "Gender", "Courier_Name"
-                    ) FROM STDIN WITH CSV
+                    ) FROM STDIN {copy_options(bulk_plan)}
                     """,
                     csv_buffer
                 )
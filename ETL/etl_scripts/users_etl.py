@@ -3,6 +3,7 @@ from models.Dim_Users import Dim_Users
 from util.db_source import Session_db_source
 from util.db_warehouse import db_warehouse_engine
 from util.logging_config import get_logger
+from util.bulk_load import plan_bulk_load, begin_bulk_load, copy_options
 from sqlalchemy import select, text
 import os
 import io
@@ -12,6 +13,51 @@ BATCH_SIZE = int(os.getenv("BATCH_SIZE") or 50000)  # Larger batches for Postgre
 
 logger = get_logger(__name__)
 
+
+def users_source_stmt():
+    """Source query for users (no SQL transformations, cleaning happens in Python)."""
+    return select(
+        users.c.id,
+        users.c.firstName,
+        users.c.lastName,
+        users.c.username,
+        users.c.city,
+        users.c.country,
+        users.c.zipCode,
+        users.c.gender,
+    )
+
+
+def _title_case(s):
+    return s.strip().title() if s else None
+
+
+def transform_user_row(row):
+    """Clean one source user row into a Dim_Users record."""
+    # Gender normalization
+    gender = None
+    if row.gender:
+        first_char = row.gender.strip().lower()[0] if row.gender.strip() else None
+        if first_char == 'm':
+            gender = 'male'
+        elif first_char == 'f':
+            gender = 'female'
+    
+    # Zipcode - keep only digits
+    zipcode = ''.join(c for c in (row.zipCode or '') if c.isdigit())
+    
+    return {
+        "Users_ID": row.id,
+        "First_Name": _title_case(row.firstName),
+        "Last_Name": _title_case(row.lastName),
+        "Username": row.username.strip() if row.username else None,
+        "City": _title_case(row.city),
+        "Country": _title_case(row.country),
+        "Zipcode": zipcode if zipcode else None,
+        "Gender": gender,
+    }
+
+
 def transform_and_load_users():
     """
     Load users using PostgreSQL COPY for maximum speed.
@@ -24,16 +70,7 @@ def transform_and_load_users():
         logger.info(f"Extracting users from source database...")
         
         # Simple fast query - no complex SQL transformations
-        stmt = select(
-            users.c.id,
-            users.c.firstName,
-            users.c.lastName,
-            users.c.username,
-            users.c.city,
-            users.c.country,
-            users.c.zipCode,
-            users.c.gender,
-        )
+        stmt = users_source_stmt()
         
         # Fetch ALL rows at once - much faster than streaming for 100K rows
         result = source_session.execute(stmt).fetchall()
@@ -41,34 +78,7 @@ def transform_and_load_users():
         
         # Transform ALL rows in Python (faster than complex SQL)
         logger.info("Transforming data in Python...")
-        records = []
-        for row in result:
-            # Title case helper
-            def tc(s):
-                return s.strip().title() if s else None
-            
-            # Gender normalization
-            gender = None
-            if row.gender:
-                first_char = row.gender.strip().lower()[0] if row.gender.strip() else None
-                if first_char == 'm':
-                    gender = 'male'
-                elif first_char == 'f':
-                    gender = 'female'
-            
-            # Zipcode - keep only digits
-            zipcode = ''.join(c for c in (row.zipCode or '') if c.isdigit())
-            
-            records.append({
-                "Users_ID": row.id,
-                "First_Name": tc(row.firstName),
-                "Last_Name": tc(row.lastName),
-                "Username": row.username.strip() if row.username else None,
-                "City": tc(row.city),
-                "Country": tc(row.country),
-                "Zipcode": zipcode if zipcode else None,
-                "Gender": gender,
-            })
+        records = [transform_user_row(row) for row in result]
         
         logger.info(f"Transformed {len(records)} records")
         
@@ -78,6 +88,8 @@ def transform_and_load_users():
             logger.info("Truncating table for full reload...")
             conn.execute(text(f"TRUNCATE TABLE {Dim_Users.__tablename__} CASCADE"))
             logger.info("Table truncated")
+            bulk_plan = plan_bulk_load(conn, Dim_Users.__tablename__)
+            begin_bulk_load(conn, bulk_plan)
             
             # Use PostgreSQL COPY for maximum speed
             if records:
@@ -113,7 +125,7 @@ def transform_and_load_users():
                     COPY {Dim_Users.__tablename__} (
                         "Users_ID", "Username", "First_Name", "Last_Name",
                         "City", "Country", "Zipcode", "Gender"
-                    ) FROM STDIN WITH CSV
+                    ) FROM STDIN {copy_options(bulk_plan)}
                     """,
                     csv_buffer
                 )
@@ -0,0 +1,286 @@
+"""
+Long-running micro-batch ETL service.
+
+Wakes up every ETL_SERVICE_INTERVAL seconds, pulls source orders above the
+warehouse watermark and loads them in short transactions (see
+etl_scripts/incremental_etl.py). Holds the shared ETL advisory lock so it never
+runs concurrently with a full reload from app.py.
+
+Refreshing the summary views re-aggregates the whole fact table, costing about
+as much as a full aggregation however few rows the batches added. So it is not
+done after every cycle: once new rows have landed, the views are refreshed at
+most every ETL_SERVICE_REFRESH_INTERVAL seconds. The refresh runs inside the
+service loop, so it never overlaps another refresh or a batch, and the next
+cycle waits for it. Between refreshes the summaries lag the fact table. The API
+only uses them while that lag is within AGGREGATE_MAX_STALENESS_S, so set that
+above the refresh interval (plus one ETL_SERVICE_INTERVAL). Otherwise summary
+queries fall back to scanning fact_order_items for most of each interval.
+
+Status is served as JSON on ETL_SERVICE_PORT:
+    GET /health  -> 200 when the last cycle succeeded and the lock is held, else 503
+    GET /status  -> watermark, lag behind the source and per-batch latency
+"""
+from dotenv import load_dotenv
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+from datetime import datetime, timezone
+from etl_scripts.incremental_etl import (
+    load_micro_batch,
+    get_warehouse_watermark,
+    get_source_high_watermark,
+)
+from etl_scripts.aggregates_etl import refresh_materialized_aggregates
+from util.db_warehouse import db_warehouse_engine
+from util.etl_lock import try_acquire_etl_lock, release_etl_lock
+from util.logging_config import setup_logging, get_logger
+from app import test_database_connections
+import threading
+import signal
+import json
+import time
+import sys
+import os
+
+load_dotenv()
+
+setup_logging()
+logger = get_logger(__name__)
+
+ETL_SERVICE_INTERVAL = float(os.getenv("ETL_SERVICE_INTERVAL") or 60)
+ETL_SERVICE_PORT = int(os.getenv("ETL_SERVICE_PORT") or 4100)
+# Cap batches per wake-up so a large backlog doesn't starve status updates
+ETL_SERVICE_MAX_BATCHES = int(os.getenv("ETL_SERVICE_MAX_BATCHES") or 20)
+# Refresh the summary views once new facts have landed, at most every
+# ETL_SERVICE_REFRESH_INTERVAL seconds (each refresh rescans the fact table)
+ETL_SERVICE_REFRESH_AGGREGATES = os.getenv("ETL_SERVICE_REFRESH_AGGREGATES", "true").lower() in ("true", "1", "yes")
+ETL_SERVICE_REFRESH_INTERVAL = float(os.getenv("ETL_SERVICE_REFRESH_INTERVAL") or 900)
+# The API's summary staleness budget (util/aggregate_navigator.py), read here only
+# to warn when it would keep the API off the summaries between refreshes
+AGGREGATE_MAX_STALENESS_S = float(os.getenv("AGGREGATE_MAX_STALENESS_S") or 0)
+# Recent batch latencies kept for the status percentiles
+LATENCY_WINDOW = 100
+
+
+class ServiceStatus:
+    """Thread-safe snapshot of the service state, read by the HTTP handler."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = datetime.now(timezone.utc)
+        self.state = "starting"
+        self.lock_held = False
+        self.watermark = None
+        self.source_high_watermark = None
+        self.caught_up_at = None
+        self.last_cycle_at = None
+        self.last_error = None
+        self.batches_loaded = 0
+        self.rows_loaded = 0
+        self.latencies_ms = deque(maxlen=LATENCY_WINDOW)
+        self.last_batch = None
+        self.rows_since_refresh = 0
+        self.aggregates_refreshed_at = None
+
+    def update(self, **fields):
+        with self._lock:
+            for key, value in fields.items():
+                setattr(self, key, value)
+
+    def record_batch(self, batch):
+        with self._lock:
+            self.batches_loaded += 1
+            self.rows_loaded += batch["rows_loaded"]
+            self.rows_since_refresh += batch["rows_loaded"]
+            self.latencies_ms.append(batch["duration_ms"])
+            self.watermark = batch["last_order_id"]
+            self.last_batch = {**batch, "finished_at": datetime.now(timezone.utc).isoformat()}
+
+    def healthy(self):
+        with self._lock:
+            return self.lock_held and self.last_error is None and self.state != "starting"
+
+    def snapshot(self):
+        with self._lock:
+            now = datetime.now(timezone.utc)
+            latencies = sorted(self.latencies_ms)
+            pending = None
+            if self.watermark is not None and self.source_high_watermark is not None:
+                pending = max(0, self.source_high_watermark - self.watermark)
+            return {
+                "state": self.state,
+                "lock_held": self.lock_held,
+                "started_at": self.started_at.isoformat(),
+                "last_cycle_at": self.last_cycle_at.isoformat() if self.last_cycle_at else None,
+                "last_error": self.last_error,
+                "lag": {
+                    "watermark_order_id": self.watermark,
+                    "source_max_order_id": self.source_high_watermark,
+                    "pending_orders": pending,
+                    # Time since the warehouse last had every source order
+                    "seconds_behind_source": (
+                        0 if pending == 0
+                        else round((now - self.caught_up_at).total_seconds(), 1) if self.caught_up_at
+                        else None
+                    ),
+                },
+                "batches": {
+                    "loaded": self.batches_loaded,
+                    "rows_loaded": self.rows_loaded,
+                    "last": self.last_batch,
+                    "latency_ms_p50": _percentile(latencies, 0.50),
+                    "latency_ms_p95": _percentile(latencies, 0.95),
+                    "latency_ms_max": latencies[-1] if latencies else None,
+                },
+                "aggregates": {
+                    "refresh_enabled": ETL_SERVICE_REFRESH_AGGREGATES,
+                    "refreshed_at": (
+                        self.aggregates_refreshed_at.isoformat() if self.aggregates_refreshed_at else None
+                    ),
+                    "rows_since_refresh": self.rows_since_refresh,
+                },
+            }
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def make_status_handler(status):
+    class StatusHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/health":
+                code = 200 if status.healthy() else 503
+                body = {"status": "ok" if code == 200 else "unhealthy", "state": status.state}
+            elif self.path == "/status":
+                code = 200
+                body = status.snapshot()
+            else:
+                code = 404
+                body = {"detail": "Not Found"}
+            payload = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            # Health probes would flood the ETL log
+            pass
+
+    return StatusHandler
+
+
+def refresh_due(status):
+    """New facts have landed and the last refresh is at least ETL_SERVICE_REFRESH_INTERVAL old."""
+    if not ETL_SERVICE_REFRESH_AGGREGATES or not status.rows_since_refresh:
+        return False
+    if status.aggregates_refreshed_at is None:
+        return True
+    elapsed = (datetime.now(timezone.utc) - status.aggregates_refreshed_at).total_seconds()
+    return elapsed >= ETL_SERVICE_REFRESH_INTERVAL
+
+
+def run_cycle(status):
+    """Load micro-batches until caught up (or the per-cycle cap is hit), then refresh if due."""
+    with db_warehouse_engine.connect() as conn:
+        watermark = get_warehouse_watermark(conn)
+    source_high = get_source_high_watermark()
+    status.update(watermark=watermark, source_high_watermark=source_high)
+
+    for _ in range(ETL_SERVICE_MAX_BATCHES):
+        if watermark >= source_high:
+            break
+        batch = load_micro_batch(watermark)
+        if batch is None:
+            break
+        status.record_batch(batch)
+        watermark = batch["last_order_id"]
+
+    if refresh_due(status):
+        status.update(state="refreshing")
+        refresh_materialized_aggregates()
+        status.update(rows_since_refresh=0, aggregates_refreshed_at=datetime.now(timezone.utc))
+
+    if watermark >= source_high:
+        status.update(caught_up_at=datetime.now(timezone.utc))
+    else:
+        logger.info(f"Backlog remains: {source_high - watermark} order ids behind source")
+
+
+def warn_if_summaries_unused():
+    """Every micro-batch makes the summaries stale; say so if the API won't tolerate it."""
+    if not ETL_SERVICE_REFRESH_AGGREGATES:
+        logger.warning(
+            "ETL_SERVICE_REFRESH_AGGREGATES is off: after the first micro-batch the API "
+            "stops using the summary views and answers from fact_order_items"
+        )
+        return
+    recommended = ETL_SERVICE_REFRESH_INTERVAL + ETL_SERVICE_INTERVAL
+    if AGGREGATE_MAX_STALENESS_S < recommended:
+        logger.warning(
+            f"AGGREGATE_MAX_STALENESS_S={AGGREGATE_MAX_STALENESS_S:g} is below the refresh cadence "
+            f"({recommended:g}s): between refreshes the API answers summary queries from "
+            f"fact_order_items. Set it to at least {recommended:g} to keep them on the summaries"
+        )
+
+
+def main():
+    logger.info("=" * 60)
+    logger.info(f"Starting micro-batch ETL service (interval {ETL_SERVICE_INTERVAL}s)")
+    logger.info("=" * 60)
+    warn_if_summaries_unused()
+
+    if not test_database_connections():
+        logger.error("Database connection tests failed. Aborting ETL service.")
+        sys.exit(1)
+
+    status = ServiceStatus()
+    server = ThreadingHTTPServer(("0.0.0.0", ETL_SERVICE_PORT), make_status_handler(status))
+    threading.Thread(target=server.serve_forever, name="etl-status", daemon=True).start()
+    logger.info(f"Status endpoint listening on :{ETL_SERVICE_PORT} (/health, /status)")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    lock_conn = None
+    try:
+        while not stop.is_set():
+            if lock_conn is None:
+                lock_conn = try_acquire_etl_lock()
+                if lock_conn is None:
+                    status.update(state="waiting_for_lock", lock_held=False)
+                    logger.info("Another loader holds the ETL lock; retrying next interval")
+                    stop.wait(ETL_SERVICE_INTERVAL)
+                    continue
+                status.update(lock_held=True)
+                logger.info("Acquired ETL advisory lock")
+
+            status.update(state="loading")
+            cycle_start = time.perf_counter()
+            try:
+                run_cycle(status)
+                status.update(state="idle", last_error=None)
+            except Exception as e:
+                logger.error(f"Micro-batch cycle failed: {e}", exc_info=True)
+                status.update(state="error", last_error=str(e))
+                # The lock connection may be the casualty; re-acquire next cycle
+                release_etl_lock(lock_conn)
+                lock_conn = None
+                status.update(lock_held=False)
+            status.update(last_cycle_at=datetime.now(timezone.utc))
+
+            elapsed = time.perf_counter() - cycle_start
+            stop.wait(max(0.0, ETL_SERVICE_INTERVAL - elapsed))
+    finally:
+        logger.info("Stopping ETL service...")
+        if lock_conn is not None:
+            release_etl_lock(lock_conn)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Text, DateTime, Index
+from .base import Base
+
+
+class Api_Request_Log(Base):
+    __tablename__ = "api_request_log"
+
+    Request_Log_ID = Column(BigInteger, primary_key=True, autoincrement=True)
+    # Start of the flush interval the counts cover
+    Bucket_Start = Column(DateTime(timezone=True), nullable=False)
+    Method = Column(String(8), nullable=False)
+    # Path plus query string, as requested (what the warmup replays)
+    Target = Column(Text, nullable=False)
+    Requests = Column(Integer, nullable=False)
+    Total_Ms = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("idx_request_log_bucket", "Bucket_Start"),
+    )
+
+
+metadata_api_request_log = Api_Request_Log.metadata
+api_request_log = Api_Request_Log.__table__
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric, Index
+from sqlalchemy import Column, Integer, BigInteger, String, Numeric, Index
 from .base import Base
 
 
@@ -11,6 +11,7 @@ class Dim_Products(Base):
     Description = Column(String(255), nullable=False)
     Name = Column(String(100), nullable=False)
     Price = Column(Numeric(10, 2), nullable=False)
+    Price_Cents = Column(BigInteger, nullable=False, server_default="0")
 
     __table_args__ = (
         Index("idx_product_name", "Name"),
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Index
+from .base import Base
+
+
+class Etl_Batch(Base):
+    __tablename__ = "etl_batches"
+
+    Batch_ID = Column(Integer, primary_key=True, autoincrement=True)
+    # 'full' for app.py reloads, 'micro' for etl_service.py batches, 'partial' for an
+    # app.py reload that failed after some steps committed, 'aggregates' for summary refreshes
+    Mode = Column(String(10), nullable=False)
+    Status = Column(String(10), nullable=False)
+    Started_At = Column(DateTime(timezone=True), nullable=False)
+    Finished_At = Column(DateTime(timezone=True), nullable=True)
+    # Highest source Orders.id covered by this batch (incremental watermark)
+    Last_Order_ID = Column(BigInteger, nullable=False)
+    Rows_Loaded = Column(Integer, nullable=False)
+    Duration_Ms = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("idx_batches_status_order", "Status", "Last_Order_ID"),
+    )
+
+
+metadata_etl_batches = Etl_Batch.metadata
+etl_batches = Etl_Batch.__table__
@@ -18,6 +18,8 @@ class Fact_Order_Items(Base):
     User_ID = Column(Integer, ForeignKey("dim_users.Users_ID"), nullable=False)
     Order_Num = Column(String(20), nullable=False)
     Total_Revenue = Column(Numeric(10, 2), nullable=False)
+    # Same value as integer cents (REVENUE_STORAGE=cents) for integer-only SUMs
+    Total_Revenue_Cents = Column(BigInteger, nullable=False, server_default="0")
 
     # Indexes for performance optimization
     __table_args__ = (
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Text, Boolean, DateTime, Index, false
+from sqlalchemy.dialects.postgresql import JSONB
+from .base import Base
+
+
+class Slow_Query_Log(Base):
+    __tablename__ = "slow_query_log"
+
+    Query_ID = Column(BigInteger, primary_key=True, autoincrement=True)
+    Captured_At = Column(DateTime(timezone=True), nullable=False)
+    # Endpoint limiter name (e.g. 'slice', 'cube'); NULL outside a request
+    Endpoint = Column(String(64), nullable=True)
+    Trace_ID = Column(String(64), nullable=True)
+    # etl_batches version the query ran against
+    Data_Version = Column(Integer, nullable=True)
+    Duration_Ms = Column(Float, nullable=False)
+    # Cancelled by the endpoint's statement_timeout; the plan is then EXPLAIN without ANALYZE
+    Timed_Out = Column(Boolean, nullable=False, server_default=false())
+    Sql_Text = Column(Text, nullable=False)
+    Params = Column(JSONB, nullable=True)
+    # EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) output, only for sampled queries
+    Plan = Column(JSONB, nullable=True)
+    Plan_Execution_Ms = Column(Float, nullable=True)
+    Shared_Hit_Blocks = Column(BigInteger, nullable=True)
+    Shared_Read_Blocks = Column(BigInteger, nullable=True)
+    Explain_Error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("idx_slow_query_captured", "Captured_At"),
+        Index("idx_slow_query_endpoint_captured", "Endpoint", "Captured_At"),
+    )
+
+
+metadata_slow_query_log = Slow_Query_Log.metadata
+slow_query_log = Slow_Query_Log.__table__
@@ -0,0 +1,154 @@
+from sqlalchemy import text, select, func
+from util.db_source import db_source_engine, orders
+from util.logging_config import get_logger
+import time
+import os
+
+# Per-chunk latency target for source queries (ms)
+EXTRACT_LATENCY_BUDGET_MS = float(os.getenv("EXTRACT_LATENCY_BUDGET_MS") or 500)
+# Chunk size bounds, in source orders per query
+EXTRACT_MIN_CHUNK = int(os.getenv("EXTRACT_MIN_CHUNK") or 1000)
+EXTRACT_MAX_CHUNK = int(os.getenv("EXTRACT_MAX_CHUNK") or 200000)
+EXTRACT_INITIAL_CHUNK = int(os.getenv("EXTRACT_INITIAL_CHUNK") or 20000)
+# Source health limits; above these the extractor shrinks chunks and backs off
+SOURCE_MAX_THREADS_RUNNING = int(os.getenv("SOURCE_MAX_THREADS_RUNNING") or 32)
+SOURCE_MAX_REPLICA_LAG_S = float(os.getenv("SOURCE_MAX_REPLICA_LAG_S") or 10)
+EXTRACT_BACKOFF_S = float(os.getenv("EXTRACT_BACKOFF_S") or 2)
+# Health is polled every N chunks (each poll is two cheap SHOW statements)
+EXTRACT_HEALTH_EVERY = int(os.getenv("EXTRACT_HEALTH_EVERY") or 5)
+
+logger = get_logger(__name__)
+
+
+class AdaptiveChunkSizer:
+    """
+    AIMD controller for extraction chunk size.
+
+    Multiplicative decrease (halving) when a chunk blows the latency budget or
+    the source looks busy, additive increase (a quarter of the initial size)
+    when well under budget. Only a full-size chunk can grow the size: a short
+    final chunk is fast because it is small, not because the source has headroom.
+    """
+
+    def __init__(self, budget_ms=EXTRACT_LATENCY_BUDGET_MS, initial=EXTRACT_INITIAL_CHUNK,
+                 minimum=EXTRACT_MIN_CHUNK, maximum=EXTRACT_MAX_CHUNK):
+        self.budget_ms = budget_ms
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = max(minimum, min(maximum, initial))
+        self.step = max(1, self.size // 4)
+
+    def observe(self, latency_ms, chunk_orders, source_busy=False):
+        """Update and return the next chunk size given the last chunk's latency."""
+        if source_busy or latency_ms > self.budget_ms:
+            self.size = max(self.minimum, int(self.size * 0.5))
+        # A short (final) chunk still counts towards shrinking, never growing
+        elif latency_ms < self.budget_ms * 0.5 and chunk_orders >= self.size:
+            self.size = min(self.maximum, self.size + self.step)
+        return self.size
+
+
+def read_source_health(conn):
+    """
+    Sample MySQL load signals.
+
+    Returns:
+        dict: threads_running (int | None) and replica_lag_s (float | None). Either
+        is None when the server doesn't expose it or the user lacks privileges.
+    """
+    health = {"threads_running": None, "replica_lag_s": None}
+    try:
+        row = conn.execute(text("SHOW GLOBAL STATUS LIKE 'Threads_running'")).first()
+        if row is not None:
+            health["threads_running"] = int(row[1])
+    except Exception as e:
+        logger.debug(f"Threads_running unavailable: {e}")
+
+    # MySQL 8.0.22+ uses REPLICA wording; older servers only know SLAVE
+    for statement, column in (
+        ("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+        ("SHOW SLAVE STATUS", "Seconds_Behind_Master"),
+    ):
+        try:
+            row = conn.execute(text(statement)).mappings().first()
+        except Exception:
+            continue
+        if row is not None and row.get(column) is not None:
+            health["replica_lag_s"] = float(row[column])
+        break
+
+    return health
+
+
+def source_is_busy(health):
+    threads = health.get("threads_running")
+    lag = health.get("replica_lag_s")
+    return (
+        (threads is not None and threads > SOURCE_MAX_THREADS_RUNNING)
+        or (lag is not None and lag > SOURCE_MAX_REPLICA_LAG_S)
+    )
+
+
+def extract_by_order_ranges(stmt, sizer=None):
+    """
+    Run stmt in adaptive keyset chunks over Orders.id and return all rows.
+
+    Each chunk is `stmt WHERE orders.id > lo AND orders.id <= hi` (a PK range
+    scan on the source) in its own short transaction, so no long-lived read view
+    holds back purge on the OLTP server.
+
+    Args:
+        stmt: Select over orders (e.g. order_items_source_stmt())
+        sizer (AdaptiveChunkSizer): Optional controller (a default one is created)
+
+    Returns:
+        list: Rows from all chunks, in order id order
+    """
+    sizer = sizer or AdaptiveChunkSizer()
+    rows = []
+
+    with db_source_engine.connect() as conn:
+        bounds = conn.execute(select(func.min(orders.c.id), func.max(orders.c.id))).one()
+        conn.commit()
+        if bounds[0] is None:
+            return rows
+        low, high = bounds[0] - 1, bounds[1]
+
+        chunks = 0
+        busy_pauses = 0
+        extract_start = time.perf_counter()
+        while low < high:
+            upper = min(high, low + sizer.size)
+            start = time.perf_counter()
+            chunk = conn.execute(stmt.where(orders.c.id > low, orders.c.id <= upper)).all()
+            conn.commit()
+            latency_ms = (time.perf_counter() - start) * 1000
+            rows.extend(chunk)
+            chunks += 1
+
+            busy = False
+            if chunks % EXTRACT_HEALTH_EVERY == 0:
+                health = read_source_health(conn)
+                conn.commit()
+                busy = source_is_busy(health)
+                if busy:
+                    busy_pauses += 1
+                    logger.info(
+                        f"  Source busy (threads_running={health['threads_running']}, "
+                        f"replica_lag_s={health['replica_lag_s']}); backing off {EXTRACT_BACKOFF_S}s"
+                    )
+                    time.sleep(EXTRACT_BACKOFF_S)
+
+            previous = sizer.size
+            sizer.observe(latency_ms, upper - low, busy)
+            if sizer.size != previous:
+                logger.debug(f"  Chunk {chunks}: {latency_ms:.0f} ms -> chunk size {previous} -> {sizer.size}")
+            low = upper
+
+        logger.info(
+            f"Adaptive extract: {len(rows)} rows in {chunks} chunks, "
+            f"{busy_pauses} back-offs, {time.perf_counter() - extract_start:.1f}s "
+            f"(final chunk size {sizer.size} orders)"
+        )
+
+    return rows
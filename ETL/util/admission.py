@@ -0,0 +1,243 @@
+from fastapi import HTTPException
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from util.metrics import record_phase, register_collector
+from util.logging_config import get_logger
+import asyncio
+import time
+import os
+
+logger = get_logger(__name__)
+
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() in ("true", "1", "yes")
+
+
+def _class_settings(prefix, concurrency, queue, queue_timeout_s, statement_timeout_ms):
+    return {
+        "concurrency": int(os.getenv(f"{prefix}_CONCURRENCY") or concurrency),
+        "queue": int(os.getenv(f"{prefix}_QUEUE") or queue),
+        "queue_timeout_s": float(os.getenv(f"{prefix}_QUEUE_TIMEOUT_S") or queue_timeout_s),
+        "statement_timeout_ms": int(os.getenv(f"{prefix}_STATEMENT_TIMEOUT_MS") or statement_timeout_ms),
+    }
+
+
+# Per-class defaults; every endpoint gets its own limiter sized from its class,
+# so a burst on one heavy endpoint can't take the pool away from the others.
+#   lookup -> dimension lists (categories, cities): cheap, must stay responsive
+#   olap   -> fixed OLAP queries (may scan the fact table when served raw)
+#   cube   -> ad-hoc cube queries, the most expensive
+QUERY_CLASSES = {
+    "lookup": _class_settings("ADMISSION_LOOKUP", 8, 64, 1.0, 2000),
+    "olap": _class_settings("ADMISSION_OLAP", 6, 32, 2.0, 15000),
+    "cube": _class_settings("ADMISSION_CUBE", 3, 8, 2.0, 30000),
+}
+
+
+class Overloaded(HTTPException):
+    """503 when an endpoint's queue is full or the wait for a slot timed out."""
+
+    def __init__(self, endpoint, reason, retry_after_s=1):
+        super().__init__(
+            status_code=503,
+            detail=f"{endpoint} is overloaded ({reason}); retry shortly",
+            headers={"Retry-After": str(retry_after_s)},
+        )
+
+
+class QueryTimeout(HTTPException):
+    """504 when PostgreSQL cancelled a query at the endpoint's statement_timeout."""
+
+    def __init__(self, endpoint, timeout_ms):
+        super().__init__(status_code=504, detail=f"{endpoint} query exceeded {timeout_ms} ms")
+
+
+class EndpointLimiter:
+    """
+    Concurrency limit with a bounded wait queue for one endpoint.
+
+    Requests beyond `concurrency` wait up to `queue_timeout_s` for a slot;
+    once `queue` requests are already waiting, new ones are shed at once
+    with 503 instead of piling up in front of the connection pool.
+    """
+
+    def __init__(self, name, concurrency, queue, queue_timeout_s, statement_timeout_ms):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.queue_timeout_s = queue_timeout_s
+        self.statement_timeout_ms = statement_timeout_ms
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.timeouts = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+        elif self.waiting >= self.queue:
+            self.shed += 1
+            raise Overloaded(self.name, "queue full")
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout_s)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                raise Overloaded(self.name, f"no slot within {self.queue_timeout_s}s")
+            finally:
+                self.waiting -= 1
+
+        self.active += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "queue": self.queue,
+            "statement_timeout_ms": self.statement_timeout_ms,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timeouts": self.timeouts,
+        }
+
+
+_limiters = {}
+
+# Limiter of the endpoint handling the current request (set by query_policy)
+current_limiter = ContextVar("current_limiter", default=None)
+
+
+def get_limiter(endpoint, query_class):
+    limiter = _limiters.get(endpoint)
+    if limiter is None:
+        limiter = EndpointLimiter(endpoint, **QUERY_CLASSES[query_class])
+        _limiters[endpoint] = limiter
+    return limiter
+
+
+def query_policy(endpoint, query_class="olap"):
+    """
+    FastAPI dependency binding the request's warehouse queries to an endpoint limiter.
+
+    Queries issued through util/query_executor.py while handling the request
+    take a slot from this limiter and run under its statement_timeout.
+    """
+    limiter = get_limiter(endpoint, query_class)
+
+    async def dependency():
+        if ADMISSION_CONTROL_ENABLED:
+            current_limiter.set(limiter)
+        return limiter
+
+    return dependency
+
+
+def is_statement_timeout(exc):
+    """True for PostgreSQL's query_canceled (57014), whichever driver raised it."""
+    orig = getattr(exc, "orig", exc)
+    code = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    if code is None and getattr(orig, "__cause__", None) is not None:
+        code = getattr(orig.__cause__, "sqlstate", None)
+    return code == "57014"
+
+
+@asynccontextmanager
+async def admitted_query():
+    """
+    Slot + timeout scope around one warehouse query.
+
+    Yields the statement_timeout (ms) to apply, or None outside any policy.
+    """
+    limiter = current_limiter.get()
+    if limiter is None:
+        yield None
+        return
+    start = time.perf_counter()
+    async with limiter.slot():
+        record_phase("queue_wait", start)
+        try:
+            yield limiter.statement_timeout_ms
+        except Exception as e:
+            if is_statement_timeout(e):
+                limiter.timeouts += 1
+                logger.warning(
+                    f"{limiter.name}: query cancelled by statement_timeout after "
+                    f"{(time.perf_counter() - start) * 1000:.0f} ms"
+                )
+                raise QueryTimeout(limiter.name, limiter.statement_timeout_ms) from e
+            raise
+
+
+def admission_stats():
+    return {name: limiter.stats() for name, limiter in sorted(_limiters.items())}
+
+
+@register_collector
+def admission_metrics():
+    families = (
+        ("admission_active", "gauge", "Queries running under the endpoint's limit", "active"),
+        ("admission_waiting", "gauge", "Requests waiting for a slot", "waiting"),
+        ("admission_admitted_total", "counter", "Queries admitted", "admitted"),
+        ("admission_shed_total", "counter", "Requests rejected with 503", "shed"),
+        ("admission_timeouts_total", "counter", "Queries cancelled by statement_timeout", "timeouts"),
+    )
+    stats = admission_stats()
+    return [
+        (name, metric_type, help_text, [({"endpoint": endpoint}, values[key]) for endpoint, values in stats.items()])
+        for name, metric_type, help_text, key in families
+    ]
+
+
+class CancelOnDisconnectMiddleware:
+    """
+    Cancel the request handler when the client disconnects mid-request.
+
+    Starlette keeps running a handler whose client has gone, holding its
+    admission slot and pool connection until the query finishes. This watches
+    the ASGI receive channel for http.disconnect and cancels the handler task;
+    the cancellation reaches the running query through query_executor (asyncpg
+    cancels it server-side, sync mode sends a psycopg2 cancel request).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        messages = asyncio.Queue()
+        disconnected = False
+        handler = asyncio.create_task(self.app(scope, messages.get, send))
+
+        async def watch():
+            nonlocal disconnected
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    if not handler.done():
+                        disconnected = True
+                        handler.cancel()
+                    return
+
+        watcher = asyncio.create_task(watch())
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not disconnected:
+                raise
+            logger.info(f"Client disconnected, cancelled {scope['method']} {scope['path']}")
+        finally:
+            watcher.cancel()
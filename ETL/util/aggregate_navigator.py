@@ -0,0 +1,215 @@
+from sqlalchemy import text
+from datetime import datetime, timezone
+from util.query_executor import fetch_all
+from util.warehouse_version import warehouse_version
+from util.logging_config import get_logger
+import asyncio
+import os
+
+# How far (seconds) a summary may lag the last fact load and still be used.
+# 0 means only summaries refreshed after the latest load are served. Fine for
+# app.py reloads, which refresh right after loading; with etl_service.py every
+# micro-batch makes the summaries stale until its next refresh, so set this above
+# ETL_SERVICE_REFRESH_INTERVAL + ETL_SERVICE_INTERVAL or reads fall back to the fact table.
+AGGREGATE_MAX_STALENESS_S = float(os.getenv("AGGREGATE_MAX_STALENESS_S") or 0)
+# Set to false to always answer from fact_order_items
+AGGREGATE_NAVIGATION = os.getenv("AGGREGATE_NAVIGATION", "true").lower() in ("true", "1", "yes")
+
+FACT_SOURCE = "fact_order_items"
+
+logger = get_logger(__name__)
+
+
+class AggregateTable:
+    """
+    One summary table: its grain (cube level -> column) and the additive
+    measures it stores (measure -> column). Anything coarser than the grain
+    can be answered by re-aggregating it.
+    """
+
+    def __init__(self, name, levels, measures):
+        self.name = name
+        self.levels = levels
+        self.measures = measures
+
+    def covers(self, level_refs, measures):
+        return set(level_refs) <= set(self.levels) and set(measures) <= set(self.measures)
+
+
+_REVENUE_MEASURES = {"revenue": "total_revenue", "item_count": "item_count"}
+
+# Registry of the materialized views refreshed by etl_scripts/aggregates_etl.py.
+# order_count (COUNT DISTINCT) isn't additive, so it always comes from the fact table.
+AGGREGATES = [
+    AggregateTable(
+        "agg_revenue_by_month",
+        {"date.year": "Year", "date.quarter": "Quarter", "date.month": "Month"},
+        _REVENUE_MEASURES,
+    ),
+    AggregateTable(
+        "agg_revenue_by_rider",
+        {"rider.rider_id": "Rider_ID", "rider.courier": "Courier_Name", "rider.vehicle_type": "Vehicle_Type"},
+        _REVENUE_MEASURES,
+    ),
+    AggregateTable(
+        "agg_revenue_by_city_category_quarter",
+        {"customer.city": "City", "product.category": "Category", "date.year": "Year", "date.quarter": "Quarter"},
+        _REVENUE_MEASURES,
+    ),
+    AggregateTable(
+        "agg_revenue_by_city_product",
+        {
+            "customer.city": "City", "product.product_id": "Product_ID",
+            "product.name": "Name", "product.category": "Category",
+        },
+        _REVENUE_MEASURES,
+    ),
+    # Same grain without Category; listed after agg_revenue_by_city_product so that
+    # one wins ties. The slice endpoint reads it directly for its rank order.
+    AggregateTable(
+        "agg_product_rank_by_city",
+        {"customer.city": "City", "product.product_id": "Product_ID", "product.name": "Name"},
+        {"revenue": "total_revenue"},
+    ),
+    AggregateTable(
+        "agg_revenue_by_day_product",
+        {
+            "date.date": "Date", "date.year": "Year", "date.quarter": "Quarter",
+            "date.month": "Month", "date.day": "Day", "product.product_id": "Product_ID",
+            "product.name": "Name", "product.category": "Category",
+        },
+        {**_REVENUE_MEASURES, "quantity": "total_quantity"},
+    ),
+]
+
+AGGREGATES_BY_NAME = {aggregate.name: aggregate for aggregate in AGGREGATES}
+
+_STATE_SQL = text("""
+    SELECT mv.matviewname, mv.ispopulated, GREATEST(c.reltuples, 0)::bigint AS estimated_rows
+    FROM pg_matviews mv
+    JOIN pg_class c ON c.relname = mv.matviewname
+    WHERE mv.matviewname = ANY(:names)
+""")
+
+# Summaries are refreshed together as the last ETL stage ('aggregates' batch);
+# any load committed after that refresh makes them stale.
+_FRESHNESS_SQL = text("""
+    WITH last_refresh AS (
+        SELECT MAX("Batch_ID") AS batch_id, MAX("Finished_At") AS finished_at
+        FROM etl_batches
+        WHERE "Status" = 'success' AND "Mode" = 'aggregates'
+    )
+    SELECT
+        lr.finished_at,
+        (
+            SELECT MIN(b."Finished_At") FROM etl_batches b
+            WHERE b."Status" = 'success' AND b."Mode" <> 'aggregates'
+              AND b."Batch_ID" > COALESCE(lr.batch_id, 0)
+        ) AS first_unrefreshed_load_at
+    FROM last_refresh lr
+""")
+
+
+class AggregateNavigator:
+    """
+    Picks the smallest fresh summary table able to answer a query.
+
+    Availability (populated views, estimated row counts) and freshness are
+    re-read only when the warehouse data version changes, so routing a request
+    normally costs no database round trip.
+    """
+
+    def __init__(self, aggregates=AGGREGATES):
+        self.aggregates = aggregates
+        self._state_version = None
+        self._estimated_rows = {}
+        self._refreshed_at = None
+        self._stale_since = None
+        self._lock = asyncio.Lock()
+
+    async def _ensure_state(self):
+        version = await warehouse_version.current()
+        if version == self._state_version:
+            return
+        async with self._lock:
+            if version == self._state_version:
+                return
+            try:
+                rows = await fetch_all(_STATE_SQL, {"names": [a.name for a in self.aggregates]})
+                freshness = (await fetch_all(_FRESHNESS_SQL))[0]
+            except Exception as e:
+                # Missing migration or catalog access: route everything to the fact table
+                logger.warning(f"Aggregate navigator state unavailable, using fact table: {e}")
+                rows, freshness = [], (None, None)
+            self._estimated_rows = {name: estimated for name, populated, estimated in rows if populated}
+            self._refreshed_at, self._stale_since = freshness
+            self._state_version = version
+            if self._estimated_rows and not self._is_fresh():
+                logger.info(
+                    f"Summaries are behind the latest load (staleness {self.staleness_s()}s, "
+                    f"AGGREGATE_MAX_STALENESS_S={AGGREGATE_MAX_STALENESS_S}); reading {FACT_SOURCE} until refreshed"
+                )
+
+    def staleness_s(self):
+        """Seconds the summaries have been missing newer loads (0 when fresh, None if never refreshed)."""
+        if self._refreshed_at is None:
+            return None
+        if self._stale_since is None:
+            return 0.0
+        return max(0.0, (datetime.now(timezone.utc) - self._stale_since).total_seconds())
+
+    def _is_fresh(self):
+        staleness = self.staleness_s()
+        return staleness is not None and staleness <= AGGREGATE_MAX_STALENESS_S
+
+    async def usable(self, name):
+        """Whether a specific summary may serve reads right now."""
+        if not AGGREGATE_NAVIGATION:
+            return False
+        await self._ensure_state()
+        return self._is_fresh() and name in self._estimated_rows
+
+    async def choose(self, level_refs, measures):
+        """
+        Smallest usable summary covering every level (grouped or filtered) and measure.
+
+        Returns:
+            AggregateTable | None: None means the query must read the fact table
+        """
+        if not AGGREGATE_NAVIGATION:
+            return None
+        await self._ensure_state()
+        if not self._is_fresh():
+            return None
+        candidates = [
+            a for a in self.aggregates
+            if a.name in self._estimated_rows and a.covers(level_refs, measures)
+        ]
+        if not candidates:
+            return None
+        # Registry order breaks ties (and covers never-analyzed views estimated at 0 rows)
+        return min(candidates, key=lambda a: self._estimated_rows[a.name])
+
+    async def describe(self):
+        """Registry plus current availability/freshness (for GET /api/aggregates)."""
+        await self._ensure_state()
+        staleness = self.staleness_s()
+        return {
+            "enabled": AGGREGATE_NAVIGATION,
+            "max_staleness_s": AGGREGATE_MAX_STALENESS_S,
+            "refreshed_at": self._refreshed_at.isoformat() if self._refreshed_at else None,
+            "staleness_s": round(staleness, 1) if staleness is not None else None,
+            "aggregates": [
+                {
+                    "name": a.name,
+                    "grain": list(a.levels),
+                    "measures": list(a.measures),
+                    "populated": a.name in self._estimated_rows,
+                    "estimated_rows": self._estimated_rows.get(a.name),
+                }
+                for a in self.aggregates
+            ],
+        }
+
+
+aggregate_navigator = AggregateNavigator()
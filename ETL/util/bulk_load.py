@@ -0,0 +1,140 @@
+from sqlalchemy import text
+from util.db_warehouse import db_warehouse_engine
+from util.logging_config import get_logger
+import os
+
+# Full-reload load profile:
+#   "standard"    -> plain COPY, fully WAL-logged (default)
+#   "wal_minimal" -> COPY FREEZE into the truncated table and relaxed
+#                    synchronous_commit. Each piece is only enabled when the server
+#                    settings make it safe and useful.
+BULK_LOAD_PROFILE = os.getenv("BULK_LOAD_PROFILE", "standard").lower()
+
+logger = get_logger(__name__)
+
+_server_settings = None
+
+
+class BulkLoadPlan:
+    """Which WAL-reducing techniques apply to one table load, and why."""
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.freeze = False
+        self.synchronous_commit = None
+        self.notes = []
+
+    def describe(self):
+        enabled = [
+            name for name, on in (
+                ("COPY FREEZE", self.freeze),
+                (f"synchronous_commit={self.synchronous_commit}", self.synchronous_commit),
+            ) if on
+        ]
+        return ", ".join(enabled) if enabled else "standard COPY"
+
+
+def get_server_settings(conn):
+    """Read (once per process) the server settings the profile depends on."""
+    global _server_settings
+    if _server_settings is None:
+        rows = conn.execute(text("""
+            SELECT name, setting FROM pg_settings
+            WHERE name IN ('server_version_num', 'wal_level', 'archive_mode',
+                           'max_wal_senders', 'synchronous_standby_names')
+        """)).all()
+        _server_settings = {name: setting for name, setting in rows}
+        _server_settings["in_recovery"] = conn.execute(text("SELECT pg_is_in_recovery()")).scalar()
+    return _server_settings
+
+
+def plan_bulk_load(conn, table_name):
+    """
+    Decide which techniques to use for a truncate-and-COPY of table_name.
+
+    - COPY FREEZE (9.3+): rows are written already frozen, so no later
+      anti-wraparound/hint-bit rewrite; with wal_level=minimal the COPY itself
+      also skips WAL because the table was truncated in this transaction.
+    - No UNLOGGED staging: at wal_level=minimal the COPY above already skips
+      WAL, and at replica/logical level SET LOGGED writes the whole table to
+      WAL anyway. Either way SET UNLOGGED/LOGGED would only add a heap rewrite
+      and index rebuild.
+    - synchronous_commit: 'off' without synchronous standbys, otherwise 'local'.
+    """
+    plan = BulkLoadPlan(table_name)
+    if BULK_LOAD_PROFILE != "wal_minimal":
+        return plan
+
+    settings = get_server_settings(conn)
+    if settings["in_recovery"]:
+        plan.notes.append("server is a standby; bulk profile disabled")
+        return plan
+
+    if int(settings.get("server_version_num", 0)) >= 90300:
+        plan.freeze = True
+    else:
+        plan.notes.append("COPY FREEZE needs PostgreSQL 9.3+")
+
+    wal_level = settings.get("wal_level")
+    if wal_level != "minimal":
+        plan.notes.append(f"wal_level={wal_level}: COPY still WAL-logged")
+    else:
+        plan.notes.append("wal_level=minimal: COPY into the truncated table skips WAL")
+    plan.notes.append("no UNLOGGED staging: SET LOGGED would rewrite the table without saving WAL")
+
+    plan.synchronous_commit = "local" if settings.get("synchronous_standby_names") else "off"
+    return plan
+
+
+def begin_bulk_load(conn, plan):
+    """Apply session settings right after TRUNCATE (inside the load transaction)."""
+    if plan.synchronous_commit:
+        conn.execute(text(f"SET LOCAL synchronous_commit = {plan.synchronous_commit}"))
+    logger.info(f"Bulk load profile for {plan.table_name}: {plan.describe()}")
+    for note in plan.notes:
+        logger.info(f"  {note}")
+
+
+def copy_options(plan):
+    """WITH clause for COPY ... FROM STDIN matching the plan."""
+    if plan.freeze:
+        return "WITH (FORMAT csv, FREEZE true)"
+    return "WITH CSV"
+
+
+def current_wal_lsn():
+    """Current WAL insert position, or None when it can't be read (e.g. on a standby)."""
+    try:
+        with db_warehouse_engine.connect() as conn:
+            return conn.execute(text("SELECT pg_current_wal_lsn()::text")).scalar()
+    except Exception as e:
+        logger.debug(f"Could not read WAL position: {e}")
+        return None
+
+
+def wal_bytes_since(start_lsn):
+    """
+    WAL bytes generated cluster-wide since start_lsn.
+
+    Includes WAL from any other activity on the server during the step.
+    """
+    if start_lsn is None:
+        return None
+    try:
+        with db_warehouse_engine.connect() as conn:
+            return conn.execute(
+                text("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), CAST(:lsn AS pg_lsn))::bigint"),
+                {"lsn": start_lsn},
+            ).scalar()
+    except Exception as e:
+        logger.debug(f"Could not compute WAL bytes: {e}")
+        return None
+
+
+def format_bytes(num_bytes):
+    if num_bytes is None:
+        return "n/a"
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(num_bytes) < 1024 or unit == "GB":
+            return f"{num_bytes:.1f} {unit}" if unit != "B" else f"{num_bytes} B"
+        num_bytes /= 1024
@@ -0,0 +1,132 @@
+from sqlalchemy import text
+from bisect import bisect_left
+from util.query_executor import fetch_all
+from util.warehouse_version import warehouse_version
+from util.logging_config import get_logger
+import asyncio
+import time
+
+logger = get_logger(__name__)
+
+_CITIES_SQL = text('SELECT DISTINCT "City" FROM dim_users WHERE "City" IS NOT NULL')
+
+NGRAM = 3
+WORD_SEPARATORS = (" ", "-", "'", ".", "/")
+
+
+def _ngrams(value):
+    return {value[i:i + NGRAM] for i in range(len(value) - NGRAM + 1)}
+
+
+class CityIndex:
+    """
+    In-process autocomplete index over dim_users."City".
+
+    Names are kept casefolded in a sorted array (prefix search by bisection)
+    plus a trigram -> name ids map (substring search by intersecting postings).
+    Rebuilt only when the warehouse data version changes; a few thousand
+    cities take a few milliseconds to index.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._names = []        # original spelling, sorted by casefolded name
+        self._folded = []       # casefolded names, same order
+        self._ngrams = {}
+        self._lock = asyncio.Lock()
+
+    def build(self, cities):
+        pairs = sorted({(city.casefold(), city) for city in cities if city})
+        names = [city for _, city in pairs]
+        folded = [key for key, _ in pairs]
+        ngrams = {}
+        for position, key in enumerate(folded):
+            for gram in _ngrams(key):
+                ngrams.setdefault(gram, []).append(position)
+        # Swap in whole structures so concurrent searches never see a half-built index
+        self._names, self._folded, self._ngrams = names, folded, ngrams
+
+    async def ensure_current(self):
+        """Rebuild from the warehouse if the data version moved on."""
+        version = await warehouse_version.current()
+        if version == self.version:
+            return
+        async with self._lock:
+            if version == self.version:
+                return
+            start = time.perf_counter()
+            rows = await fetch_all(_CITIES_SQL)
+            self.build(row[0] for row in rows)
+            self.version = version
+            logger.info(
+                f"City index rebuilt for data version {version}: {len(self._names)} cities, "
+                f"{len(self._ngrams)} trigrams in {(time.perf_counter() - start) * 1000:.1f} ms"
+            )
+
+    def _candidates(self, query):
+        if len(query) < NGRAM:
+            return range(len(self._folded))
+        postings = sorted((self._ngrams.get(gram, []) for gram in _ngrams(query)), key=len)
+        if not postings[0]:
+            return []
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        return candidates
+
+    def _prefix_matches(self, query, limit):
+        start = bisect_left(self._folded, query)
+        matches = []
+        for position in range(start, len(self._folded)):
+            if not self._folded[position].startswith(query) or len(matches) >= limit:
+                break
+            matches.append(position)
+        return matches
+
+    def search(self, query, limit=50, prefix_only=False):
+        """
+        Case-insensitive prefix/substring search.
+
+        Ranking: exact match, then name prefix, then word prefix (e.g. "york" in
+        "New York"), then any other substring; ties by match position, shorter
+        name, then alphabetically.
+
+        Args:
+            query (str): Search text; empty returns the first `limit` cities
+            limit (int): Maximum results
+            prefix_only (bool): Only names starting with the query
+
+        Returns:
+            list[str]
+        """
+        query = (query or "").strip().casefold()
+        if not query:
+            return self._names[:limit]
+        if prefix_only:
+            return [self._names[p] for p in self._prefix_matches(query, limit)]
+
+        ranked = []
+        for position in self._candidates(query):
+            name = self._folded[position]
+            offset = name.find(query)
+            if offset < 0:
+                continue
+            if name == query:
+                rank = 0
+            elif offset == 0:
+                rank = 1
+            elif name[offset - 1] in WORD_SEPARATORS:
+                rank = 2
+            else:
+                rank = 3
+            ranked.append((rank, offset, len(name), name, position))
+        ranked.sort()
+        return [self._names[entry[-1]] for entry in ranked[:limit]]
+
+    def __len__(self):
+        return len(self._names)
+
+
+city_index = CityIndex()
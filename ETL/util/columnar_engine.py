@@ -0,0 +1,448 @@
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from decimal import Decimal
+from functools import reduce
+from itertools import groupby
+from util.db_warehouse import db_warehouse_engine
+from util.warehouse_version import warehouse_version
+from util.result_set import ResultSet
+from util.revenue import REVENUE_STORAGE
+from util.metrics import phase, annotate, register_collector
+from util.logging_config import get_logger
+import asyncio
+import time
+import io
+import os
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    np = pd = None
+
+logger = get_logger(__name__)
+
+COLUMNAR_AVAILABLE = np is not None
+
+# Answer rollup/drillDown/slice/dice from an in-memory copy of fact_order_items
+# instead of PostgreSQL (only when ?source=aggregate, the default)
+COLUMNAR_ENGINE_ENABLED = os.getenv("COLUMNAR_ENGINE_ENABLED", "false").lower() in ("true", "1", "yes")
+# Larger fact tables (by planner estimate) are not loaded; the SQL path serves them
+COLUMNAR_MAX_ROWS = int(os.getenv("COLUMNAR_MAX_ROWS") or 20_000_000)
+# Seconds before a failed load is retried
+COLUMNAR_RETRY_S = float(os.getenv("COLUMNAR_RETRY_S") or 60)
+
+# Label in X-Served-By for responses computed in process
+COLUMNAR_SOURCE = "columnar"
+
+# Group key spaces up to this size are summed with one dense bincount;
+# larger ones are compacted with np.unique first
+_DENSE_GROUP_LIMIT = 1 << 24
+
+# Same definition as util/warehouse_version.py, read inside the load's snapshot
+_VERSION_SQL = text("""
+    SELECT COALESCE(MAX("Batch_ID"), 0) FROM etl_batches WHERE "Status" = 'success'
+""")
+
+_ESTIMATE_SQL = text("""
+    SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = to_regclass('fact_order_items')
+""")
+
+_USERS_SQL = text('SELECT "Users_ID", "City" FROM dim_users ORDER BY "Users_ID"')
+_PRODUCTS_SQL = text('SELECT "Product_ID", "Name", "Category" FROM dim_products ORDER BY "Product_ID"')
+_DATES_SQL = text('SELECT "Date_ID", "Date", "Year", "Quarter", "Month" FROM dim_date ORDER BY "Date_ID"')
+_RIDERS_SQL = text("""
+    SELECT "Rider_ID", "Courier_Name", "Vehicle_Type", "First_Name", "Last_Name"
+    FROM dim_riders ORDER BY "Rider_ID"
+""")
+
+# Cents are exact integers and sum exactly in float64 weights (below 2^53)
+_FACT_COPY = """
+    COPY (
+        SELECT "Product_ID", "User_ID", "Delivery_Date_ID",
+               COALESCE("Delivery_Rider_ID", -1), "Total_Revenue_Cents"
+        FROM fact_order_items
+    ) TO STDOUT WITH (FORMAT csv)
+"""
+_FACT_COLUMNS = ["product_id", "user_id", "date_id", "rider_id", "cents"]
+
+
+def _revenue(cents):
+    """Summed cents in the representation the SQL path returns for REVENUE_STORAGE."""
+    if REVENUE_STORAGE == "cents":
+        return cents
+    return Decimal(cents).scaleb(-2)
+
+
+def _dense_positions(ids, sorted_keys):
+    """Position of each id in sorted_keys (a dimension's key column), -1 where absent."""
+    if not len(sorted_keys):
+        return np.full(len(ids), -1, dtype=np.int32)
+    positions = np.searchsorted(sorted_keys, ids)
+    np.minimum(positions, len(sorted_keys) - 1, out=positions)
+    return np.where(sorted_keys[positions] == ids, positions, -1).astype(np.int32)
+
+
+def _grouped_sum(keys, weights, size):
+    """(group keys present, their summed weights) for int keys in [0, size)."""
+    if size <= _DENSE_GROUP_LIMIT:
+        counts = np.bincount(keys, minlength=size)
+        sums = np.bincount(keys, weights=weights, minlength=size)
+        present = np.flatnonzero(counts)
+        return present, sums[present]
+    groups, inverse = np.unique(keys, return_inverse=True)
+    return groups, np.bincount(inverse, weights=weights)
+
+
+def _by_revenue(groups, sums):
+    """Groups and integer cents, highest revenue first (ties in key order)."""
+    order = np.argsort(-sums, kind="stable")
+    return groups[order], np.rint(sums[order]).astype(np.int64)
+
+
+class BitmapIndex:
+    """
+    Fact rows per dictionary code of one column.
+
+    Frequent codes get a packed bitmap (one bit per row); rare ones a sorted
+    array of row ids, whichever is smaller, as Roaring bitmap containers do.
+    That keeps a few-thousand-city index near 4 bytes per row instead of one
+    bitmap per city.
+    """
+
+    def __init__(self, codes, cardinality):
+        self.size = len(codes)
+        counts = np.bincount(codes, minlength=cardinality)
+        order = np.argsort(codes, kind="stable").astype(np.int32)
+        self._entries = []
+        start = 0
+        for count in counts:
+            rows = order[start:start + count]
+            start += count
+            # 32-bit row ids cost more than a bitmap once a code covers 1/32 of the rows
+            if count * 32 >= self.size:
+                bitmap = np.zeros(self.size, dtype=bool)
+                bitmap[rows] = True
+                self._entries.append((True, np.packbits(bitmap)))
+            else:
+                self._entries.append((False, rows))
+
+    def select(self, codes):
+        """Boolean row mask for rows holding any of codes."""
+        mask = np.zeros(self.size, dtype=bool)
+        for code in codes:
+            is_bitmap, entry = self._entries[code]
+            if is_bitmap:
+                mask |= np.unpackbits(entry, count=self.size).view(bool)
+            else:
+                mask[entry] = True
+        return mask
+
+    @property
+    def nbytes(self):
+        return sum(entry.nbytes for _, entry in self._entries)
+
+
+class ColumnarSnapshot:
+    """
+    fact_order_items as of one warehouse data version, as NumPy columns.
+
+    Fact rows hold dense positions into the dimension arrays (dictionary
+    encoding: City and Category are codes into sorted value arrays), plus
+    revenue in cents. City, Category, Year and Quarter have bitmap indexes
+    for filtering; grouped sums are bincounts over composite integer keys.
+    Read-only once built, so queries need no locking.
+    """
+
+    def __init__(self, version, users, products, dates, riders, facts):
+        self.version = version
+
+        self.cities, user_city = np.unique(np.array([row[1] for row in users], dtype=object), return_inverse=True)
+        self.categories, product_category = np.unique(
+            np.array([row[2] for row in products], dtype=object), return_inverse=True
+        )
+        self.city_codes = {city: code for code, city in enumerate(self.cities)}
+        self.category_codes = {category: code for code, category in enumerate(self.categories)}
+        self.product_category = product_category.astype(np.int32)
+        self.product_names = [row[1] for row in products]
+        self.rider_columns = [tuple(row[1:]) for row in riders]
+
+        self.date_values = np.array([row[1] for row in dates], dtype="datetime64[D]")
+        self.years = np.unique(np.array([row[2] for row in dates], dtype=np.int32))
+        self.year_codes = {int(year): code for code, year in enumerate(self.years)}
+        date_year = np.searchsorted(self.years, np.array([row[2] for row in dates], dtype=np.int32))
+        self.date_quarter = np.array([row[3] for row in dates], dtype=np.int32)
+        self.date_month = np.array([row[4] for row in dates], dtype=np.int32)
+        # Year x quarter as one code per date: year_code * 4 + quarter - 1
+        self.date_year_quarter = (date_year * 4 + self.date_quarter - 1).astype(np.int32)
+
+        user_ids = np.array([row[0] for row in users], dtype=np.int64)
+        product_ids = np.array([row[0] for row in products], dtype=np.int64)
+        date_ids = np.array([row[0] for row in dates], dtype=np.int64)
+        rider_ids = np.array([row[0] for row in riders], dtype=np.int64)
+
+        user = _dense_positions(facts["user_id"].to_numpy(np.int64), user_ids)
+        product = _dense_positions(facts["product_id"].to_numpy(np.int64), product_ids)
+        date = _dense_positions(facts["date_id"].to_numpy(np.int64), date_ids)
+        joined = (user >= 0) & (product >= 0) & (date >= 0)
+        if not joined.all():
+            # Only possible with foreign keys disabled; the SQL inner joins drop them too
+            logger.warning(f"Columnar load: skipping {int((~joined).sum())} facts without dimension rows")
+
+        self.city = user_city.astype(np.int32)[user[joined]]
+        self.product = product[joined]
+        self.date = date[joined]
+        self.rider = _dense_positions(facts["rider_id"].to_numpy(np.int64)[joined], rider_ids)
+        self.cents = facts["cents"].to_numpy(np.float64)[joined]
+        self.rows = len(self.cents)
+
+        self.indexes = {
+            "City": BitmapIndex(self.city, len(self.cities)),
+            "Category": BitmapIndex(self.product_category[self.product], len(self.categories)),
+            "Year": BitmapIndex(date_year.astype(np.int32)[self.date], len(self.years)),
+            "Quarter": BitmapIndex(self.date_quarter[self.date] - 1, 4),
+        }
+
+    @property
+    def nbytes(self):
+        columns = (self.city, self.product, self.date, self.rider, self.cents)
+        return sum(column.nbytes for column in columns) + sum(index.nbytes for index in self.indexes.values())
+
+    def _select(self, column, values, lookup):
+        codes = [lookup[value] for value in values if value in lookup]
+        return self.indexes[column].select(codes)
+
+    def rollup(self):
+        """Same rows as rollup_sql(): Year > Quarter > Month with subtotals, nulls last."""
+        counts = np.bincount(self.date, minlength=len(self.date_values))
+        sums = np.bincount(self.date, weights=self.cents, minlength=len(self.date_values))
+        months = {}
+        for position in np.flatnonzero(counts):
+            year = int(self.years[self.date_year_quarter[position] // 4])
+            key = (year, int(self.date_quarter[position]), int(self.date_month[position]))
+            months[key] = months.get(key, 0) + int(round(sums[position]))
+
+        rows = []
+        for year, year_months in groupby(sorted(months.items()), key=lambda item: item[0][0]):
+            year_months = list(year_months)
+            for quarter, quarter_months in groupby(year_months, key=lambda item: item[0][1]):
+                quarter_months = list(quarter_months)
+                rows += [(year, quarter, month, total) for (_, _, month), total in quarter_months]
+                rows.append((year, quarter, None, sum(total for _, total in quarter_months)))
+            rows.append((year, None, None, sum(total for _, total in year_months)))
+        # GROUP BY ROLLUP always yields the grand total row, NULL over no rows
+        rows.append((None, None, None, sum(months.values()) if months else None))
+        rows = [
+            (year, quarter, month, _revenue(total) if total is not None else None)
+            for year, quarter, month, total in rows
+        ]
+        return ResultSet(["Year", "Quarter", "Month", "revenue"], rows, ("revenue",))
+
+    def drilldown(self):
+        """Same rows as drilldown_sql(): revenue per rider, highest first."""
+        with_rider = self.rider >= 0
+        groups, sums = _grouped_sum(self.rider[with_rider], self.cents[with_rider], len(self.rider_columns))
+        groups, totals = _by_revenue(groups, sums)
+        rows = [self.rider_columns[rider] + (_revenue(int(total)),) for rider, total in zip(groups, totals)]
+        return ResultSet(
+            ["Courier_Name", "Vehicle_Type", "First_Name", "Last_Name", "total_revenue"], rows, ("total_revenue",)
+        )
+
+    def slice(self, city):
+        """Same rows as slice_sql(): revenue per product in one city, highest first."""
+        rows = np.flatnonzero(self._select("City", [city], self.city_codes))
+        groups, sums = _grouped_sum(self.product[rows], self.cents[rows], len(self.product_names))
+        groups, totals = _by_revenue(groups, sums)
+        rows = [(city, self.product_names[product], _revenue(int(total))) for product, total in zip(groups, totals)]
+        return ResultSet(["City", "Name", "total_revenue"], rows, ("total_revenue",))
+
+    def dice(self, cities=None, categories=None, date_from=None, date_to=None, year=None, quarter=None):
+        """
+        Same rows as dice_sql() / dice_range_sql(): revenue per city x category x
+        quarter, highest first. None leaves a dimension unfiltered.
+        """
+        masks = []
+        if cities is not None:
+            masks.append(self._select("City", cities, self.city_codes))
+        if categories is not None:
+            masks.append(self._select("Category", categories, self.category_codes))
+        if year is not None:
+            masks.append(self._select("Year", [year], self.year_codes))
+        if quarter is not None:
+            masks.append(self.indexes["Quarter"].select([quarter - 1] if 1 <= quarter <= 4 else []))
+        if date_from is not None or date_to is not None:
+            in_range = np.ones(len(self.date_values), dtype=bool)
+            if date_from is not None:
+                in_range &= self.date_values >= np.datetime64(date_from, "D")
+            if date_to is not None:
+                in_range &= self.date_values <= np.datetime64(date_to, "D")
+            masks.append(in_range[self.date])
+        rows = np.flatnonzero(reduce(np.logical_and, masks)) if masks else slice(None)
+
+        year_quarters = len(self.years) * 4
+        keys = (
+            self.city[rows].astype(np.int64) * len(self.categories)
+            + self.product_category[self.product[rows]]
+        ) * year_quarters + self.date_year_quarter[self.date[rows]]
+        groups, sums = _grouped_sum(keys, self.cents[rows], len(self.cities) * len(self.categories) * year_quarters)
+        groups, totals = _by_revenue(groups, sums)
+
+        result = []
+        for key, total in zip(groups.tolist(), totals.tolist()):
+            city_category, year_quarter = divmod(key, year_quarters)
+            city, category = divmod(city_category, len(self.categories))
+            result.append((
+                self.cities[city], self.categories[category],
+                int(self.years[year_quarter // 4]), year_quarter % 4 + 1, _revenue(total),
+            ))
+        return ResultSet(["City", "Category", "Year", "Quarter", "total_revenue"], result, ("total_revenue",))
+
+
+def load_snapshot():
+    """
+    Read the fact table and dimensions in one REPEATABLE READ transaction.
+
+    Returns:
+        (version, ColumnarSnapshot or None): None when the fact table is over COLUMNAR_MAX_ROWS
+    """
+    with db_warehouse_engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        with conn.begin():
+            version = conn.execute(_VERSION_SQL).scalar()
+            estimate = conn.execute(_ESTIMATE_SQL).scalar() or 0
+            if estimate > COLUMNAR_MAX_ROWS:
+                return version, None
+            users = conn.execute(_USERS_SQL).all()
+            products = conn.execute(_PRODUCTS_SQL).all()
+            dates = conn.execute(_DATES_SQL).all()
+            riders = conn.execute(_RIDERS_SQL).all()
+
+            # COPY is far cheaper than building a Row per fact
+            buffer = io.BytesIO()
+            conn.connection.cursor().copy_expert(_FACT_COPY, buffer)
+    buffer.seek(0)
+    facts = pd.read_csv(buffer, header=None, names=_FACT_COLUMNS, dtype="int64")
+    del buffer
+    return version, ColumnarSnapshot(version, users, products, dates, riders, facts)
+
+
+class ColumnarEngine:
+    """
+    Holds the current ColumnarSnapshot and reloads it per data version.
+
+    A snapshot only answers while its version matches the warehouse; when the
+    ETL commits a new batch, the stale one is dropped, a reload starts in the
+    background and requests take the SQL path until it is ready.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        self._loading = None
+        self._skipped_version = None
+        self._failed_at = None
+        self.loads = 0
+        self.failures = 0
+        self.served = 0
+        self.last_load_s = None
+
+    @property
+    def enabled(self):
+        return COLUMNAR_ENGINE_ENABLED and COLUMNAR_AVAILABLE
+
+    def start(self):
+        """Begin the first load without waiting for it (API startup)."""
+        if self.enabled:
+            self._loading = asyncio.create_task(self._reload())
+
+    async def stop(self):
+        if self._loading is not None and not self._loading.done():
+            self._loading.cancel()
+        self._loading = None
+
+    async def current(self):
+        """Snapshot for the current data version, or None (a reload may be under way)."""
+        if not self.enabled:
+            return None
+        version = await warehouse_version.current()
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.version >= version:
+            # A newer snapshot than the cached version just means the cache is about to catch up
+            return snapshot if snapshot.version == version else None
+        if snapshot is not None:
+            # Free the stale copy before loading the next one
+            self.snapshot = None
+        retrying = self._failed_at is not None and time.monotonic() - self._failed_at < COLUMNAR_RETRY_S
+        if version != self._skipped_version and not retrying and (self._loading is None or self._loading.done()):
+            self._loading = asyncio.create_task(self._reload())
+        return None
+
+    async def _reload(self):
+        start = time.perf_counter()
+        try:
+            version, snapshot = await run_in_threadpool(load_snapshot)
+        except Exception as e:
+            self.failures += 1
+            self._failed_at = time.monotonic()
+            logger.warning(f"Columnar engine load failed, serving from SQL: {e}")
+            return
+        self._failed_at = None
+        if snapshot is None:
+            self._skipped_version = version
+            logger.warning(
+                f"fact_order_items exceeds COLUMNAR_MAX_ROWS ({COLUMNAR_MAX_ROWS}); "
+                f"columnar engine off for data version {version}"
+            )
+            return
+        self.snapshot = snapshot
+        self.loads += 1
+        self.last_load_s = time.perf_counter() - start
+        logger.info(
+            f"Columnar engine loaded data version {version}: {snapshot.rows} facts, "
+            f"{snapshot.nbytes / 1024 / 1024:.1f} MB in {self.last_load_s:.1f}s"
+        )
+
+    async def run(self, query):
+        """
+        Answer with query(snapshot) in a worker thread.
+
+        Returns:
+            The query's result, or None when no current snapshot is loaded
+            or the query returns None (unsupported); callers then use SQL.
+        """
+        snapshot = await self.current()
+        if snapshot is None:
+            return None
+        with phase("compute"):
+            result = await run_in_threadpool(query, snapshot)
+        if result is not None:
+            self.served += 1
+            annotate("columnar_version", snapshot.version)
+        return result
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            "enabled": self.enabled,
+            "version": snapshot.version if snapshot is not None else None,
+            "rows": snapshot.rows if snapshot is not None else 0,
+            "bytes": snapshot.nbytes if snapshot is not None else 0,
+            "loads": self.loads,
+            "failures": self.failures,
+            "served": self.served,
+            "last_load_s": self.last_load_s,
+        }
+
+
+columnar_engine = ColumnarEngine()
+
+
+@register_collector
+def columnar_metrics():
+    stats = columnar_engine.stats()
+    return [
+        ("columnar_engine_rows", "gauge", "Fact rows held in memory", [({}, stats["rows"])]),
+        ("columnar_engine_bytes", "gauge", "Memory used by columns and indexes", [({}, stats["bytes"])]),
+        ("columnar_engine_loads_total", "counter", "Snapshots loaded", [({}, stats["loads"])]),
+        ("columnar_engine_load_failures_total", "counter", "Failed snapshot loads", [({}, stats["failures"])]),
+        ("columnar_engine_served_total", "counter", "Queries answered in process", [({}, stats["served"])]),
+        ("columnar_engine_last_load_seconds", "gauge", "Duration of the last load", [({}, stats["last_load_s"])]),
+    ]
@@ -0,0 +1,310 @@
+from sqlalchemy import text
+from datetime import date
+from util.revenue import REVENUE_STORAGE
+
+# Declarative model of the star schema used by /api/cube. Only what is listed
+# here can be queried, so identifiers never come from user input.
+
+FACT_TABLE = "fact_order_items"
+FACT_ALIAS = "foi"
+
+# dimension -> table, alias, join condition to the fact table, and levels
+# (level name -> column). Levels are listed coarse to fine.
+DIMENSIONS = {
+    "date": {
+        "table": "dim_date",
+        "alias": "dd",
+        "join": 'dd."Date_ID" = foi."Delivery_Date_ID"',
+        "levels": {
+            "year": 'dd."Year"',
+            "quarter": 'dd."Quarter"',
+            "month": 'dd."Month"',
+            "day": 'dd."Day"',
+            "date": 'dd."Date"',
+        },
+    },
+    "product": {
+        "table": "dim_products",
+        "alias": "dp",
+        "join": 'dp."Product_ID" = foi."Product_ID"',
+        "levels": {
+            "category": 'dp."Category"',
+            "name": 'dp."Name"',
+            "product_id": 'dp."Product_ID"',
+        },
+    },
+    "customer": {
+        "table": "dim_users",
+        "alias": "du",
+        "join": 'du."Users_ID" = foi."User_ID"',
+        "levels": {
+            "country": 'du."Country"',
+            "city": 'du."City"',
+            "zipcode": 'du."Zipcode"',
+            "gender": 'du."Gender"',
+        },
+    },
+    "rider": {
+        "table": "dim_riders",
+        "alias": "dr",
+        "join": 'dr."Rider_ID" = foi."Delivery_Rider_ID"',
+        "levels": {
+            "courier": 'dr."Courier_Name"',
+            "vehicle_type": 'dr."Vehicle_Type"',
+            "gender": 'dr."Gender"',
+            "age": 'dr."Age"',
+            "rider_id": 'dr."Rider_ID"',
+        },
+    },
+}
+
+# Levels answerable from the fact table's own foreign keys (no join needed)
+FACT_LEVELS = {
+    "product.product_id": 'foi."Product_ID"',
+    "customer.user_id": 'foi."User_ID"',
+    "rider.rider_id": 'foi."Delivery_Rider_ID"',
+}
+
+# Levels whose filter values arrive as ISO strings but bind as dates
+DATE_LEVELS = {"date.date"}
+
+
+def _measures(storage):
+    revenue = (
+        'SUM(foi."Total_Revenue_Cents")::bigint' if storage == "cents"
+        else 'SUM(foi."Total_Revenue")'
+    )
+    return {
+        "revenue": revenue,
+        "quantity": 'SUM(foi."Quantity")',
+        "order_count": 'COUNT(DISTINCT foi."Order_Num")',
+        "item_count": "COUNT(*)",
+    }
+
+
+MEASURES = tuple(_measures("numeric"))
+GROUPINGS = ("rollup", "cube", "grouping_sets")
+FILTER_OPS = ("eq", "ne", "in", "gte", "lte", "between")
+CUBE_MAX_LIMIT = 10000
+
+
+class CubeQueryError(ValueError):
+    """Raised when a cube request doesn't validate against the model."""
+
+
+class CompiledCubeQuery:
+    """SQL text plus bind parameters and the output column labels."""
+
+    def __init__(self, sql, params, columns, revenue_keys):
+        self.sql = sql
+        self.params = params
+        self.columns = columns
+        self.revenue_keys = revenue_keys
+
+
+def describe_model():
+    """Public description of the queryable model (for GET /api/cube/model)."""
+    dimensions = {name: list(dimension["levels"]) for name, dimension in DIMENSIONS.items()}
+    for ref in FACT_LEVELS:
+        dimension_name, _, level = ref.partition(".")
+        if level not in dimensions[dimension_name]:
+            dimensions[dimension_name].append(level)
+    return {
+        "dimensions": dimensions,
+        "measures": list(MEASURES),
+        "filter_ops": list(FILTER_OPS),
+        "groupings": list(GROUPINGS),
+    }
+
+
+def _resolve_level(ref):
+    """'date.year' -> (dimension name or None if answered by the fact, column expr)."""
+    if ref in FACT_LEVELS:
+        return None, FACT_LEVELS[ref]
+    dimension_name, _, level = ref.partition(".")
+    dimension = DIMENSIONS.get(dimension_name)
+    if dimension is None or level not in dimension["levels"]:
+        raise CubeQueryError(f"Unknown level '{ref}'; expected <dimension>.<level>, see /api/cube/model")
+    return dimension_name, dimension["levels"][level]
+
+
+def _coerce_filter_value(ref, value):
+    if ref not in DATE_LEVELS or not isinstance(value, str):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CubeQueryError(f"Filter on {ref}: '{value}' is not an ISO date")
+
+
+def _quote_label(label):
+    return '"' + label.replace('"', "") + '"'
+
+
+def _aggregate_measures(aggregate, storage):
+    # Summary rows are re-aggregated, so every measure becomes a SUM of a stored total
+    columns = dict(aggregate.measures)
+    if "revenue" in columns:
+        columns["revenue"] = "total_revenue_cents" if storage == "cents" else "total_revenue"
+    return {
+        measure: (
+            f'SUM(agg."{column}")::bigint' if measure != "revenue" or storage == "cents"
+            else f'SUM(agg."{column}")'
+        )
+        for measure, column in columns.items()
+    }
+
+
+def compile_cube_query(levels, measures, filters=None, grouping=None, grouping_sets=None,
+                       order_by=None, limit=None, storage=None, aggregate=None):
+    """
+    Compile a cube request into one parameterized star-join query.
+
+    Args:
+        levels (list[str]): Group-by levels as '<dimension>.<level>'
+        measures (list[str]): Measure names from MEASURES; all computed in one scan
+        filters (list[dict]): {'level', 'op', 'value'}; 'in' takes a list,
+            'between' a [low, high] pair
+        grouping (str): None, 'rollup', 'cube' or 'grouping_sets'
+        grouping_sets (list[list[str]]): Level sets for grouping='grouping_sets'
+            (each a subset of levels; [] is the grand total)
+        order_by (list[str]): Level or measure names, '-' prefix for descending
+        limit (int): Optional row limit (capped at CUBE_MAX_LIMIT)
+        storage (str): Revenue representation (defaults to REVENUE_STORAGE)
+        aggregate (AggregateTable): Summary table to read instead of the star join
+            (chosen by util/aggregate_navigator.py; must cover every level and measure)
+
+    Returns:
+        CompiledCubeQuery
+
+    Raises:
+        CubeQueryError: If anything doesn't validate against the model
+    """
+    storage = storage or REVENUE_STORAGE
+    filters = filters or []
+    measure_exprs = _measures(storage) if aggregate is None else _aggregate_measures(aggregate, storage)
+
+    if not measures:
+        raise CubeQueryError("At least one measure is required")
+    unknown = [m for m in measures if m not in measure_exprs]
+    if unknown and aggregate is not None:
+        raise CubeQueryError(f"Aggregate {aggregate.name} can't answer measures {unknown}")
+    if unknown:
+        raise CubeQueryError(f"Unknown measures {unknown}; expected any of {list(MEASURES)}")
+    if len(set(levels)) != len(levels):
+        raise CubeQueryError("Levels must be unique")
+    if grouping is not None and grouping not in GROUPINGS:
+        raise CubeQueryError(f"grouping must be one of {list(GROUPINGS)}")
+    if grouping and not levels:
+        raise CubeQueryError(f"grouping '{grouping}' needs at least one level")
+
+    def resolve(ref):
+        if aggregate is None:
+            return _resolve_level(ref)
+        if ref not in aggregate.levels:
+            raise CubeQueryError(f"Aggregate {aggregate.name} has no level '{ref}'")
+        return None, f'agg."{aggregate.levels[ref]}"'
+
+    joins = set()
+    level_exprs = {}
+    for ref in levels:
+        dimension_name, expr = resolve(ref)
+        if dimension_name:
+            joins.add(dimension_name)
+        level_exprs[ref] = expr
+
+    params = {}
+    where = []
+    for i, flt in enumerate(filters):
+        ref, op, value = flt.get("level"), flt.get("op", "eq"), flt.get("value")
+        dimension_name, expr = resolve(ref)
+        if dimension_name:
+            joins.add(dimension_name)
+        if op not in FILTER_OPS:
+            raise CubeQueryError(f"Unknown filter op '{op}'; expected one of {list(FILTER_OPS)}")
+        name = f"f{i}"
+        if isinstance(value, list):
+            value = [_coerce_filter_value(ref, v) for v in value]
+        else:
+            value = _coerce_filter_value(ref, value)
+        if op == "in":
+            if not isinstance(value, list) or not value:
+                raise CubeQueryError(f"Filter on {ref}: 'in' needs a non-empty list")
+            # Array bind keeps the SQL text identical regardless of list length
+            where.append(f"{expr} = ANY(:{name})")
+            params[name] = value
+        elif op == "between":
+            if not isinstance(value, list) or len(value) != 2:
+                raise CubeQueryError(f"Filter on {ref}: 'between' needs [low, high]")
+            where.append(f"{expr} BETWEEN :{name}_lo AND :{name}_hi")
+            params[f"{name}_lo"], params[f"{name}_hi"] = value
+        else:
+            if value is None or isinstance(value, (list, dict)):
+                raise CubeQueryError(f"Filter on {ref}: '{op}' needs a scalar value")
+            sql_op = {"eq": "=", "ne": "<>", "gte": ">=", "lte": "<="}[op]
+            where.append(f"{expr} {sql_op} :{name}")
+            params[name] = value
+
+    select_parts = [f"{level_exprs[ref]} AS {_quote_label(ref)}" for ref in levels]
+    select_parts += [f"{measure_exprs[m]} AS {_quote_label(m)}" for m in measures]
+
+    group_by = ""
+    if levels:
+        level_list = ", ".join(level_exprs[ref] for ref in levels)
+        if grouping == "rollup":
+            group_by = f"GROUP BY ROLLUP({level_list})"
+        elif grouping == "cube":
+            group_by = f"GROUP BY CUBE({level_list})"
+        elif grouping == "grouping_sets":
+            if not grouping_sets:
+                raise CubeQueryError("grouping_sets is required for grouping='grouping_sets'")
+            sets = []
+            for level_set in grouping_sets:
+                missing = [ref for ref in level_set if ref not in level_exprs]
+                if missing:
+                    raise CubeQueryError(f"Grouping set levels {missing} are not in levels")
+                sets.append("(" + ", ".join(level_exprs[ref] for ref in level_set) + ")")
+            ungrouped = [ref for ref in levels if not any(ref in level_set for level_set in grouping_sets)]
+            if ungrouped:
+                raise CubeQueryError(f"Levels {ungrouped} are not in any grouping set")
+            group_by = f"GROUP BY GROUPING SETS ({', '.join(sets)})"
+        else:
+            group_by = f"GROUP BY {level_list}"
+        if grouping:
+            # Bitmask telling subtotal rows (level rolled up) apart from NULL values
+            select_parts.append(f'GROUPING({level_list}) AS "_grouping"')
+
+    order_parts = []
+    for item in order_by or []:
+        descending = item.startswith("-")
+        ref = item.lstrip("-")
+        if ref in level_exprs or ref in measures:
+            order_parts.append(f"{_quote_label(ref)} {'DESC' if descending else 'ASC'} NULLS LAST")
+        else:
+            raise CubeQueryError(f"order_by '{ref}' must be a requested level or measure")
+    if not order_parts:
+        order_parts = [f"{_quote_label(ref)} NULLS LAST" for ref in levels]
+
+    from_parts = [f"{FACT_TABLE} {FACT_ALIAS}" if aggregate is None else f"{aggregate.name} agg"]
+    # Only dimensions referenced by a level or filter are joined
+    for dimension_name in DIMENSIONS:
+        if dimension_name in joins:
+            dimension = DIMENSIONS[dimension_name]
+            from_parts.append(f"JOIN {dimension['table']} {dimension['alias']} ON {dimension['join']}")
+
+    sql = "SELECT " + ", ".join(select_parts) + "\nFROM " + "\n".join(from_parts)
+    if where:
+        sql += "\nWHERE " + "\n  AND ".join(where)
+    if group_by:
+        sql += "\n" + group_by
+    if order_parts:
+        sql += "\nORDER BY " + ", ".join(order_parts)
+    if limit is not None:
+        if limit < 1:
+            raise CubeQueryError("limit must be positive")
+        sql += "\nLIMIT :_limit"
+        params["_limit"] = min(limit, CUBE_MAX_LIMIT)
+
+    columns = list(levels) + list(measures) + (["_grouping"] if grouping and levels else [])
+    revenue_keys = ("revenue",) if "revenue" in measures else ()
+    return CompiledCubeQuery(text(sql), params, columns, revenue_keys)
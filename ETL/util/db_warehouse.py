@@ -10,6 +10,9 @@ from models.Dim_Products import Dim_Products
 from models.Dim_Users import Dim_Users
 from models.Dim_Date import Dim_Date
 from models.Fact_Order_Items import Fact_Order_Items
+from models.Etl_Batches import Etl_Batch
+from models.Slow_Query_Log import Slow_Query_Log
+from models.Api_Request_Log import Api_Request_Log
 
 load_dotenv()
 
@@ -29,5 +32,18 @@ db_warehouse_engine = create_engine(
 )
 Session_db_warehouse = sessionmaker(bind=db_warehouse_engine)
 
+# The API's background writers (util/slow_query_log.py, util/request_log.py) get
+# their own tiny pool: a sampled EXPLAIN ANALYZE can hold a connection for up to
+# SLOW_QUERY_EXPLAIN_TIMEOUT_MS, which must not come out of the sync-mode API's pool.
+# Engines connect lazily, so processes that never log open nothing.
+db_warehouse_log_engine = create_engine(
+    database_warehouse_url,
+    echo=False,
+    pool_size=1,               # One writer task each for slow queries and request counts
+    max_overflow=1,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+)
+
 # Don't create tables here - let Alembic migrations handle it
 # Base.metadata.create_all(db_warehouse_engine)
@@ -0,0 +1,32 @@
+from dotenv import load_dotenv
+import os
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+load_dotenv()
+
+# Async Data Warehouse (API only - the ETL keeps using the sync engine for COPY)
+database_warehouse_url = os.getenv("DATABASE_WAREHOUSE_URL")
+if not database_warehouse_url:
+    raise ValueError("DATABASE_WAREHOUSE_URL environment variable not set")
+
+# Same database, asyncpg driver (postgresql:// or postgresql+psycopg2:// -> postgresql+asyncpg://)
+async_database_warehouse_url = make_url(database_warehouse_url).set(
+    drivername="postgresql+asyncpg"
+)
+
+db_warehouse_async_engine = create_async_engine(
+    async_database_warehouse_url,
+    echo=False,
+    # Coroutines don't pin a thread per request, so the pool (not the threadpool)
+    # is the concurrency limit. Size it to what PostgreSQL can run in parallel and
+    # fail fast instead of letting requests pile up behind a checkout.
+    pool_size=int(os.getenv("ASYNC_POOL_SIZE") or 20),
+    max_overflow=int(os.getenv("ASYNC_MAX_OVERFLOW") or 10),
+    pool_timeout=float(os.getenv("ASYNC_POOL_TIMEOUT") or 10),
+    pool_pre_ping=True,
+    pool_recycle=3600,
+)
+Session_db_warehouse_async = async_sessionmaker(
+    bind=db_warehouse_async_engine, expire_on_commit=False
+)
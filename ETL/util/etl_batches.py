@@ -0,0 +1,40 @@
+from sqlalchemy import text
+from models.Fact_Order_Items import Fact_Order_Items
+from models.Etl_Batches import Etl_Batch
+
+# etl_batches bookkeeping shared by the loaders (app.py, etl_service.py) and the
+# aggregate refresh. Warehouse-only, so importing it never touches the source database.
+
+
+def get_warehouse_watermark(conn):
+    """
+    Highest source Orders.id already in the warehouse.
+
+    Uses the last successful batch, or the fact table itself after a full reload
+    (Order_Item_ID = Order_ID * 1000000 + Product_ID, and MAX() is a PK lookup).
+    """
+    return conn.execute(text(f"""
+        SELECT GREATEST(
+            COALESCE((SELECT MAX("Last_Order_ID") FROM {Etl_Batch.__tablename__} WHERE "Status" = 'success'), 0),
+            COALESCE((SELECT MAX("Order_Item_ID") / 1000000 FROM {Fact_Order_Items.__tablename__}), 0)
+        )
+    """)).scalar()
+
+
+def record_batch(conn, mode, started_at, last_order_id, rows_loaded, duration_ms, status="success"):
+    """Append a row to etl_batches (call inside the loading transaction)."""
+    conn.execute(
+        text(f"""
+            INSERT INTO {Etl_Batch.__tablename__}
+                ("Mode", "Status", "Started_At", "Finished_At", "Last_Order_ID", "Rows_Loaded", "Duration_Ms")
+            VALUES (:mode, :status, :started_at, NOW(), :last_order_id, :rows_loaded, :duration_ms)
+        """),
+        {
+            "mode": mode,
+            "status": status,
+            "started_at": started_at,
+            "last_order_id": last_order_id,
+            "rows_loaded": rows_loaded,
+            "duration_ms": duration_ms,
+        },
+    )
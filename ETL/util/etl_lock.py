@@ -0,0 +1,50 @@
+from sqlalchemy import text
+from util.db_warehouse import db_warehouse_engine
+from util.logging_config import get_logger
+import os
+
+# Shared by app.py (full reload) and etl_service.py (micro-batches) so only one
+# loader writes to the warehouse at a time.
+ETL_LOCK_KEY = int(os.getenv("ETL_LOCK_KEY") or 70412025)
+
+logger = get_logger(__name__)
+
+
+def try_acquire_etl_lock():
+    """
+    Try to take the session-level advisory lock without blocking.
+
+    Returns:
+        Connection | None: The connection holding the lock (keep it open for as
+        long as the lock is needed), or None if another loader holds it.
+    """
+    conn = db_warehouse_engine.connect()
+    try:
+        acquired = conn.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": ETL_LOCK_KEY}
+        ).scalar()
+        # Session-level lock survives the commit; don't sit idle in transaction
+        conn.commit()
+    except Exception:
+        conn.close()
+        raise
+
+    if not acquired:
+        conn.close()
+        return None
+    return conn
+
+
+def release_etl_lock(conn):
+    """Release the advisory lock and return the connection to the pool."""
+    try:
+        conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ETL_LOCK_KEY})
+        conn.commit()
+    except Exception as e:
+        # close() would hand the session, lock included, back to the pool;
+        # invalidating ends the session so PostgreSQL drops the lock
+        logger.warning(f"Could not release ETL advisory lock cleanly, discarding its connection: {e}")
+        conn.invalidate()
+    finally:
+        conn.close()
+
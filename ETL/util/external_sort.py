@@ -0,0 +1,153 @@
+import heapq
+import io
+import mmap
+import os
+import struct
+import tempfile
+from util.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Spilled record layout: two signed 64-bit sort keys + payload length, then payload
+_RECORD_HEADER = struct.Struct("<qqI")
+# Rough per-record Python overhead (tuple + key tuple + bytes object headers)
+_RECORD_OVERHEAD = 120
+
+
+class _SpilledRun:
+    """A sorted run written to a temp file and read back through mmap."""
+
+    def __init__(self, records, spill_dir=None):
+        self._file = tempfile.TemporaryFile(prefix="sortrun_", dir=spill_dir)
+        for (k1, k2), payload in records:
+            self._file.write(_RECORD_HEADER.pack(k1, k2, len(payload)))
+            self._file.write(payload)
+        self._file.flush()
+        self.size = self._file.tell()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+    def __iter__(self):
+        if self._map is None:
+            return
+        view = self._map
+        offset = 0
+        header_size = _RECORD_HEADER.size
+        while offset < self.size:
+            k1, k2, length = _RECORD_HEADER.unpack_from(view, offset)
+            offset += header_size
+            yield (k1, k2), view[offset:offset + length]
+            offset += length
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+class ExternalSorter:
+    """
+    Sort (key, payload) records under a memory budget.
+
+    Keys are pairs of integers (e.g. Delivery_Date_ID, Product_ID); payloads are
+    bytes (e.g. an encoded CSV line). Records are buffered in memory; when the
+    buffer exceeds the budget it is sorted and spilled as a run to a temp file.
+    sorted_payloads() then k-way merges the mmap'ed runs with the in-memory tail.
+
+    Usage:
+        with ExternalSorter(memory_budget_bytes=256 * 1024 * 1024) as sorter:
+            for record in records:
+                sorter.add((date_id, product_id), line)
+            for payload in sorter.sorted_payloads():
+                ...
+    """
+
+    def __init__(self, memory_budget_bytes, spill_dir=None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.spill_dir = spill_dir
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._runs = []
+        self.total_records = 0
+
+    def add(self, key, payload):
+        self._buffer.append((key, payload))
+        self._buffer_bytes += len(payload) + _RECORD_OVERHEAD
+        self.total_records += 1
+        if self._buffer_bytes >= self.memory_budget_bytes:
+            self._spill()
+
+    def _spill(self):
+        self._buffer.sort(key=_sort_key)
+        run = _SpilledRun(self._buffer, self.spill_dir)
+        self._runs.append(run)
+        logger.info(
+            f"  Spilled sorted run {len(self._runs)}: {len(self._buffer)} records "
+            f"({run.size / 1024 / 1024:.1f} MB)"
+        )
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    @property
+    def spilled_runs(self):
+        return len(self._runs)
+
+    def sorted_payloads(self):
+        """Yield payloads in key order (stable within equal keys per run)."""
+        self._buffer.sort(key=_sort_key)
+        if not self._runs:
+            for _, payload in self._buffer:
+                yield payload
+            return
+
+        sources = [iter(run) for run in self._runs] + [iter(self._buffer)]
+        for _, payload in heapq.merge(*sources, key=_sort_key):
+            yield payload
+
+    def close(self):
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        self._buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _sort_key(record):
+    return record[0]
+
+
+class IterStream(io.RawIOBase):
+    """Read-only file object over an iterator of bytes chunks (for COPY FROM STDIN)."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            try:
+                self._pending = bytes(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def sorted_stream(chunks, buffer_size=1024 * 1024):
+    """Wrap an iterator of bytes in a buffered reader suitable for copy_expert()."""
+    return io.BufferedReader(IterStream(chunks), buffer_size=buffer_size)
+
+
+def default_spill_dir():
+    """Spill directory from SORT_SPILL_DIR, falling back to the system temp dir."""
+    return os.getenv("SORT_SPILL_DIR") or None
@@ -0,0 +1,166 @@
+from starlette.datastructures import Headers, MutableHeaders
+from util.warehouse_version import warehouse_version
+from util.revenue import REVENUE_STORAGE
+from util.json_response import JSON_DECIMAL_MODE
+from util.logging_config import get_logger
+import hashlib
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES") or 1024)
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL") or 6)
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY") or 5)
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+
+# Responses that change without a new data version (live status) get no ETag
+ETAG_EXCLUDED_PATHS = ("/api/aggregates", "/api/admission")
+
+logger = get_logger(__name__)
+
+
+def choose_encoding(accept_encoding):
+    """Preferred content coding the client accepts: 'br', 'gzip' or None."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def make_etag(version, scope, headers, encoding):
+    """
+    Strong validator for one representation of a GET response.
+
+    Derived from the warehouse data version, the path and query string, the
+    Accept header (response format negotiation), the server's output settings
+    and the content coding, so any of those changing changes the tag.
+    """
+    query = "&".join(sorted(scope.get("query_string", b"").decode("latin-1").split("&")))
+    material = "|".join((
+        str(version), scope["path"], query, headers.get("accept", ""),
+        REVENUE_STORAGE, JSON_DECIMAL_MODE, encoding or "identity",
+    ))
+    return '"' + hashlib.sha256(material.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison is what If-None-Match specifies
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL)
+
+
+class ConditionalCompressionMiddleware:
+    """
+    ETag / If-None-Match handling and gzip/brotli compression for GET /api/*.
+
+    A matching If-None-Match is answered with 304 before the route runs, so
+    polling clients cost one comparison (the data version itself is re-read
+    from etl_batches at most once per WAREHOUSE_VERSION_TTL_S). Fully buffered
+    bodies above COMPRESS_MIN_BYTES are compressed; streamed responses
+    (NDJSON) are passed through so rows still go out as they are read.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not HTTP_CACHE_ENABLED
+            or scope["type"] != "http"
+            or scope["method"] not in ("GET", "HEAD")
+            or not scope["path"].startswith("/api/")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        encoding = choose_encoding(headers.get("accept-encoding", ""))
+
+        etag = None
+        if scope["path"] not in ETAG_EXCLUDED_PATHS:
+            try:
+                etag = make_etag(await warehouse_version.current(), scope, headers, encoding)
+            except Exception as e:
+                # No version, no validator; the route reports the DB problem itself
+                logger.debug(f"Skipping ETag, data version unavailable: {e}")
+
+        if etag and etag_matches(headers.get("if-none-match"), etag):
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [
+                    (b"etag", etag.encode()),
+                    (b"cache-control", b"no-cache"),
+                    (b"vary", b"Accept, Accept-Encoding"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        start_message = None
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            response_headers = MutableHeaders(scope=start_message)
+            if start_message["status"] == 200:
+                if etag:
+                    response_headers["ETag"] = etag
+                if "cache-control" not in response_headers:
+                    # Cacheable, but revalidate every time (cheap thanks to the ETag)
+                    response_headers["Cache-Control"] = "no-cache"
+                response_headers.add_vary_header("Accept-Encoding")
+
+            body = message.get("body", b"")
+            streaming = message.get("more_body", False)
+            if (
+                not streaming
+                and encoding
+                and start_message["status"] == 200
+                and len(body) >= self.minimum_size
+                and "content-encoding" not in response_headers
+            ):
+                body = compress(body, encoding)
+                response_headers["Content-Encoding"] = encoding
+                response_headers["Content-Length"] = str(len(body))
+                message = {**message, "body": body}
+
+            await send(start_message)
+            start_message = None
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,67 @@
+from fastapi.responses import JSONResponse
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+from util.metrics import phase
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# How NUMERIC values (e.g. SUM("Total_Revenue")) appear in JSON:
+#   "number" -> bare JSON number (exact digits with orjson, float with the stdlib fallback)
+#   "string" -> quoted decimal string, exact for clients that parse numbers as doubles
+JSON_DECIMAL_MODE = os.getenv("JSON_DECIMAL_MODE", "number").lower()
+
+if JSON_DECIMAL_MODE not in ("number", "string"):
+    raise ValueError(f"JSON_DECIMAL_MODE must be 'number' or 'string', got '{JSON_DECIMAL_MODE}'")
+
+# orjson.Fragment (3.10+) writes pre-encoded JSON verbatim, so Decimals keep every digit
+_FRAGMENT = getattr(orjson, "Fragment", None)
+
+
+def _encode_decimal(value):
+    if JSON_DECIMAL_MODE == "string":
+        return str(value)
+    if _FRAGMENT is not None and value.is_finite():
+        return _FRAGMENT(str(value))
+    return float(value)
+
+
+def _default(value):
+    """Types neither serializer handles natively."""
+    if isinstance(value, Decimal):
+        return _encode_decimal(value)
+    # SQLAlchemy Row -> JSON object keyed by column label
+    if hasattr(value, "_mapping"):
+        return value._asdict()
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    """Serialize to JSON bytes with orjson when installed, else the stdlib encoder."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse that skips jsonable_encoder's per-value walk.
+
+    Decimal, date and Row values are handled by the serializer's default hook,
+    so endpoints can hand over query results as they come from the driver.
+    """
+
+    def render(self, content):
+        with phase("serialize"):
+            return dumps(content)
@@ -0,0 +1,269 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import deque
+from starlette.datastructures import MutableHeaders
+from util.logging_config import get_logger
+import time
+import uuid
+import os
+
+logger = get_logger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("true", "1", "yes")
+# Finished request traces kept in memory for /metrics/traces
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE") or 200)
+# SQL text is cut to this many characters in trace spans
+TRACE_SQL_MAX_CHARS = int(os.getenv("TRACE_SQL_MAX_CHARS") or 500)
+
+# Seconds; fine resolution at the low end where cached and summary-backed requests land
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Where request time goes, in the order a query goes through them:
+#   queue_wait -> waiting for an admission slot (util/admission.py)
+#   pool_wait  -> connection checkout (includes the pre-ping round trip)
+#   db_execute -> statement execution until the driver has the result
+#   fetch      -> pulling rows into Python (server-side cursor batches when streaming)
+#   compute    -> in-process evaluation by the columnar engine (instead of the three above)
+#   serialize  -> rendering the response body
+PHASES = ("queue_wait", "pool_wait", "db_execute", "fetch", "compute", "serialize")
+
+# Trace of the request being handled (set by MetricsMiddleware)
+current_trace = ContextVar("current_trace", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in Prometheus text format."""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, label_values, value):
+        series = self._series.get(label_values)
+        if series is None:
+            # [per-bucket counts..., +Inf count, sum]
+            series = [0] * (len(self.buckets) + 1) + [0.0]
+            self._series[label_values] = series
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[index] += 1
+                break
+        else:
+            series[len(self.buckets)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                labels = _labels(self.label_names + ("le",), label_values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "api_request_duration_seconds", "End-to-end request latency", ("route", "method")
+)
+PHASE_LATENCY = Histogram(
+    "api_request_phase_duration_seconds", "Time per request spent in each phase", ("route", "phase")
+)
+_request_counts = {}
+
+# Callables returning [(name, type, help, [(labels dict, value), ...])]; modules
+# owning live state (pools, cache, admission) register one at import time
+_collectors = []
+
+
+def register_collector(collector):
+    _collectors.append(collector)
+    return collector
+
+
+# Callables(scope, status, duration_ms) told about every finished /api/* request
+_request_listeners = []
+
+
+def register_request_listener(listener):
+    _request_listeners.append(listener)
+    return listener
+
+
+class RequestTrace:
+    """Spans (with their SQL) and per-phase time totals for one request."""
+
+    __slots__ = ("trace_id", "method", "path", "start", "spans", "phases", "annotations")
+
+    def __init__(self, trace_id, method, path):
+        self.trace_id = trace_id
+        self.method = method
+        self.path = path
+        self.start = time.perf_counter()
+        self.spans = []
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.annotations = {}
+
+    def record(self, name, started, duration, sql=None):
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+        span = {
+            "name": name,
+            "start_ms": round((started - self.start) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+        }
+        if sql is not None:
+            span["sql"] = " ".join(str(sql).split())[:TRACE_SQL_MAX_CHARS]
+        self.spans.append(span)
+
+    def server_timing(self):
+        return ", ".join(
+            f"{name};dur={duration * 1000:.2f}" for name, duration in self.phases.items() if duration
+        )
+
+
+def annotate(key, value):
+    """Attach a key/value (e.g. cache hit) to the current request's trace."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.annotations[key] = value
+
+
+@contextmanager
+def phase(name, sql=None):
+    """Time the enclosed block as `name` on the current request's trace (no-op outside one)."""
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(name, started, time.perf_counter() - started, sql)
+
+
+def record_phase(name, started, sql=None):
+    """Like phase() for code that can't be wrapped in a with block."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.record(name, started, time.perf_counter() - started, sql)
+
+
+_recent_traces = deque(maxlen=TRACE_BUFFER_SIZE)
+
+
+def recent_traces(min_ms=0.0, route=None):
+    """Finished traces, newest first."""
+    return [
+        trace for trace in reversed(_recent_traces)
+        if trace["duration_ms"] >= min_ms and (route is None or trace["route"] == route)
+    ]
+
+
+class MetricsMiddleware:
+    """
+    Per-request latency histograms and span traces for /api/*.
+
+    Every request gets an X-Trace-Id (the caller's X-Request-ID when sent) and
+    a Server-Timing header with its phase totals. The cost is a few
+    perf_counter() calls and list appends per query, cheap enough to leave on.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not METRICS_ENABLED or scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        trace = RequestTrace(request_id or uuid.uuid4().hex, scope["method"], scope["path"])
+        token = current_trace.set(trace)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["X-Trace-Id"] = trace.trace_id
+                timing = trace.server_timing()
+                if timing:
+                    headers["Server-Timing"] = timing
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_trace.reset(token)
+            self._finish(scope, trace, status)
+
+    @staticmethod
+    def _finish(scope, trace, status):
+        duration = time.perf_counter() - trace.start
+        # Route template, not the raw path, so /api/slice/{city} stays one series
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        REQUEST_LATENCY.observe((route, trace.method), duration)
+        for name, seconds in trace.phases.items():
+            PHASE_LATENCY.observe((route, name), seconds)
+        counter_key = (route, trace.method, str(status))
+        _request_counts[counter_key] = _request_counts.get(counter_key, 0) + 1
+        for listener in _request_listeners:
+            try:
+                listener(scope, status, duration * 1000)
+            except Exception as e:
+                logger.debug(f"Request listener {listener.__name__} failed: {e}")
+        _recent_traces.append({
+            "trace_id": trace.trace_id,
+            "method": trace.method,
+            "path": trace.path,
+            "route": route,
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in trace.phases.items()},
+            **trace.annotations,
+            "spans": trace.spans,
+        })
+
+
+def render_metrics():
+    """All metrics in Prometheus text exposition format."""
+    lines = REQUEST_LATENCY.render() + PHASE_LATENCY.render()
+    lines += ["# HELP api_requests_total Requests served", "# TYPE api_requests_total counter"]
+    for (route, method, status), count in sorted(_request_counts.items()):
+        lines.append(f"api_requests_total{_labels(('route', 'method', 'status'), (route, method, status))} {count}")
+
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            logger.warning(f"Metrics collector {collector.__name__} failed: {e}")
+            continue
+        for name, metric_type, help_text, samples in families:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,278 @@
+from sqlalchemy import text
+from util.revenue import revenue_sum, REVENUE_STORAGE
+
+# The SQL served by api.py. Kept here so the API and the
+# benchmark scripts run exactly the same SQL text.
+
+
+def rollup_sql(storage=None):
+    """Revenue rolled up over Year > Quarter > Month."""
+    return text(f"""
+        SELECT dd."Year", dd."Quarter", dd."Month", {revenue_sum("foi", storage)} as revenue
+        FROM fact_order_items foi
+        JOIN dim_date dd on dd."Date_ID" = foi."Delivery_Date_ID"
+        GROUP BY ROLLUP(dd."Year", dd."Quarter", dd."Month")
+        ORDER BY dd."Year" NULLS LAST, dd."Quarter" NULLS LAST, dd."Month" NULLS LAST
+    """)
+
+
+def drilldown_sql(storage=None):
+    """Revenue per delivery rider, highest first."""
+    return text(f"""
+        SELECT
+            dr."Courier_Name",
+            dr."Vehicle_Type",
+            dr."First_Name",
+            dr."Last_Name",
+            agg.total_revenue
+        FROM (
+            SELECT
+                "Delivery_Rider_ID",
+                {revenue_sum(None, storage)} as total_revenue
+            FROM fact_order_items
+            GROUP BY "Delivery_Rider_ID"
+        ) agg
+        JOIN dim_riders dr ON dr."Rider_ID" = agg."Delivery_Rider_ID"
+        ORDER BY agg.total_revenue DESC
+    """)
+
+
+def slice_sql(storage=None):
+    """Revenue per product for a single city (:city)."""
+    return text(f"""
+        SELECT du."City", dp."Name", {revenue_sum("foi", storage)} as total_revenue
+        FROM fact_order_items foi
+        JOIN dim_users du ON du."Users_ID" = foi."User_ID"
+        JOIN dim_products dp ON foi."Product_ID" = dp."Product_ID"
+        WHERE du."City" = :city
+        GROUP BY du."City", dp."Product_ID", dp."Name"
+        ORDER BY total_revenue DESC
+    """)
+
+
+def dice_sql(storage=None):
+    """Revenue for two cities x two categories in 2025 Q2."""
+    return text(f"""
+        SELECT du."City", dp."Category", dd."Year", dd."Quarter", {revenue_sum("foi", storage)} AS total_revenue
+        FROM fact_order_items foi
+        JOIN dim_users du ON du."Users_ID" = foi."User_ID"
+        JOIN dim_products dp ON dp."Product_ID" = foi."Product_ID"
+        JOIN dim_date dd ON dd."Date_ID" = foi."Delivery_Date_ID"
+        WHERE du."City" IN (:city1, :city2)
+          AND dp."Category" IN (:category1, :category2)
+          AND dd."Year" = 2025
+          AND dd."Quarter" = 2
+        GROUP BY du."City", dp."Category", dd."Year", dd."Quarter"
+        ORDER BY total_revenue DESC
+    """)
+
+
+# Same four queries served from the materialized aggregates (migration 8a41c7d2e9f5).
+# Output columns match the raw queries so the endpoints can switch transparently.
+
+
+def _aggregate_revenue(storage=None, summed=False):
+    storage = storage or REVENUE_STORAGE
+    column = "total_revenue_cents" if storage == "cents" else "total_revenue"
+    if not summed:
+        return column
+    return f"SUM({column})::bigint" if storage == "cents" else f"SUM({column})"
+
+
+def rollup_aggregate_sql(storage=None):
+    """Rollup over agg_revenue_by_month (a few rows per year)."""
+    return text(f"""
+        SELECT "Year", "Quarter", "Month", {_aggregate_revenue(storage, summed=True)} as revenue
+        FROM agg_revenue_by_month
+        GROUP BY ROLLUP("Year", "Quarter", "Month")
+        ORDER BY "Year" NULLS LAST, "Quarter" NULLS LAST, "Month" NULLS LAST
+    """)
+
+
+def drilldown_aggregate_sql(storage=None):
+    """Rider revenue from agg_revenue_by_rider."""
+    return text(f"""
+        SELECT "Courier_Name", "Vehicle_Type", "First_Name", "Last_Name",
+               {_aggregate_revenue(storage)} as total_revenue
+        FROM agg_revenue_by_rider
+        ORDER BY total_revenue DESC
+    """)
+
+
+def slice_aggregate_sql(storage=None):
+    """City slice as an index range scan on agg_revenue_by_city_product."""
+    return text(f"""
+        SELECT "City", "Name", {_aggregate_revenue(storage)} as total_revenue
+        FROM agg_revenue_by_city_product
+        WHERE "City" = :city
+        ORDER BY total_revenue DESC
+    """)
+
+
+def dice_aggregate_sql(storage=None):
+    """Dice as a lookup on agg_revenue_by_city_category_quarter."""
+    return text(f"""
+        SELECT "City", "Category", "Year", "Quarter", {_aggregate_revenue(storage)} AS total_revenue
+        FROM agg_revenue_by_city_category_quarter
+        WHERE "Year" = 2025
+          AND "Quarter" = 2
+          AND "City" IN (:city1, :city2)
+          AND "Category" IN (:category1, :category2)
+        ORDER BY total_revenue DESC
+    """)
+
+
+# Keyset-paginated drillDown/slice (util/pagination.py). Same rows as above plus
+# the id that makes (total_revenue, id) unique; pages are ordered by both DESC.
+
+DRILLDOWN_KEYS = ("total_revenue", "Rider_ID")
+SLICE_KEYS = ("total_revenue", "Product_ID")
+
+
+def drilldown_keyset_select(storage=None):
+    return f"""
+        SELECT dr."Rider_ID", dr."Courier_Name", dr."Vehicle_Type", dr."First_Name", dr."Last_Name",
+               agg.total_revenue
+        FROM (
+            SELECT "Delivery_Rider_ID", {revenue_sum(None, storage)} as total_revenue
+            FROM fact_order_items
+            GROUP BY "Delivery_Rider_ID"
+        ) agg
+        JOIN dim_riders dr ON dr."Rider_ID" = agg."Delivery_Rider_ID"
+    """
+
+
+def drilldown_aggregate_keyset_select(storage=None):
+    return f"""
+        SELECT "Rider_ID", "Courier_Name", "Vehicle_Type", "First_Name", "Last_Name",
+               {_aggregate_revenue(storage)} as total_revenue
+        FROM agg_revenue_by_rider
+    """
+
+
+def slice_keyset_select(storage=None):
+    return f"""
+        SELECT du."City", dp."Product_ID", dp."Name", {revenue_sum("foi", storage)} as total_revenue
+        FROM fact_order_items foi
+        JOIN dim_users du ON du."Users_ID" = foi."User_ID"
+        JOIN dim_products dp ON foi."Product_ID" = dp."Product_ID"
+        WHERE du."City" = :city
+        GROUP BY du."City", dp."Product_ID", dp."Name"
+    """
+
+
+def slice_aggregate_keyset_select(storage=None):
+    return f"""
+        SELECT "City", "Product_ID", "Name", {_aggregate_revenue(storage)} as total_revenue
+        FROM agg_revenue_by_city_product
+        WHERE "City" = :city
+    """
+
+
+# Slice from the per-city product ranking (migration 4c9e2f7b1a63). Rows carry
+# their position in SLICE_KEYS order, so the full list, a top-N and every later
+# page are one range on ("City", "Rank") with no sort.
+
+SLICE_RANKING_VIEW = "agg_product_rank_by_city"
+
+
+def slice_ranking_sql(storage=None):
+    """Same rows as slice_sql(), read in stored rank order."""
+    return text(f"""
+        SELECT "City", "Name", {_aggregate_revenue(storage)} as total_revenue
+        FROM {SLICE_RANKING_VIEW}
+        WHERE "City" = :city
+        ORDER BY "Rank"
+    """)
+
+
+def slice_ranking_page_sql(after, storage=None):
+    """
+    Keyset page with the same rows and cursor as slice_aggregate_keyset_select().
+
+    The cursor's Product_ID (:after_1) is resolved to its rank through the
+    ("City", "Product_ID") index; the page then continues after that rank.
+    If the product is no longer ranked in that city (the view was refreshed
+    since the cursor was issued), the rank is instead the number of rows at or
+    before the cursor's (total_revenue, Product_ID) in SLICE_KEYS order.
+    """
+    where = ""
+    if after:
+        where = f"""AND "Rank" > COALESCE(
+            (SELECT "Rank" FROM {SLICE_RANKING_VIEW} WHERE "City" = :city AND "Product_ID" = :after_1),
+            (SELECT COUNT(*) FROM {SLICE_RANKING_VIEW}
+             WHERE "City" = :city AND ({_aggregate_revenue(storage)}, "Product_ID") >= (:after_0, :after_1))
+        )"""
+    return text(f"""
+        SELECT "City", "Product_ID", "Name", {_aggregate_revenue(storage)} as total_revenue
+        FROM {SLICE_RANKING_VIEW}
+        WHERE "City" = :city {where}
+        ORDER BY "Rank"
+        LIMIT :limit
+    """)
+
+
+# Generalized dice (/api/dice?city=..&category=..&date_from=..&date_to=..). Values are
+# bound as arrays so the text doesn't depend on how many are passed; one variant per
+# combination of filtered dimensions keeps every predicate sargable.
+
+DICE_RANGE_PARAM_TYPES = {"date_from": "date", "date_to": "date", "cities": "text[]", "categories": "text[]"}
+DICE_QUARTER_PARAM_TYPES = {
+    "year_from": "int", "quarter_from": "int", "year_to": "int", "quarter_to": "int",
+    "cities": "text[]", "categories": "text[]",
+}
+
+
+def dice_range_sql(storage=None, by_city=True, by_category=True):
+    """Revenue per city x category x quarter over a delivery date range."""
+    return f"""
+        SELECT du."City", dp."Category", dd."Year", dd."Quarter", {revenue_sum("foi", storage)} AS total_revenue
+        FROM fact_order_items foi
+        JOIN dim_users du ON du."Users_ID" = foi."User_ID"
+        JOIN dim_products dp ON dp."Product_ID" = foi."Product_ID"
+        JOIN dim_date dd ON dd."Date_ID" = foi."Delivery_Date_ID"
+        WHERE dd."Date" BETWEEN :date_from AND :date_to
+          {'AND du."City" = ANY(:cities)' if by_city else ''}
+          {'AND dp."Category" = ANY(:categories)' if by_category else ''}
+        GROUP BY du."City", dp."Category", dd."Year", dd."Quarter"
+        ORDER BY total_revenue DESC
+    """
+
+
+def dice_quarter_aggregate_sql(storage=None, by_city=True, by_category=True):
+    """Same dice over whole quarters, read from agg_revenue_by_city_category_quarter."""
+    return f"""
+        SELECT "City", "Category", "Year", "Quarter", {_aggregate_revenue(storage)} AS total_revenue
+        FROM agg_revenue_by_city_category_quarter
+        WHERE ("Year", "Quarter") >= (:year_from, :quarter_from)
+          AND ("Year", "Quarter") <= (:year_to, :quarter_to)
+          {'AND "City" = ANY(:cities)' if by_city else ''}
+          {'AND "Category" = ANY(:categories)' if by_category else ''}
+        ORDER BY total_revenue DESC
+    """
+
+
+# Dimension lookups behind /api/cities (SQL fallback) and /api/categories
+
+def city_search_sql():
+    """Up to 50 cities matching :pattern (ILIKE, case-insensitive)."""
+    return text("""
+        SELECT DISTINCT "City" FROM dim_users
+        WHERE "City" ILIKE :pattern
+        ORDER BY "City"
+        LIMIT 50
+    """)
+
+
+def city_list_sql():
+    """First 500 cities alphabetically."""
+    return text("""
+        SELECT DISTINCT "City" FROM dim_users ORDER BY "City" LIMIT 500
+    """)
+
+
+def categories_sql():
+    """All product categories."""
+    return text("""
+        SELECT DISTINCT "Category" FROM dim_products ORDER BY "Category"
+    """)
@@ -0,0 +1,99 @@
+from fastapi import HTTPException, Query, Request
+from fastapi.responses import Response
+from typing import Literal, Optional
+from util.result_set import ResultSet, ARROW_AVAILABLE
+from util.json_response import FastJSONResponse, dumps
+from util.metrics import phase
+
+# Response formats for OLAP endpoints, chosen with ?format= or the Accept header:
+#   json     -> array of row objects (default, unchanged shape)
+#   columnar -> {"columns": [...], "data": [[...column values...], ...]}
+#   arrow    -> Arrow IPC stream (needs pyarrow)
+#   ndjson   -> one row object per line
+OlapFormat = Literal["json", "columnar", "arrow", "ndjson"]
+
+FORMAT_MEDIA_TYPES = {
+    "json": "application/json",
+    "columnar": "application/vnd.olap.columnar+json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "ndjson": "application/x-ndjson",
+}
+_MEDIA_TYPE_FORMATS = {media_type: fmt for fmt, media_type in FORMAT_MEDIA_TYPES.items()}
+
+# Header carrying the keyset cursor where the body has no room for it (Arrow)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _accept_preferences(accept):
+    """Accept header -> [(q, media_type)], best first (ties keep header order)."""
+    preferences = []
+    for part in accept.split(","):
+        media_type, *options = [piece.strip() for piece in part.split(";")]
+        q = 1.0
+        for option in options:
+            name, _, value = option.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        preferences.append((q, media_type.lower()))
+    return sorted(preferences, key=lambda preference: -preference[0])
+
+
+def negotiate_format(
+    request: Request,
+    format: Optional[OlapFormat] = Query(None, description="Response format (overrides Accept)"),
+) -> str:
+    """FastAPI dependency resolving the response format for an OLAP endpoint."""
+    if format:
+        return format
+    for q, media_type in _accept_preferences(request.headers.get("accept", "")):
+        if q > 0 and media_type in _MEDIA_TYPE_FORMATS:
+            return _MEDIA_TYPE_FORMATS[media_type]
+    return "json"
+
+
+def render_result(body, fmt, headers=None):
+    """
+    Render a cached endpoint body in the negotiated format.
+
+    Args:
+        body: ResultSet, or a keyset page {"data": ResultSet, "next_cursor": str | None}
+        fmt (str): One of FORMAT_MEDIA_TYPES
+        headers (dict): Extra response headers (e.g. X-Served-By)
+
+    Returns:
+        Response
+    """
+    headers = {**(headers or {}), "Vary": "Accept"}
+    page = None
+    result = body
+    if not isinstance(body, ResultSet):
+        page, result = body, body["data"]
+        if page["next_cursor"]:
+            headers[NEXT_CURSOR_HEADER] = page["next_cursor"]
+
+    if fmt == "arrow":
+        if not ARROW_AVAILABLE:
+            raise HTTPException(status_code=406, detail="Arrow output needs pyarrow installed on the server")
+        metadata = {"next_cursor": page["next_cursor"]} if page and page["next_cursor"] else None
+        with phase("serialize"):
+            payload = result.to_arrow_ipc(metadata)
+        return Response(payload, media_type=FORMAT_MEDIA_TYPES["arrow"], headers=headers)
+
+    if fmt == "ndjson":
+        with phase("serialize"):
+            lines = b"".join(dumps(record) + b"\n" for record in result.json_records())
+        return Response(lines, media_type=FORMAT_MEDIA_TYPES["ndjson"], headers=headers)
+
+    if fmt == "columnar":
+        content = result.columnar()
+        if page is not None:
+            content["next_cursor"] = page["next_cursor"]
+        return FastJSONResponse(content, media_type=FORMAT_MEDIA_TYPES["columnar"], headers=headers)
+
+    content = result.json_records()
+    if page is not None:
+        content = {"data": content, "next_cursor": page["next_cursor"]}
+    return FastJSONResponse(content, headers=headers)
@@ -0,0 +1,97 @@
+from sqlalchemy import text
+from decimal import Decimal
+from util.query_executor import fetch_result
+import base64
+import json
+import os
+
+# Upper bound for ?limit= on paginated endpoints
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT") or 1000)
+
+
+class CursorError(ValueError):
+    """Raised for a malformed or mismatched pagination cursor."""
+
+
+def encode_cursor(values):
+    """
+    Opaque cursor for the key values of the last row on a page.
+
+    Decimals are carried as strings so NUMERIC keys round-trip exactly.
+    """
+    payload = [{"d": str(v)} if isinstance(v, Decimal) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, key_count):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        raise CursorError("Invalid cursor")
+    if not isinstance(payload, list) or len(payload) != key_count:
+        raise CursorError("Cursor does not match this endpoint")
+    return [Decimal(v["d"]) if isinstance(v, dict) and "d" in v else v for v in payload]
+
+
+def keyset_page_sql(base_select, keys, after):
+    """
+    Wrap a SELECT in a descending keyset page.
+
+    The wrapper is a plain subquery, so PostgreSQL pulls it up and the key
+    predicate reaches the base table (and any matching index) directly.
+
+    Args:
+        base_select (str): SELECT whose output includes every key column
+        keys (tuple): Output labels that together are unique, most significant first
+        after (bool): Whether to add the row-comparison predicate for :after_<i>
+
+    Returns:
+        TextClause: Query with :limit (and :after_0.. when after is set)
+    """
+    columns = ", ".join(f'q."{key}"' for key in keys)
+    where = ""
+    if after:
+        binds = ", ".join(f":after_{i}" for i in range(len(keys)))
+        where = f"WHERE ({columns}) < ({binds})"
+    order = ", ".join(f'q."{key}" DESC' for key in keys)
+    return text(f"SELECT * FROM ({base_select}) q {where} ORDER BY {order} LIMIT :limit")
+
+
+async def fetch_page(base_select, keys, params, limit, cursor=None):
+    """
+    Fetch one page; reads limit + 1 rows to know whether another page exists.
+
+    Returns:
+        tuple: (column labels, rows, next_cursor or None)
+    """
+    return await fetch_page_with(
+        lambda after: keyset_page_sql(base_select, keys, after), keys, params, limit, cursor
+    )
+
+
+async def fetch_page_with(page_sql, keys, params, limit, cursor=None):
+    """
+    fetch_page() for a query that pages itself.
+
+    Args:
+        page_sql: Function taking after (bool) and returning a statement that
+            binds :limit (and :after_<i> when after is set) and returns rows in
+            the same descending key order as keyset_page_sql()
+
+    Returns:
+        tuple: (column labels, rows, next_cursor or None)
+    """
+    params = dict(params)
+    if cursor:
+        for i, value in enumerate(decode_cursor(cursor, len(keys))):
+            params[f"after_{i}"] = value
+    params["limit"] = limit + 1
+
+    columns, rows = await fetch_result(page_sql(bool(cursor)), params)
+    if len(rows) <= limit:
+        return columns, rows, None
+    rows = rows[:limit]
+    last = rows[-1]._mapping
+    return columns, rows, encode_cursor([last[key] for key in keys])
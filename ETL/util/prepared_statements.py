@@ -0,0 +1,95 @@
+from sqlalchemy import text
+from util.query_executor import fetch_result, API_DB_MODE
+from util.logging_config import get_logger
+import re
+
+logger = get_logger(__name__)
+
+
+class PreparedStatement:
+    """
+    A named query with a fixed SQL text and declared parameter types.
+
+    Array parameters (= ANY(:values)) keep the text identical however many
+    values a request passes, so each connection prepares it once and
+    PostgreSQL can settle on a cached generic plan.
+    """
+
+    def __init__(self, name, sql, param_types):
+        self.name = name
+        self.sql = sql
+        self.param_types = dict(param_types)
+        # One text() object per statement: asyncpg's per-connection statement
+        # cache is keyed on the SQL string, so this is prepared server-side once
+        self.text = text(sql)
+        self.execute_text = text(
+            f"EXECUTE {name}(" + ", ".join(f":{param}" for param in self.param_types) + ")"
+        )
+
+    def prepare_sql(self):
+        """PREPARE statement with :params rewritten to $n positional parameters."""
+        positional = self.sql
+        for index, param in enumerate(self.param_types, start=1):
+            positional = re.sub(rf"(?<![:\w]):{param}\b", f"${index}", positional)
+        types = ", ".join(self.param_types.values())
+        return f"PREPARE {self.name} ({types}) AS {positional}"
+
+
+class PreparedStatementRegistry:
+    """
+    Named statements the API executes as server-side prepared statements.
+
+    async mode: statements run through asyncpg, which prepares each distinct
+    SQL text once per connection (SQLAlchemy's prepared_statement_cache_size).
+    sync mode: psycopg2 never prepares on its own, so the registry issues an
+    explicit PREPARE the first time a pooled connection sees a statement and
+    then runs EXECUTE; the prepared names live in the connection's info dict.
+    """
+
+    def __init__(self):
+        self._statements = {}
+
+    def register(self, name, sql, param_types):
+        existing = self._statements.get(name)
+        if existing is not None:
+            if existing.sql != sql:
+                raise ValueError(f"Prepared statement {name} already registered with different SQL")
+            return existing
+        statement = PreparedStatement(name, sql, param_types)
+        self._statements[name] = statement
+        return statement
+
+    def get(self, name):
+        return self._statements[name]
+
+    def names(self):
+        return list(self._statements)
+
+    @staticmethod
+    def _prepare_on(statement):
+        def setup(conn):
+            prepared = conn.info.setdefault("prepared_statements", set())
+            if statement.name not in prepared:
+                conn.exec_driver_sql(statement.prepare_sql())
+                prepared.add(statement.name)
+                logger.debug(f"Prepared {statement.name} on a new connection")
+
+        return setup
+
+    async def fetch(self, name, params):
+        """
+        Execute a registered statement.
+
+        Returns:
+            tuple: (column labels, rows), like query_executor.fetch_result()
+        """
+        statement = self._statements[name]
+        if API_DB_MODE == "sync":
+            return await fetch_result(
+                statement.execute_text, params,
+                sync_setup=self._prepare_on(statement), logged_sql=statement.text,
+            )
+        return await fetch_result(statement.text, params)
+
+
+prepared_statements = PreparedStatementRegistry()
@@ -0,0 +1,161 @@
+from collections import OrderedDict
+from util.warehouse_version import warehouse_version
+from util.metrics import annotate, register_collector
+from util.logging_config import get_logger
+import asyncio
+import os
+
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES") or 512)
+
+logger = get_logger(__name__)
+
+
+def make_cache_key(endpoint, params=None):
+    """
+    Normalized cache key: endpoint plus sorted parameters.
+
+    String values are stripped; list/tuple/set values are sorted so that
+    e.g. dice(city1=A, city2=B) and dice(city1=B, city2=A) can share an entry
+    when the caller passes them as a set.
+    """
+    normalized = []
+    for name, value in sorted((params or {}).items()):
+        if isinstance(value, str):
+            value = value.strip()
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            value = tuple(sorted(value))
+        normalized.append((name, value))
+    return (endpoint, tuple(normalized))
+
+
+class _Inflight:
+    """A running compute() task and how many requests are waiting on it."""
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class QueryResultCache:
+    """
+    Size-bounded LRU of endpoint results, tagged with the warehouse data version.
+
+    When a request sees a newer data version the whole cache is dropped, so
+    stale results never outlive an ETL commit by more than the version TTL.
+    Concurrent misses for the same key share one database query.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.version = None
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def clear(self):
+        self._entries.clear()
+
+    def _on_version(self, version):
+        if version != self.version:
+            if self.version is not None:
+                self.invalidations += 1
+                logger.info(f"Data version {version}: dropping {len(self._entries)} cached results")
+            self._entries.clear()
+            self.version = version
+
+    async def get_or_compute(self, key, compute):
+        """
+        Return the cached value for key, or await compute() and cache it.
+
+        compute() runs as its own task shared by every request waiting on the
+        key; it is cancelled only when all of them have gone away (e.g. their
+        clients disconnected), so one impatient client can't fail the others.
+
+        Args:
+            key: From make_cache_key()
+            compute: Zero-argument coroutine function producing the value
+
+        Returns:
+            The (shared, do-not-mutate) result
+        """
+        version = await warehouse_version.current()
+        self._on_version(version)
+
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            annotate("cache", "hit")
+            return self._entries[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.hits += 1
+            annotate("cache", "shared")
+        else:
+            self.misses += 1
+            annotate("cache", "miss")
+            inflight = _Inflight(asyncio.create_task(self._compute_and_store(key, version, compute)))
+            self._inflight[key] = inflight
+
+        inflight.waiters += 1
+        try:
+            return await asyncio.shield(inflight.task)
+        except asyncio.CancelledError:
+            if inflight.waiters == 1 and not inflight.task.done():
+                inflight.task.cancel()
+            raise
+        finally:
+            inflight.waiters -= 1
+
+    async def _compute_and_store(self, key, version, compute):
+        try:
+            value = await compute()
+        finally:
+            self._inflight.pop(key, None)
+        # A load may have committed while we were computing; don't cache under the old tag
+        if self.version == version:
+            self._entries[key] = value
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+query_cache = QueryResultCache()
+
+
+@register_collector
+def cache_metrics():
+    stats = query_cache.stats()
+    return [
+        ("query_cache_hits_total", "counter", "Result cache hits (including shared in-flight computes)",
+         [({}, stats["hits"])]),
+        ("query_cache_misses_total", "counter", "Result cache misses", [({}, stats["misses"])]),
+        ("query_cache_hit_ratio", "gauge", "Hits / lookups since start", [({}, stats["hit_ratio"])]),
+        ("query_cache_entries", "gauge", "Cached results", [({}, stats["entries"])]),
+        ("query_cache_evictions_total", "counter", "LRU evictions", [({}, stats["evictions"])]),
+    ]
+
+
+async def cached(endpoint, params, compute):
+    """Serve compute() through the result cache (or directly when it's disabled)."""
+    if not QUERY_CACHE_ENABLED:
+        return await compute()
+    return await query_cache.get_or_compute(make_cache_key(endpoint, params), compute)
@@ -0,0 +1,214 @@
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
+from util.db_warehouse import db_warehouse_engine, db_warehouse_log_engine
+from util.admission import admitted_query, is_statement_timeout
+from util.slow_query_log import slow_query_log
+from util.metrics import phase, record_phase, register_collector
+from util.logging_config import get_logger
+import asyncio
+import time
+import os
+
+# How API endpoints reach the warehouse:
+#   "async" -> asyncpg through SQLAlchemy asyncio (default)
+#   "sync"  -> psycopg2 connections in the threadpool (previous behaviour, for comparison)
+API_DB_MODE = os.getenv("API_DB_MODE", "async").lower()
+
+# Rows per server-side cursor fetch when streaming
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS") or 500)
+
+if API_DB_MODE not in ("async", "sync"):
+    raise ValueError(f"API_DB_MODE must be 'async' or 'sync', got '{API_DB_MODE}'")
+
+if API_DB_MODE == "async":
+    from util.db_warehouse_async import db_warehouse_async_engine
+
+logger = get_logger(__name__)
+
+
+# Transaction-scoped (SET LOCAL) so it is gone when the connection returns to the pool
+_SET_STATEMENT_TIMEOUT = text("SELECT set_config('statement_timeout', :timeout, true)")
+
+
+class _SyncQueryHandle:
+    """Lets the event loop cancel a query running on a worker thread."""
+
+    def __init__(self):
+        self.dbapi_connection = None
+        self.abandoned = False
+
+    def cancel(self):
+        self.abandoned = True
+        if self.dbapi_connection is not None:
+            try:
+                # psycopg2 sends a CancelRequest to the backend; safe from another thread
+                self.dbapi_connection.cancel()
+            except Exception as e:
+                logger.debug(f"Could not cancel query: {e}")
+
+
+def _fetch_result_sync(sql, params, timeout_ms, sync_setup, handle):
+    checkout = time.perf_counter()
+    with db_warehouse_engine.connect() as conn:
+        record_phase("pool_wait", checkout)
+        handle.dbapi_connection = conn.connection.dbapi_connection
+        if handle.abandoned:
+            return [], []
+        if timeout_ms:
+            conn.execute(_SET_STATEMENT_TIMEOUT, {"timeout": str(timeout_ms)})
+        if sync_setup is not None:
+            sync_setup(conn)
+        with phase("db_execute", sql):
+            result = conn.execute(sql, params)
+        with phase("fetch"):
+            return list(result.keys()), result.fetchall()
+
+
+async def fetch_result(sql, params=None, sync_setup=None, logged_sql=None):
+    """
+    Execute a read-only query and return its column labels and rows.
+
+    Runs inside the current endpoint's admission slot and statement_timeout
+    (util/admission.py). If the awaiting request is cancelled (e.g. the client
+    disconnected) the running PostgreSQL query is cancelled too. Slow and
+    timed-out queries are reported to util/slow_query_log.py.
+
+    Args:
+        sql: SQLAlchemy text() or selectable
+        params (dict): Bind parameters
+        sync_setup: Optional callable(conn) run before the query in sync mode
+        logged_sql: Statement to record in the slow query log instead of sql
+            (e.g. the SQL behind an EXECUTE of a prepared statement)
+
+    Returns:
+        tuple: (list[str] column labels, list[Row]); rows are fully buffered
+    """
+    params = params or {}
+    async with admitted_query() as timeout_ms:
+        started = time.perf_counter()
+        try:
+            if API_DB_MODE == "sync":
+                handle = _SyncQueryHandle()
+                try:
+                    result = await run_in_threadpool(_fetch_result_sync, sql, params, timeout_ms, sync_setup, handle)
+                except asyncio.CancelledError:
+                    handle.cancel()
+                    raise
+            else:
+                # asyncpg answers task cancellation by cancelling the query server-side
+                checkout = time.perf_counter()
+                async with db_warehouse_async_engine.connect() as conn:
+                    record_phase("pool_wait", checkout)
+                    if timeout_ms:
+                        await conn.execute(_SET_STATEMENT_TIMEOUT, {"timeout": str(timeout_ms)})
+                    # asyncpg hands back the whole result with the execute, so db_execute
+                    # includes the transfer and fetch only covers building the Row list
+                    with phase("db_execute", sql):
+                        rows = await conn.execute(sql, params)
+                    with phase("fetch"):
+                        result = list(rows.keys()), rows.fetchall()
+        except Exception as e:
+            if is_statement_timeout(e):
+                slow_query_log.note(logged_sql or sql, params, (time.perf_counter() - started) * 1000, timed_out=True)
+            raise
+        slow_query_log.note(logged_sql or sql, params, (time.perf_counter() - started) * 1000)
+        return result
+
+
+async def fetch_all(sql, params=None):
+    """
+    Execute a read-only query and return all rows.
+
+    Args:
+        sql: SQLAlchemy text() or selectable
+        params (dict): Bind parameters
+
+    Returns:
+        list[Row]: Fully buffered rows (safe to use after the connection is released)
+    """
+    _, rows = await fetch_result(sql, params)
+    return rows
+
+
+def _stream_rows_sync(sql, params, batch_size, timeout_ms):
+    checkout = time.perf_counter()
+    with db_warehouse_engine.connect() as conn:
+        record_phase("pool_wait", checkout)
+        if timeout_ms:
+            conn.execute(_SET_STATEMENT_TIMEOUT, {"timeout": str(timeout_ms)})
+        # stream_results -> psycopg2 named (server-side) cursor
+        with phase("db_execute", sql):
+            result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(sql, params)
+        batches = result.partitions(batch_size)
+        while True:
+            with phase("fetch"):
+                batch = next(batches, None)
+            if batch is None:
+                return
+            yield batch
+
+
+async def stream_rows(sql, params=None, batch_size=STREAM_BATCH_ROWS):
+    """
+    Execute a read-only query on a server-side cursor, yielding batches of rows.
+
+    Only one batch is held in API memory at a time; the connection (and the
+    endpoint's admission slot) stay held until the generator is exhausted or
+    closed, which StreamingResponse does when the client goes away.
+
+    Args:
+        sql: SQLAlchemy text() or selectable
+        params (dict): Bind parameters
+        batch_size (int): Rows fetched from the cursor per round trip
+
+    Yields:
+        list[Row]
+    """
+    params = params or {}
+    async with admitted_query() as timeout_ms:
+        if API_DB_MODE == "sync":
+            async for batch in iterate_in_threadpool(_stream_rows_sync(sql, params, batch_size, timeout_ms)):
+                yield batch
+            return
+
+        checkout = time.perf_counter()
+        async with db_warehouse_async_engine.connect() as conn:
+            record_phase("pool_wait", checkout)
+            if timeout_ms:
+                await conn.execute(_SET_STATEMENT_TIMEOUT, {"timeout": str(timeout_ms)})
+            with phase("db_execute", sql):
+                result = await conn.stream(sql, params)
+            batches = result.partitions(batch_size)
+            while True:
+                with phase("fetch"):
+                    batch = await anext(batches, None)
+                if batch is None:
+                    return
+                yield batch
+
+
+@register_collector
+def pool_metrics():
+    """Checkout/overflow gauges for the warehouse connection pools."""
+    pools = {"sync": db_warehouse_engine.pool, "log": db_warehouse_log_engine.pool}
+    if API_DB_MODE == "async":
+        pools["async"] = db_warehouse_async_engine.sync_engine.pool
+    families = {
+        "db_pool_size": ("gauge", "Configured pool size", lambda pool: pool.size()),
+        "db_pool_checked_out": ("gauge", "Connections currently checked out", lambda pool: pool.checkedout()),
+        "db_pool_checked_in": ("gauge", "Idle connections in the pool", lambda pool: pool.checkedin()),
+        # QueuePool counts overflow from -pool_size; only connections beyond pool_size matter here
+        "db_pool_overflow": ("gauge", "Overflow connections open beyond pool_size",
+                             lambda pool: max(pool.overflow(), 0)),
+    }
+    return [
+        (name, metric_type, help_text, [({"engine": engine}, read(pool)) for engine, pool in pools.items()])
+        for name, (metric_type, help_text, read) in families.items()
+    ]
+
+
+async def dispose_engines():
+    """Close pooled connections on API shutdown."""
+    db_warehouse_log_engine.dispose()
+    if API_DB_MODE == "async":
+        await db_warehouse_async_engine.dispose()
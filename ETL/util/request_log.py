@@ -0,0 +1,110 @@
+from sqlalchemy import text
+from datetime import datetime, timezone
+from models.Api_Request_Log import Api_Request_Log
+from util.db_warehouse import db_warehouse_log_engine
+from util.metrics import register_request_listener
+from util.logging_config import get_logger
+import asyncio
+import os
+
+logger = get_logger(__name__)
+
+REQUEST_LOG_ENABLED = os.getenv("REQUEST_LOG_ENABLED", "true").lower() in ("true", "1", "yes")
+# Counts are aggregated in memory and written once per interval
+REQUEST_LOG_FLUSH_S = float(os.getenv("REQUEST_LOG_FLUSH_S") or 60)
+REQUEST_LOG_RETENTION_DAYS = int(os.getenv("REQUEST_LOG_RETENTION_DAYS") or 14)
+# Distinct targets kept per interval; rarer ones are dropped once this is reached
+REQUEST_LOG_MAX_TARGETS = int(os.getenv("REQUEST_LOG_MAX_TARGETS") or 5000)
+
+# Requests sent by the warmup carry this header and are not counted
+WARMUP_HEADER = "X-Warmup"
+
+# Live status endpoints: nothing to warm
+_EXCLUDED_PATHS = ("/api/aggregates", "/api/admission")
+
+_INSERT_SQL = text(f"""
+    INSERT INTO {Api_Request_Log.__tablename__} ("Bucket_Start", "Method", "Target", "Requests", "Total_Ms")
+    VALUES (:bucket_start, :method, :target, :requests, :total_ms)
+""")
+
+_PRUNE_SQL = text(f"""
+    DELETE FROM {Api_Request_Log.__tablename__}
+    WHERE "Bucket_Start" < NOW() - make_interval(days => :days)
+""")
+
+
+class RequestLog:
+    """
+    Per-interval counts of successful GET /api/* requests, flushed to api_request_log.
+
+    The warmup (util/warmup.py) replays the most requested targets from this
+    log after each ETL load and on API startup.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._bucket_start = datetime.now(timezone.utc)
+        self._task = None
+
+    def record(self, scope, status, duration_ms):
+        if scope["method"] != "GET" or status not in (200, 304) or scope["path"] in _EXCLUDED_PATHS:
+            return
+        for name, _ in scope["headers"]:
+            if name == b"x-warmup":
+                return
+        query = scope.get("query_string", b"").decode("latin-1")
+        target = scope["path"] + (f"?{query}" if query else "")
+        entry = self._counts.get(target)
+        if entry is None:
+            if len(self._counts) >= REQUEST_LOG_MAX_TARGETS:
+                return
+            entry = self._counts[target] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += duration_ms
+
+    def start(self):
+        if REQUEST_LOG_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(REQUEST_LOG_FLUSH_S)
+            await self.flush()
+
+    async def flush(self):
+        counts, bucket_start = self._counts, self._bucket_start
+        self._counts, self._bucket_start = {}, datetime.now(timezone.utc)
+        if not counts:
+            return
+        rows = [
+            {"bucket_start": bucket_start, "method": "GET", "target": target,
+             "requests": requests, "total_ms": round(total_ms, 3)}
+            for target, (requests, total_ms) in counts.items()
+        ]
+        try:
+            await asyncio.to_thread(self._write, rows)
+        except Exception as e:
+            logger.warning(f"Could not write {len(rows)} request log rows: {e}")
+
+    @staticmethod
+    def _write(rows):
+        with db_warehouse_log_engine.begin() as conn:
+            conn.execute(_INSERT_SQL, rows)
+            conn.execute(_PRUNE_SQL, {"days": REQUEST_LOG_RETENTION_DAYS})
+
+
+request_log = RequestLog()
+
+if REQUEST_LOG_ENABLED:
+    register_request_listener(request_log.record)
@@ -0,0 +1,96 @@
+from util.revenue import from_cents, REVENUE_STORAGE
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+ARROW_AVAILABLE = pa is not None
+
+
+class ResultSet:
+    """
+    Query result kept as the driver returned it: column labels plus row tuples.
+
+    This is what the endpoints cache. Each response format is rendered from it
+    directly (rows for JSON records, one transpose for columnar/Arrow), so no
+    per-row dict is built unless a client asks for the record format.
+    """
+
+    def __init__(self, columns, rows, revenue_keys=(), storage=None):
+        self.columns = list(columns)
+        self.rows = rows
+        storage = storage or REVENUE_STORAGE
+        # Cents columns are converted to currency units when rendered
+        self.cents_indexes = (
+            [self.columns.index(key) for key in revenue_keys if key in self.columns]
+            if storage == "cents" else []
+        )
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _converted_rows(self):
+        if not self.cents_indexes:
+            return self.rows
+        converted = []
+        for row in self.rows:
+            values = list(row)
+            for index in self.cents_indexes:
+                values[index] = from_cents(values[index])
+            converted.append(values)
+        return converted
+
+    def tuples(self):
+        """Rows as sequences in column order (revenue in currency units)."""
+        return self._converted_rows()
+
+    def json_records(self):
+        """
+        Rows for the JSON record format.
+
+        Driver Rows are passed through untouched (util/json_response.py
+        serializes them directly); dicts are only built when cents need converting
+        or the rows are plain tuples (util/columnar_engine.py).
+        """
+        if not self.cents_indexes and (not self.rows or hasattr(self.rows[0], "_mapping")):
+            return self.rows
+        return self.records()
+
+    def records(self):
+        """Rows as dicts (the original JSON shape of every endpoint)."""
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self._converted_rows()]
+
+    def column_arrays(self):
+        """One list per column, in column order."""
+        if not self.rows:
+            return [[] for _ in self.columns]
+        arrays = [list(values) for values in zip(*self.rows)]
+        for index in self.cents_indexes:
+            arrays[index] = [from_cents(value) for value in arrays[index]]
+        return arrays
+
+    def columnar(self):
+        """Compact column-oriented JSON body: {"columns": [...], "data": [[...], ...]}."""
+        return {"columns": self.columns, "data": self.column_arrays()}
+
+    def to_arrow_ipc(self, metadata=None):
+        """
+        Serialize as an Arrow IPC stream (requires pyarrow).
+
+        Args:
+            metadata (dict): Optional str -> str schema metadata (e.g. next_cursor)
+
+        Returns:
+            bytes
+        """
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed")
+        table = pa.table(dict(zip(self.columns, (pa.array(a) for a in self.column_arrays()))))
+        if metadata:
+            table = table.replace_schema_metadata(metadata)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
@@ -0,0 +1,70 @@
+from decimal import Decimal, ROUND_HALF_UP
+import os
+
+# Which representation the API aggregates over:
+#   "numeric" -> SUM("Total_Revenue")        (NUMERIC(10,2), arbitrary precision)
+#   "cents"   -> SUM("Total_Revenue_Cents")  (BIGINT, integer arithmetic)
+REVENUE_STORAGE = os.getenv("REVENUE_STORAGE", "numeric").lower()
+
+REVENUE_STORAGES = ("numeric", "cents")
+
+if REVENUE_STORAGE not in REVENUE_STORAGES:
+    raise ValueError(
+        f"REVENUE_STORAGE must be one of {REVENUE_STORAGES}, got '{REVENUE_STORAGE}'"
+    )
+
+_CENT = Decimal("0.01")
+
+
+def to_cents(value):
+    """
+    Convert a money value (Decimal, str, int or float) to integer cents.
+    Rounds half-up the same way PostgreSQL rounds NUMERIC(10,2).
+    """
+    if value is None:
+        return None
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return int(value.quantize(_CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+def from_cents(cents):
+    """Convert integer cents back to a JSON-friendly number at the API edge."""
+    if cents is None:
+        return None
+    return cents / 100
+
+
+def revenue_sum(alias="foi", storage=None):
+    """
+    SQL expression summing fact revenue in the chosen representation.
+
+    SUM(bigint) returns NUMERIC in PostgreSQL, so the cents variant is cast back
+    to BIGINT; the aggregation itself runs on an int128 accumulator.
+    """
+    storage = storage or REVENUE_STORAGE
+    prefix = f"{alias}." if alias else ""
+    if storage == "cents":
+        return f'SUM({prefix}"Total_Revenue_Cents")::bigint'
+    return f'SUM({prefix}"Total_Revenue")'
+
+
+def convert_revenue_rows(rows, revenue_keys, storage=None):
+    """
+    Turn result rows into dicts, converting cents columns back to currency units.
+
+    Args:
+        rows: SQLAlchemy Row objects
+        revenue_keys (tuple): Column labels holding aggregated revenue
+        storage (str): Representation used by the query (defaults to REVENUE_STORAGE)
+
+    Returns:
+        list[dict]: One dict per row
+    """
+    storage = storage or REVENUE_STORAGE
+    records = [dict(row._mapping) for row in rows]
+    if storage == "cents":
+        for record in records:
+            for key in revenue_keys:
+                record[key] = from_cents(record[key])
+    return records
@@ -0,0 +1,242 @@
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime, timezone
+from models.Slow_Query_Log import Slow_Query_Log
+from util.db_warehouse import db_warehouse_log_engine
+from util.admission import current_limiter
+from util.metrics import current_trace, register_collector
+from util.json_response import dumps
+from util.logging_config import get_logger
+import asyncio
+import random
+import json
+import time
+import os
+
+logger = get_logger(__name__)
+
+SLOW_QUERY_LOG_ENABLED = os.getenv("SLOW_QUERY_LOG_ENABLED", "true").lower() in ("true", "1", "yes")
+# Queries at or above this many milliseconds (excluding the admission queue) are logged
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS") or 500)
+# Most slow queries written to slow_query_log per minute; the rest are only counted
+SLOW_QUERY_LOG_MAX_PER_MINUTE = int(os.getenv("SLOW_QUERY_LOG_MAX_PER_MINUTE") or 120)
+# EXPLAIN ANALYZE runs the query a second time, so it is sampled, rate limited
+# and done at most once per distinct SQL text within the cooldown
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE") or 0.2)
+SLOW_QUERY_EXPLAIN_PER_MINUTE = int(os.getenv("SLOW_QUERY_EXPLAIN_PER_MINUTE") or 6)
+SLOW_QUERY_EXPLAIN_COOLDOWN_S = float(os.getenv("SLOW_QUERY_EXPLAIN_COOLDOWN_S") or 600)
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS") or 60000)
+# Captures waiting for the background writer; beyond this they are dropped
+SLOW_QUERY_QUEUE_SIZE = int(os.getenv("SLOW_QUERY_QUEUE_SIZE") or 256)
+
+_INSERT_SQL = text(f"""
+    INSERT INTO {Slow_Query_Log.__tablename__}
+        ("Captured_At", "Endpoint", "Trace_ID", "Data_Version", "Duration_Ms", "Timed_Out",
+         "Sql_Text", "Params", "Plan", "Plan_Execution_Ms", "Shared_Hit_Blocks",
+         "Shared_Read_Blocks", "Explain_Error")
+    VALUES (
+        :captured_at, :endpoint, :trace_id,
+        (SELECT MAX("Batch_ID") FROM etl_batches WHERE "Status" = 'success'),
+        :duration_ms, :timed_out, :sql_text, CAST(:params AS jsonb), CAST(:plan AS jsonb),
+        :plan_execution_ms, :shared_hit_blocks, :shared_read_blocks, :explain_error
+    )
+""")
+
+
+class _PerMinute:
+    """Token bucket refilled at `rate` tokens per minute."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+
+    def allow(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / 60)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+def _plan_summary(plan):
+    """(execution ms, shared hit blocks, shared read blocks) from EXPLAIN ... FORMAT JSON output."""
+    top = plan[0]
+    node = top.get("Plan", {})
+    return top.get("Execution Time"), node.get("Shared Hit Blocks"), node.get("Shared Read Blocks")
+
+
+class SlowQueryLog:
+    """
+    Records API queries slower than SLOW_QUERY_MS in the slow_query_log table.
+
+    note() is called on the request path and only queues the capture; a
+    background task writes it (and runs the sampled EXPLAIN) through
+    db_warehouse_log_engine, whose own small pool keeps logging off the
+    connections the API queries use.
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._worker = None
+        self._log_budget = _PerMinute(SLOW_QUERY_LOG_MAX_PER_MINUTE)
+        self._explain_budget = _PerMinute(SLOW_QUERY_EXPLAIN_PER_MINUTE)
+        self._explained_at = {}
+        self.seen = 0
+        self.logged = 0
+        self.explained = 0
+        self.dropped = 0
+        self.failures = 0
+
+    def start(self):
+        if not SLOW_QUERY_LOG_ENABLED or self._worker is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=SLOW_QUERY_QUEUE_SIZE)
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"Slow query log enabled (threshold {SLOW_QUERY_MS:.0f} ms)")
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    def note(self, sql, params, duration_ms, timed_out=False):
+        """
+        Queue a capture if the query was slow.
+
+        Args:
+            sql: The executed statement (text() or anything str() renders)
+            params (dict): Bind parameters it ran with
+            duration_ms (float): Execution time, excluding the admission queue
+            timed_out (bool): Cancelled by statement_timeout
+        """
+        if self._queue is None or (duration_ms < SLOW_QUERY_MS and not timed_out):
+            return
+        self.seen += 1
+        limiter = current_limiter.get()
+        trace = current_trace.get()
+        endpoint = limiter.name if limiter is not None else None
+        sql_text = sql.text if isinstance(sql, TextClause) else str(sql)
+        logger.warning(
+            f"Slow query on {endpoint or 'unknown endpoint'}: {duration_ms:.0f} ms"
+            f"{' (timed out)' if timed_out else ''}: {' '.join(sql_text.split())[:200]}"
+        )
+        if not self._log_budget.allow():
+            self.dropped += 1
+            return
+        capture = {
+            "captured_at": datetime.now(timezone.utc),
+            "endpoint": endpoint,
+            "trace_id": trace.trace_id if trace is not None else None,
+            "duration_ms": round(duration_ms, 3),
+            "timed_out": timed_out,
+            "sql_text": sql_text,
+            "params": params,
+            # Only text() statements can be re-run verbatim under EXPLAIN
+            "explain": isinstance(sql, TextClause) and self._should_explain(sql_text),
+        }
+        try:
+            self._queue.put_nowait(capture)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def _should_explain(self, sql_text):
+        if random.random() >= SLOW_QUERY_EXPLAIN_SAMPLE_RATE:
+            return False
+        now = time.monotonic()
+        last = self._explained_at.get(sql_text)
+        if last is not None and now - last < SLOW_QUERY_EXPLAIN_COOLDOWN_S:
+            return False
+        if not self._explain_budget.allow():
+            return False
+        self._explained_at[sql_text] = now
+        if len(self._explained_at) > 1024:
+            # Forget the oldest half rather than growing without bound
+            for key in sorted(self._explained_at, key=self._explained_at.get)[:512]:
+                del self._explained_at[key]
+        return True
+
+    async def _run(self):
+        while True:
+            capture = await self._queue.get()
+            try:
+                await run_in_threadpool(self._store, capture)
+                self.logged += 1
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"Could not store slow query capture: {e}")
+
+    def _explain(self, conn, capture):
+        """Plan for the capture; the statement runs read-only and is rolled back."""
+        options = "FORMAT JSON" if capture["timed_out"] else "ANALYZE, BUFFERS, FORMAT JSON"
+        transaction = conn.begin()
+        try:
+            conn.execute(text("SET TRANSACTION READ ONLY"))
+            conn.execute(
+                text("SELECT set_config('statement_timeout', :timeout, true)"),
+                {"timeout": str(SLOW_QUERY_EXPLAIN_TIMEOUT_MS)},
+            )
+            return conn.execute(text(f"EXPLAIN ({options}) {capture['sql_text']}"), capture["params"]).scalar()
+        finally:
+            transaction.rollback()
+
+    def _store(self, capture):
+        plan = None
+        summary = (None, None, None)
+        explain_error = None
+        with db_warehouse_log_engine.connect() as conn:
+            if capture["explain"]:
+                try:
+                    plan = self._explain(conn, capture)
+                    summary = _plan_summary(plan)
+                    self.explained += 1
+                except Exception as e:
+                    explain_error = str(e)[:2000]
+            with conn.begin():
+                conn.execute(_INSERT_SQL, {
+                    "captured_at": capture["captured_at"],
+                    "endpoint": capture["endpoint"],
+                    "trace_id": capture["trace_id"],
+                    "duration_ms": capture["duration_ms"],
+                    "timed_out": capture["timed_out"],
+                    "sql_text": capture["sql_text"],
+                    "params": dumps(capture["params"]).decode(),
+                    "plan": json.dumps(plan) if plan is not None else None,
+                    "plan_execution_ms": summary[0],
+                    "shared_hit_blocks": summary[1],
+                    "shared_read_blocks": summary[2],
+                    "explain_error": explain_error,
+                })
+
+    def stats(self):
+        return {
+            "threshold_ms": SLOW_QUERY_MS,
+            "seen": self.seen,
+            "logged": self.logged,
+            "explained": self.explained,
+            "dropped": self.dropped,
+            "failures": self.failures,
+        }
+
+
+slow_query_log = SlowQueryLog()
+
+
+@register_collector
+def slow_query_metrics():
+    stats = slow_query_log.stats()
+    return [
+        ("slow_queries_total", "counter", "Queries over SLOW_QUERY_MS (or timed out)", [({}, stats["seen"])]),
+        ("slow_queries_logged_total", "counter", "Captures written to slow_query_log", [({}, stats["logged"])]),
+        ("slow_queries_explained_total", "counter", "Captures with an EXPLAIN plan", [({}, stats["explained"])]),
+        ("slow_queries_dropped_total", "counter", "Captures skipped by the rate limit or a full queue",
+         [({}, stats["dropped"])]),
+    ]
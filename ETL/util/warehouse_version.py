@@ -0,0 +1,54 @@
+from sqlalchemy import text
+from util.query_executor import fetch_all
+from util.logging_config import get_logger
+import asyncio
+import time
+import os
+
+# How long the API trusts its last view of the data version before re-reading it
+WAREHOUSE_VERSION_TTL_S = float(os.getenv("WAREHOUSE_VERSION_TTL_S") or 1.0)
+
+logger = get_logger(__name__)
+
+# Every committed ETL load (full, partial or micro-batch) appends a successful etl_batches
+# row, so the newest Batch_ID identifies the data currently in the warehouse.
+_VERSION_SQL = text("""
+    SELECT COALESCE(MAX("Batch_ID"), 0) FROM etl_batches WHERE "Status" = 'success'
+""")
+
+
+class WarehouseVersion:
+    """
+    Cached warehouse data version.
+
+    Reads etl_batches at most once per TTL no matter how many requests ask,
+    so checking the version on the hot path costs a clock read.
+    """
+
+    def __init__(self, ttl_s=WAREHOUSE_VERSION_TTL_S):
+        self.ttl_s = ttl_s
+        self._value = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def current(self):
+        if self._value is not None and time.monotonic() - self._checked_at < self.ttl_s:
+            return self._value
+        async with self._lock:
+            # Another request may have refreshed it while we waited
+            if self._value is not None and time.monotonic() - self._checked_at < self.ttl_s:
+                return self._value
+            rows = await fetch_all(_VERSION_SQL)
+            value = rows[0][0]
+            if self._value is not None and value != self._value:
+                logger.info(f"Warehouse data version changed: {self._value} -> {value}")
+            self._value = value
+            self._checked_at = time.monotonic()
+            return value
+
+    def peek(self):
+        """Last known version without touching the database (None before first read)."""
+        return self._value
+
+
+warehouse_version = WarehouseVersion()
@@ -0,0 +1,198 @@
+from sqlalchemy import text
+from models.Api_Request_Log import Api_Request_Log
+from util.db_warehouse import db_warehouse_engine
+from util.logging_config import get_logger
+import asyncio
+import httpx
+import time
+import os
+
+logger = get_logger(__name__)
+
+WARMUP_AFTER_LOAD = os.getenv("WARMUP_AFTER_LOAD", "true").lower() in ("true", "1", "yes")
+WARMUP_ON_API_STARTUP = os.getenv("WARMUP_ON_API_STARTUP", "true").lower() in ("true", "1", "yes")
+# Share of shared_buffers the prewarm may fill; larger relations only go to the OS cache
+WARMUP_BUFFER_FRACTION = float(os.getenv("WARMUP_BUFFER_FRACTION") or 0.8)
+# Most requested targets replayed, counted over this many hours of api_request_log
+WARMUP_TOP_REQUESTS = int(os.getenv("WARMUP_TOP_REQUESTS") or 50)
+WARMUP_LOOKBACK_HOURS = int(os.getenv("WARMUP_LOOKBACK_HOURS") or 24)
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY") or 4)
+# Where the ETL sends the replayed requests (the API fills its caches and
+# reads the pages those queries touch); unset skips the replay after a load
+WARMUP_API_URL = os.getenv("WARMUP_API_URL", "")
+
+# Prewarm order: small, hot summaries first, the fact table last so it can't
+# push them out when it doesn't fit
+WARMUP_TABLES = [
+    "agg_revenue_by_month",
+    "agg_revenue_by_rider",
+    "agg_revenue_by_city_product",
+    "agg_product_rank_by_city",
+    "agg_revenue_by_city_category_quarter",
+    "agg_revenue_by_day_product",
+    "dim_date",
+    "dim_products",
+    "dim_users",
+    "dim_riders",
+    "fact_order_items",
+]
+
+# Each table's indexes before its heap: index-only scans never touch the heap
+_RELATIONS_SQL = text("""
+    SELECT r.oid::regclass::text AS name, r.relkind AS kind, pg_relation_size(r.oid) AS bytes,
+           array_position(CAST(:tables AS text[]), t.relname) AS table_order
+    FROM pg_class t
+    JOIN pg_namespace n ON n.oid = t.relnamespace AND n.nspname = current_schema()
+    JOIN pg_class r ON r.oid = t.oid OR r.oid IN (SELECT indexrelid FROM pg_index WHERE indrelid = t.oid)
+    WHERE t.relname = ANY(CAST(:tables AS text[]))
+    ORDER BY table_order, r.relkind = 'i' DESC, r.relname
+""")
+
+_SHARED_BUFFERS_SQL = text("""
+    SELECT setting::bigint * current_setting('block_size')::bigint FROM pg_settings WHERE name = 'shared_buffers'
+""")
+
+_TOP_REQUESTS_SQL = text(f"""
+    SELECT "Target", SUM("Requests") AS requests
+    FROM {Api_Request_Log.__tablename__}
+    WHERE "Bucket_Start" >= NOW() - make_interval(hours => :hours) AND "Method" = 'GET'
+    GROUP BY "Target"
+    ORDER BY requests DESC
+    LIMIT :limit
+""")
+
+
+def _pg_prewarm_available(conn):
+    try:
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_prewarm"))
+        return True
+    except Exception as e:
+        # Needs the contrib package and CREATE privilege on the database
+        logger.warning(f"pg_prewarm unavailable, falling back to sequential reads of tables only: {e}")
+        return False
+
+
+def prewarm_relations(tables=WARMUP_TABLES):
+    """
+    Load the summary views, dimensions and fact table (with their indexes) into cache.
+
+    With pg_prewarm, relations go into shared_buffers in WARMUP_TABLES order until
+    WARMUP_BUFFER_FRACTION of it is used; the rest are prefetched into the OS
+    cache. Without it, tables are read with a count(*) (OS cache only; a large
+    sequential scan uses a small ring buffer) and indexes are skipped.
+
+    Returns:
+        dict: {"buffer": [...], "prefetch": [...], "scanned": [...]} relation names
+    """
+    start = time.perf_counter()
+    warmed = {"buffer": [], "prefetch": [], "scanned": []}
+    with db_warehouse_engine.connect() as conn:
+        relations = conn.execute(_RELATIONS_SQL, {"tables": list(tables)}).mappings().all()
+        if _pg_prewarm_available(conn):
+            budget = conn.execute(_SHARED_BUFFERS_SQL).scalar() * WARMUP_BUFFER_FRACTION
+            for relation in relations:
+                mode = "buffer" if relation["bytes"] <= budget else "prefetch"
+                if mode == "buffer":
+                    budget -= relation["bytes"]
+                try:
+                    conn.execute(text("SELECT pg_prewarm(CAST(:name AS regclass), :mode)"),
+                                 {"name": relation["name"], "mode": mode})
+                    warmed[mode].append(relation["name"])
+                except Exception as e:
+                    logger.warning(f"Could not prewarm {relation['name']}: {e}")
+        else:
+            for relation in relations:
+                if relation["kind"] in ("r", "m"):
+                    conn.execute(text(f"SELECT count(*) FROM {relation['name']}"))
+                    warmed["scanned"].append(relation["name"])
+        conn.commit()
+    logger.info(
+        f"Prewarmed {len(warmed['buffer'])} relations into shared_buffers, prefetched "
+        f"{len(warmed['prefetch'])}, scanned {len(warmed['scanned'])} in {time.perf_counter() - start:.1f}s"
+    )
+    return warmed
+
+
+def top_request_targets(limit=WARMUP_TOP_REQUESTS, hours=WARMUP_LOOKBACK_HOURS):
+    """Most requested GET targets (path + query) from api_request_log, busiest first."""
+    with db_warehouse_engine.connect() as conn:
+        return [row[0] for row in conn.execute(_TOP_REQUESTS_SQL, {"hours": hours, "limit": limit})]
+
+
+async def replay_requests(client, targets, concurrency=WARMUP_CONCURRENCY):
+    """GET each target through client; returns (succeeded, failed)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {"ok": 0, "failed": 0}
+
+    async def fetch(target):
+        async with semaphore:
+            try:
+                response = await client.get(target, headers={"X-Warmup": "1"})
+                results["ok" if response.status_code < 400 else "failed"] += 1
+            except httpx.HTTPError as e:
+                results["failed"] += 1
+                logger.debug(f"Warmup request {target} failed: {e}")
+
+    await asyncio.gather(*(fetch(target) for target in targets))
+    return results["ok"], results["failed"]
+
+
+def warm_up_after_load():
+    """
+    ETL stage: prewarm relations, then replay the most common API requests.
+
+    Replaying through the running API (WARMUP_API_URL) warms its result cache
+    for the new data version as well as the pages the queries read. Errors
+    are logged, never raised: a cold cache only costs latency.
+    """
+    if not WARMUP_AFTER_LOAD:
+        return
+    try:
+        prewarm_relations()
+    except Exception as e:
+        logger.warning(f"Relation prewarm failed: {e}")
+
+    if not WARMUP_API_URL:
+        logger.info("WARMUP_API_URL not set, skipping request replay")
+        return
+    try:
+        targets = top_request_targets()
+        start = time.perf_counter()
+
+        async def replay():
+            async with httpx.AsyncClient(base_url=WARMUP_API_URL, timeout=120) as client:
+                return await replay_requests(client, targets)
+
+        succeeded, failed = asyncio.run(replay())
+        logger.info(
+            f"Replayed {succeeded} of {len(targets)} top API requests against {WARMUP_API_URL} "
+            f"in {time.perf_counter() - start:.1f}s ({failed} failed)"
+        )
+    except Exception as e:
+        logger.warning(f"Request replay failed: {e}")
+
+
+async def warm_up_api(app):
+    """
+    API startup hook: prewarm relations and replay the top requests in-process.
+
+    Requests go through the full ASGI stack (caches, admission, middleware)
+    without a network round trip. Meant to run as a background task so the
+    API starts serving immediately.
+    """
+    if not WARMUP_ON_API_STARTUP:
+        return
+    try:
+        await asyncio.to_thread(prewarm_relations)
+        targets = await asyncio.to_thread(top_request_targets)
+        start = time.perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://warmup", timeout=120) as client:
+            succeeded, failed = await replay_requests(client, targets)
+        logger.info(
+            f"Startup warmup replayed {succeeded} of {len(targets)} top requests "
+            f"in {time.perf_counter() - start:.1f}s ({failed} failed)"
+        )
+    except Exception as e:
+        logger.warning(f"Startup warmup failed: {e}")